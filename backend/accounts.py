@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import math
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+import httpx
+
+from metrics import Counter, Gauge
+from resilience import TokenBucket, parse_retry_after
+from storage import ACCOUNTS, DEFAULT_ACCOUNT_ID, Storage
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_POSTS = Counter(
+    "account_posts", "Tweets sent to the Twitter clone per account, by outcome (posted, rejected, throttled, error)",
+    ["account", "result"])
+ACCOUNT_SENDING = Gauge("account_sending", "Tweets being sent to the Twitter clone right now per account", ["account"])
+
+# Account ids are short slugs so they can appear in URLs and metric labels
+ACCOUNT_ID_PATTERN = r"^[a-z0-9][a-z0-9_-]{0,63}$"
+
+
+def validate_account_url(url: str) -> str:
+    """Check that ``url`` is an absolute http(s) URL httpx can post to"""
+    try:
+        parsed = httpx.URL(url)
+    except httpx.InvalidURL as e:
+        raise ValueError(f"Invalid URL: {e}")
+    if parsed.scheme not in ("http", "https") or not parsed.host:
+        raise ValueError("URL must be an absolute http or https URL")
+    return url
+
+
+class UnknownAccount(Exception):
+    """Raised for an account id that isn't registered"""
+
+    def __init__(self, account_id: str):
+        super().__init__(f"Unknown account '{account_id}'")
+        self.account_id = account_id
+
+
+def public_account(account: dict) -> dict:
+    """An account as the API shows it, without its API key"""
+    shown = {name: value for name, value in account.items() if name != "api_key"}
+    shown["api_key_set"] = bool(account.get("api_key"))
+    return shown
+
+
+class AccountLane:
+    """What one account posts through: its own connection pool, rate limiter
+    and cap on tweets in flight, so a slow or throttled account only holds
+    up its own tweets.
+
+    ``turn()`` waits for both a connection and a rate-limit token. The
+    outbox, which can't afford to wait, checks ``busy`` and ``ready_in``
+    and then uses ``try_acquire``/``release`` and ``reserve`` instead. A
+    429 pauses the account's limiter for the Retry-After it came with.
+    """
+
+    def __init__(self, account: dict, client: httpx.AsyncClient, throttle_pause: float = 1.0):
+        self.account = account
+        self.id = account["id"]
+        self.client = client
+        self.max_connections = account["max_connections"]
+        self.limiter = TokenBucket(f"twitter_clone:{self.id}", account["rate_limit"], account["rate_burst"],
+                                   max_wait=math.inf)
+        self.throttle_pause = throttle_pause
+        self._slots = asyncio.Semaphore(self.max_connections)
+        self.sending = 0
+        # Outcomes seen by this worker
+        self.counts = {"posted": 0, "rejected": 0, "throttled": 0, "error": 0}
+        self.last_posted_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def busy(self) -> bool:
+        """Every connection slot is taken"""
+        return self._slots.locked()
+
+    def ready_in(self) -> float:
+        """Seconds until the rate limit allows the next tweet"""
+        return self.limiter.ready_in()
+
+    async def try_acquire(self) -> bool:
+        """Take a connection slot if one is free right now"""
+        if self.busy:
+            return False
+        await self._slots.acquire()
+        return True
+
+    def release(self):
+        self._slots.release()
+
+    def reserve(self) -> float:
+        """Take a rate-limit token and return how long to wait before using it"""
+        return self.limiter.reserve()
+
+    @asynccontextmanager
+    async def turn(self, max_wait: Optional[float] = None):
+        """Hold a connection slot and wait for a token; RateLimitExceeded beyond ``max_wait`` seconds"""
+        async with self._slots:
+            await self.limiter.acquire(max_wait)
+            yield self
+
+    def _record(self, result: str, error: Optional[str] = None):
+        self.counts[result] += 1
+        ACCOUNT_POSTS.inc(account=self.id, result=result)
+        if result == "posted":
+            self.last_posted_at = asyncio.get_running_loop().time()
+        else:
+            self.last_error = error
+
+    async def send(self, content: str) -> httpx.Response:
+        """Post one tweet as this account"""
+        payload = {
+            "username": self.account["username"],
+            "text": content
+        }
+        headers = {
+            "api-key": self.account["api_key"],
+            "Content-Type": "application/json"
+        }
+        self.sending += 1
+        ACCOUNT_SENDING.inc(account=self.id)
+        try:
+            response = await self.client.post(self.account["url"], headers=headers, json=payload)
+        except Exception as e:
+            self._record("error", f"{type(e).__name__}: {str(e)}")
+            raise
+        finally:
+            self.sending -= 1
+            ACCOUNT_SENDING.dec(account=self.id)
+
+        if response.status_code in (200, 201):
+            self._record("posted")
+        elif response.status_code == 429:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            self.limiter.pause(retry_after or self.throttle_pause)
+            self._record("throttled", f"Status: 429, retry after {retry_after or self.throttle_pause}s")
+        else:
+            self._record("rejected", f"Status: {response.status_code}")
+        return response
+
+    def snapshot(self) -> dict:
+        loop = asyncio.get_running_loop()
+        return {
+            "max_connections": self.max_connections,
+            "rate_limit": self.limiter.rate or None,
+            "sending": self.sending,
+            "throttled_for": round(self.limiter.paused_for, 3),
+            "sent": dict(self.counts),
+            "seconds_since_last_post": (
+                round(loop.time() - self.last_posted_at, 3) if self.last_posted_at is not None else None
+            ),
+            "last_error": self.last_error,
+        }
+
+    async def aclose(self):
+        """Close the connection pool once nothing is being sent through it"""
+        for _ in range(self.max_connections):
+            await self._slots.acquire()
+        await self.client.aclose()
+
+
+class AccountRegistry:
+    """The accounts tweets can be posted as: the ``accounts`` collection plus
+    the default account from the environment.
+
+    Each account gets an ``AccountLane`` the first time it is used. Accounts
+    are read from storage on every lookup, so edits and deletions made
+    through any worker take effect on the next tweet; an edited account
+    gets a new lane and the old one is closed once its requests finish.
+    Unset settings of a stored account fall back to the defaults given
+    here.
+    """
+
+    def __init__(self, storage: Storage, default: dict, client_factory: Callable[[int], httpx.AsyncClient],
+                 rate_limit: float = 0.0, rate_burst: int = 1, max_connections: int = 10,
+                 throttle_pause: float = 1.0):
+        self.storage = storage
+        self.default = {"id": DEFAULT_ACCOUNT_ID, "created_at": None, "updated_at": None, **default}
+        self.client_factory = client_factory
+        self.defaults = {
+            "url": default.get("url"),
+            "rate_limit": rate_limit,
+            "rate_burst": rate_burst,
+            "max_connections": max_connections,
+        }
+        self.throttle_pause = throttle_pause
+        self._lanes = {}
+        self._retiring = set()
+
+    def settings(self, account: dict) -> dict:
+        """An account with every unset setting filled in from the defaults"""
+        return {
+            **account,
+            **{name: value for name, value in self.defaults.items() if account.get(name) is None}
+        }
+
+    async def get(self, account_id: Optional[str]) -> Optional[dict]:
+        account_id = account_id or DEFAULT_ACCOUNT_ID
+        if account_id == DEFAULT_ACCOUNT_ID:
+            return self.settings(self.default)
+        account = await self.storage.get(ACCOUNTS, account_id)
+        return self.settings(account) if account is not None else None
+
+    def _retire(self, account_id: str):
+        lane = self._lanes.pop(account_id, None)
+        if lane is not None:
+            task = asyncio.create_task(lane.aclose())
+            self._retiring.add(task)
+            task.add_done_callback(self._retiring.discard)
+
+    def _lane(self, account: dict) -> AccountLane:
+        lane = self._lanes.get(account["id"])
+        if lane is None or lane.account != account:
+            if lane is not None:
+                self._retire(account["id"])
+                logger.info("🔁 Account settings changed, new connection pool", extra={"account_id": account["id"]})
+            lane = AccountLane(account, self.client_factory(account["max_connections"]), self.throttle_pause)
+            self._lanes[account["id"]] = lane
+        return lane
+
+    async def lane(self, account_id: Optional[str]) -> AccountLane:
+        """The lane to post as ``account_id`` through (default account when None)"""
+        account = await self.get(account_id)
+        if account is None:
+            self._retire(account_id)
+            raise UnknownAccount(account_id)
+        return self._lane(account)
+
+    async def lanes(self) -> list:
+        """A lane for every account, default first; lanes of deleted accounts are closed"""
+        stored, _ = await self.storage.page(ACCOUNTS)
+        lanes = [self._lane(self.settings(self.default))] + [self._lane(self.settings(account)) for account in stored]
+        for account_id in set(self._lanes) - {lane.id for lane in lanes}:
+            self._retire(account_id)
+        return lanes
+
+    def status(self, account_id: str) -> Optional[dict]:
+        """This worker's view of an account's lane, or None if it hasn't posted here"""
+        lane = self._lanes.get(account_id)
+        return lane.snapshot() if lane is not None else None
+
+    async def close(self):
+        for account_id in list(self._lanes):
+            self._retire(account_id)
+        if self._retiring:
+            await asyncio.gather(*self._retiring, return_exceptions=True)
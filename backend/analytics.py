@@ -0,0 +1,186 @@
+import bisect
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from search import record_hashtags
+from storage import POSTED_TWEETS, SCHEDULED_TWEETS, Storage, index_key
+from views import ChangeFeedView
+
+# Counters are kept per UTC hour, keyed like "2025-01-31T09", and rolled up per day ("2025-01-31")
+HOUR_FORMAT = "%Y-%m-%dT%H"
+
+
+def _hour(value) -> Optional[str]:
+    key = index_key(value)
+    return key[:13] if len(key) >= 13 else None
+
+
+def _between(keys: list, first: str, last: str) -> list:
+    return keys[bisect.bisect_left(keys, first):bisect.bisect_right(keys, last)]
+
+
+class _Rollup:
+    """Counters per hour and per day"""
+
+    def __init__(self):
+        self.hours = {}
+        self.days = {}
+        self._sorted = {}
+
+    def add(self, hour: str, keys, sign: int):
+        for table, bucket in ((self.hours, hour), (self.days, hour[:10])):
+            counts = table.get(bucket)
+            if counts is None:
+                counts = table[bucket] = Counter()
+                self._sorted.pop(id(table), None)
+            for key in keys:
+                counts[key] += sign
+                if not counts[key]:
+                    del counts[key]
+            if not counts:
+                del table[bucket]
+                self._sorted.pop(id(table), None)
+
+    def _keys(self, table: dict) -> list:
+        keys = self._sorted.get(id(table))
+        if keys is None:
+            keys = self._sorted[id(table)] = sorted(table)
+        return keys
+
+    def buckets(self, first_hour: str, last_hour: str, interval: str) -> dict:
+        """Non-empty counts per hour or day bucket within ``[first_hour, last_hour]``.
+
+        Days the window covers completely come from the daily rollup; only
+        the partial days at either end are added up from hours.
+        """
+        hours = self._keys(self.hours)
+        if interval == "hour":
+            return {key: self.hours[key] for key in _between(hours, first_hour, last_hour)}
+
+        first_day, last_day = first_hour[:10], last_hour[:10]
+        first_full, last_full = first_hour[11:] == "00", last_hour[11:] == "23"
+        result = {}
+        if first_day == last_day and not (first_full and last_full):
+            partial = [(first_hour, last_hour)]
+            full_days = []
+        else:
+            partial = []
+            if not first_full:
+                partial.append((first_hour, f"{first_day}T23"))
+            if not last_full:
+                partial.append((f"{last_day}T00", last_hour))
+            days = self._keys(self.days)
+            start = (bisect.bisect_left if first_full else bisect.bisect_right)(days, first_day)
+            end = (bisect.bisect_right if last_full else bisect.bisect_left)(days, last_day)
+            full_days = days[start:end]
+        for day in full_days:
+            result[day] = self.days[day]
+        for first, last in partial:
+            for key in _between(hours, first, last):
+                result.setdefault(key[:10], Counter()).update(self.hours[key])
+        return result
+
+
+def _total(buckets: dict) -> Counter:
+    total = Counter()
+    for counts in buckets.values():
+        total.update(counts)
+    return total
+
+
+class Analytics(ChangeFeedView):
+    """Counters of posted tweets (by status and hashtag) and scheduled tweets
+    (by status, bucketed by scheduled time), per hour and per day.
+
+    Each record's contribution is remembered so an update or delete can
+    take it back out, which keeps the counters exact however a change
+    arrives. Archived records can't change, so only their counts are kept. Queries add up the buckets in their window, so their cost
+    depends on the window, not on the size of the history.
+    """
+
+    def __init__(self, storage: Storage, archives: Optional[dict] = None):
+        super().__init__(storage, (POSTED_TWEETS, SCHEDULED_TWEETS), archives)
+
+    def _clear(self):
+        self._posts = _Rollup()
+        self._hashtags = _Rollup()
+        self._scheduled = _Rollup()
+        # (collection, id) -> (hour, status, hashtags) added for that record
+        self._contributions = {}
+
+    def _add(self, collection: str, contribution: tuple, sign: int):
+        hour, status, hashtags = contribution
+        if collection == POSTED_TWEETS:
+            self._posts.add(hour, (status,), sign)
+            self._hashtags.add(hour, hashtags, sign)
+        else:
+            self._scheduled.add(hour, (status,), sign)
+
+    def _apply(self, collection: str, op: str, record_id: Optional[str], record: Optional[dict]):
+        key = (collection, record_id)
+        previous = self._contributions.pop(key, None)
+        if previous is not None:
+            self._add(collection, previous, -1)
+        if op != "put" or record is None:
+            return
+        if collection == POSTED_TWEETS:
+            hour = _hour(record.get("posted_at"))
+            hashtags = tuple(record_hashtags(record))
+        else:
+            hour = _hour(record.get("scheduled_time"))
+            hashtags = ()
+        if hour is None:
+            return
+        contribution = (hour, record.get("status"), hashtags)
+        self._contributions[key] = contribution
+        self._add(collection, contribution, 1)
+
+    def _archived(self, collection: str, record_id: str):
+        self._contributions.pop((collection, record_id), None)
+
+    def summary(self, since: datetime, until: datetime, interval: str = "day", top: int = 10) -> dict:
+        """Totals, a per-``interval`` series and the ``top`` hashtags for ``[since, until)``.
+
+        The window is widened to whole hours, and the series has an entry
+        for every bucket in it, including empty ones.
+        """
+        since = since.astimezone(timezone.utc)
+        last = (until - timedelta(microseconds=1)).astimezone(timezone.utc)
+        first_hour, last_hour = since.strftime(HOUR_FORMAT), last.strftime(HOUR_FORMAT)
+
+        posted = self._posts.buckets(first_hour, last_hour, interval)
+        posts = _total(posted)
+        scheduled = _total(self._scheduled.buckets(first_hour, last_hour, interval))
+        hashtags = _total(self._hashtags.buckets(first_hour, last_hour, interval))
+
+        series = []
+        bucket = since.replace(minute=0, second=0, microsecond=0)
+        if interval == "day":
+            bucket = bucket.replace(hour=0)
+        step = timedelta(hours=1) if interval == "hour" else timedelta(days=1)
+        while bucket <= last:
+            key = bucket.strftime(HOUR_FORMAT) if interval == "hour" else bucket.strftime(HOUR_FORMAT)[:10]
+            counts = posted.get(key, {})
+            series.append({
+                "bucket": bucket.isoformat() if interval == "hour" else key,
+                "total": sum(counts.values()),
+                "immediate": counts.get("posted", 0),
+                "scheduled": counts.get("posted_scheduled", 0),
+            })
+            bucket += step
+
+        settled = scheduled["posted"] + scheduled["failed"]
+        return {
+            "posts": {
+                "total": sum(posts.values()),
+                "immediate": posts["posted"],
+                "scheduled": posts["posted_scheduled"],
+                "series": series,
+            },
+            "scheduled_tweets": {
+                **{status: scheduled[status] for status in ("pending", "posting", "posted", "failed")},
+                "failure_rate": round(scheduled["failed"] / settled, 4) if settled else None,
+            },
+            "top_hashtags": [{"hashtag": f"#{tag}", "count": count} for tag, count in hashtags.most_common(top)],
+        }
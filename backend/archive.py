@@ -0,0 +1,278 @@
+import asyncio
+import bisect
+import gzip
+import heapq
+import logging
+import operator
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+import jsoncodec
+from metrics import Counter, Gauge, Histogram
+from storage import (
+    Storage, StorageError, decode_cursor, index_key, read_json_file, record_account, record_sort_key, take_page,
+    write_json_file_atomic
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_RECORDS = Counter("archived_records", "Records moved from storage into archive segments", ["collection"])
+ARCHIVE_SEGMENTS = Gauge("archive_segments", "Sealed archive segments", ["collection"])
+ARCHIVE_SEGMENT_LOADS = Counter(
+    "archive_segment_loads", "Archive segments read for queries, by cache outcome (hit, miss)", ["collection", "result"])
+ARCHIVE_COMPACTION_SECONDS = Histogram(
+    "archive_compaction_duration_seconds", "Time spent by one compaction run", ["collection"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+
+# The (sort_key, id) part of a segment row, which cursors point at
+_row_key = operator.itemgetter(0, 1)
+
+# Length of the index_key prefix naming a partition ("2025-01" or "2025-01-31")
+PARTITION_KEY_LENGTH = {"month": 7, "day": 10}
+
+
+def partition_start(partition: str) -> datetime:
+    return datetime.fromisoformat(f"{partition}-01" if len(partition) == 7 else partition).replace(tzinfo=timezone.utc)
+
+
+def next_partition(partition: str) -> str:
+    start = partition_start(partition)
+    if len(partition) == 7:
+        year, month = (start.year + 1, 1) if start.month == 12 else (start.year, start.month + 1)
+        return f"{year:04d}-{month:02d}"
+    return datetime.fromordinal(start.toordinal() + 1).strftime("%Y-%m-%d")
+
+
+class Archive:
+    """Old records of one collection, moved out of storage into sealed segments.
+
+    Each segment is a gzip-compressed JSON-lines file holding one month (or
+    day) of records sorted by the collection's sort key, and
+    ``manifest.json`` lists every segment with its key range. Compaction
+    only ever moves whole partitions, so a segment is written once and then
+    left alone; records arriving later for an archived partition are merged
+    into it. Queries open only the segments overlapping their range, and a
+    few recently used segments are kept decoded in memory.
+
+    Segments are written before the records are deleted from storage, so a
+    crash in between leaves them in both places; readers prefer the stored
+    copy, and the next compaction finishes the move.
+    """
+
+    def __init__(self, directory: str, collection: str, partition: str = "month", cache_segments: int = 4):
+        if partition not in PARTITION_KEY_LENGTH:
+            raise ValueError(f"partition must be one of: {', '.join(PARTITION_KEY_LENGTH)}")
+        self.directory = directory
+        self.collection = collection
+        self.partition = partition
+        self.cache_segments = cache_segments
+        self._manifest = {}
+        self._manifest_stamp = None
+        self._cache = OrderedDict()
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    def _segment_path(self, partition: str) -> str:
+        return os.path.join(self.directory, f"{self.collection}-{partition}.jsonl.gz")
+
+    def partition_of(self, sort_key: str) -> str:
+        return sort_key[:PARTITION_KEY_LENGTH[self.partition]]
+
+    # --- reading ---------------------------------------------------------------
+
+    def segments(self) -> dict:
+        """``{partition: {"file", "count", "first", "last", "bytes"}}``, reloaded when another worker compacts"""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            self._manifest, self._manifest_stamp = {}, None
+            return self._manifest
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp != self._manifest_stamp:
+            self._manifest = read_json_file(self.manifest_path).get("segments", {})
+            self._manifest_stamp = stamp
+            ARCHIVE_SEGMENTS.set(len(self._manifest), collection=self.collection)
+        return self._manifest
+
+    def _read_segment(self, partition: str) -> list:
+        """``(sort_key, id, record)`` rows of a segment, ascending"""
+        path = self._segment_path(partition)
+        try:
+            with open(path, "rb") as f:
+                content = gzip.decompress(f.read())
+        except FileNotFoundError:
+            raise StorageError(f"Archive segment {path} listed in {self.manifest_path} is missing")
+        rows = []
+        for line in content.splitlines():
+            record = jsoncodec.loads(line)
+            rows.append((record_sort_key(self.collection, record), record["id"], record))
+        return rows
+
+    async def _load(self, partition: str, segment: dict) -> list:
+        key = (partition, segment["bytes"], segment["last"], segment["count"])
+        rows = self._cache.get(key)
+        if rows is not None:
+            self._cache.move_to_end(key)
+            ARCHIVE_SEGMENT_LOADS.inc(collection=self.collection, result="hit")
+            return rows
+        ARCHIVE_SEGMENT_LOADS.inc(collection=self.collection, result="miss")
+        rows = await asyncio.to_thread(self._read_segment, partition)
+        if self.cache_segments > 0:
+            self._cache[key] = rows
+            while len(self._cache) > self.cache_segments:
+                self._cache.popitem(last=False)
+        return rows
+
+    async def rows(self, descending: bool = False, after: Optional[tuple] = None, since: Optional[str] = None,
+                   until: Optional[str] = None, status: Optional[str] = None, limit: Optional[int] = None,
+                   account_id: Optional[str] = None) -> list:
+        """Archived ``(sort_key, id, record)`` rows in order, like ``Storage.page`` reads them.
+
+        ``since``/``until`` are index keys, ``after`` a decoded cursor; only
+        segments whose key range overlaps are opened. ``status`` and
+        ``account_id`` are checked row by row.
+        """
+        result = []
+        for partition in sorted(self.segments(), reverse=descending):
+            segment = self._manifest[partition]
+            if (since is not None and segment["last"] < since) or (until is not None and segment["first"] >= until):
+                continue
+            if after is not None and ((segment["first"], "") >= after if descending else (segment["last"], "\uffff") <= after):
+                continue
+            rows = await self._load(partition, segment)
+            start = bisect.bisect_left(rows, (since,)) if since is not None else 0
+            end = bisect.bisect_left(rows, (until,)) if until is not None else len(rows)
+            if after is not None:
+                if descending:
+                    end = min(end, bisect.bisect_left(rows, after, key=_row_key))
+                else:
+                    start = max(start, bisect.bisect_right(rows, after, key=_row_key))
+            selected = rows[start:end]
+            if descending:
+                selected = reversed(selected)
+            for row in selected:
+                if status is not None and row[2].get("status") != status:
+                    continue
+                if account_id is not None and record_account(self.collection, row[2]) != account_id:
+                    continue
+                result.append(row)
+                if limit is not None and len(result) >= limit:
+                    return result
+        return result
+
+    async def get(self, sort_key: str, record_id: str) -> Optional[dict]:
+        """The archived record with this sort key and id, or None"""
+        partition = self.partition_of(sort_key)
+        segment = self.segments().get(partition)
+        if segment is None:
+            return None
+        rows = await self._load(partition, segment)
+        index = bisect.bisect_left(rows, (sort_key, record_id), key=_row_key)
+        if index < len(rows) and _row_key(rows[index]) == (sort_key, record_id):
+            return rows[index][2]
+        return None
+
+    async def all_records(self):
+        """Every archived record, one segment at a time, without filling the query cache"""
+        for partition in sorted(self.segments()):
+            for _, _, record in await asyncio.to_thread(self._read_segment, partition):
+                yield record
+
+    # --- compaction ------------------------------------------------------------
+
+    def _write_segment(self, partition: str, records: list) -> dict:
+        rows = {record["id"]: (record_sort_key(self.collection, record), record["id"], record) for record in records}
+        if partition in self._manifest:
+            for row in self._read_segment(partition):
+                rows.setdefault(row[1], row)
+        ordered = sorted(rows.values(), key=_row_key)
+        content = gzip.compress(b"\n".join(jsoncodec.dumps(record) for _, _, record in ordered), compresslevel=6)
+        write_json_file_atomic(self._segment_path(partition), content)
+        return {
+            "file": os.path.basename(self._segment_path(partition)),
+            "count": len(ordered),
+            "first": ordered[0][0],
+            "last": ordered[-1][0],
+            "bytes": len(content),
+        }
+
+    def _write_manifest(self, segments: dict):
+        content = jsoncodec.dumps({"collection": self.collection, "partition": self.partition, "segments": segments})
+        write_json_file_atomic(self.manifest_path, content)
+
+    async def compact(self, storage: Storage, cutoff: datetime, batch_size: int = 1000) -> int:
+        """Move every record in a partition that ended before ``cutoff`` into its segment.
+
+        Works one partition at a time, so memory is bounded by the largest
+        partition. Returns the number of records moved.
+        """
+        async with self._write_lock:
+            started = time.perf_counter()
+            os.makedirs(self.directory, exist_ok=True)
+            # Only partitions that are entirely older than the cutoff are sealed
+            cutoff_key = self.partition_of(index_key(cutoff.isoformat()))
+            moved = 0
+            while True:
+                oldest, _ = await storage.page(self.collection, limit=1)
+                if not oldest:
+                    break
+                partition = self.partition_of(record_sort_key(self.collection, oldest[0]))
+                if partition >= cutoff_key:
+                    break
+                end = partition_start(next_partition(partition)).isoformat()
+                records, cursor = [], None
+                while True:
+                    page, cursor = await storage.page(self.collection, limit=batch_size, cursor=cursor, until=end)
+                    records.extend(page)
+                    if cursor is None:
+                        break
+
+                segments = dict(self.segments())
+                segments[partition] = await asyncio.to_thread(self._write_segment, partition, records)
+                await asyncio.to_thread(self._write_manifest, segments)
+                self.segments()
+                for start in range(0, len(records), batch_size):
+                    await storage.delete_many(
+                        self.collection, [record["id"] for record in records[start:start + batch_size]], op="archive"
+                    )
+                moved += len(records)
+                ARCHIVED_RECORDS.inc(len(records), collection=self.collection)
+                logger.info("🗄️ Archived partition", extra={
+                    "collection": self.collection, "partition": partition, "records": len(records),
+                    "segment_bytes": segments[partition]["bytes"]
+                })
+            ARCHIVE_COMPACTION_SECONDS.observe(time.perf_counter() - started, collection=self.collection)
+            return moved
+
+
+async def page_with_archive(storage: Storage, archive: Optional[Archive], collection: str,
+                            limit: Optional[int] = None, cursor: Optional[str] = None, descending: bool = False,
+                            status: Optional[str] = None, since: Optional[str] = None,
+                            until: Optional[str] = None, account_id: Optional[str] = None) -> tuple:
+    """``Storage.page`` over both the stored records and the archived ones"""
+    if archive is None or not archive.segments():
+        return await storage.page(collection, limit=limit, cursor=cursor, descending=descending,
+                                  status=status, since=since, until=until, account_id=account_id)
+    after = decode_cursor(cursor) if cursor else None
+    fetch = None if limit is None else limit + 1
+    stored, _ = await storage.page(collection, limit=fetch, cursor=cursor, descending=descending,
+                                   status=status, since=since, until=until, account_id=account_id)
+    stored_rows = [(record_sort_key(collection, record), record["id"], record) for record in stored]
+    archived_rows = await archive.rows(descending, after, index_key(since) or None, index_key(until) or None,
+                                       status, fetch, account_id)
+
+    def merged():
+        # A record caught mid-compaction is in both; the stored copy comes first and wins
+        previous = None
+        for row in heapq.merge(stored_rows, archived_rows, key=_row_key, reverse=descending):
+            if row[1] != previous:
+                yield row
+            previous = row[1]
+
+    return take_page(merged(), limit)
@@ -0,0 +1,293 @@
+"""Load-test the API end to end against local stand-in upstreams.
+
+Starts fake OpenRouter and Twitter clone servers (with optional latency,
+error rate and 429s), serves the app with uvicorn on a throwaway data
+directory, then drives each scenario at a fixed concurrency and reports
+throughput plus p50/p95/p99 latency. Everything runs on 127.0.0.1.
+
+Results are written as JSON (tagged with the current git commit) so runs
+can be compared; pass ``--compare`` with an earlier results file to print
+the change per scenario.
+
+    python benchmarks/bench_api.py --requests 500 --concurrency 20
+    python benchmarks/bench_api.py --scenarios list --history 50000 --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fake_upstreams import (  # noqa: E402
+    FaultInjector, make_openrouter_app, make_twitter_clone_app, run_in_thread, stop_server
+)
+from benchmarks.stats import format_summary, percentile, summarize  # noqa: E402
+
+SCENARIOS = ("generate", "post", "schedule-burst", "list")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+async def drive(send, requests: int, concurrency: int):
+    """Issue ``requests`` calls of ``send(index)`` with at most ``concurrency`` in flight"""
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await send(index)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    return summarize(latencies, time.perf_counter() - started, requests, errors)
+
+
+async def scenario_generate(client, args, upstreams):
+    # Distinct topics so the generation cache, if enabled, can't short-circuit the run
+    run_id = uuid.uuid4().hex[:8]
+    return await drive(
+        lambda index: client.post("/generate-tweet", json={"topic": f"load test {run_id} {index}"}),
+        args.requests, args.concurrency
+    )
+
+
+async def scenario_post(client, args, upstreams):
+    return await drive(
+        lambda index: client.post("/post-tweet", json={"content": f"Benchmark post {index}"}),
+        args.requests, args.concurrency
+    )
+
+
+async def scenario_schedule_burst(client, args, upstreams):
+    """Schedule a burst of tweets due at the same instant and measure how fast it drains"""
+    twitter = upstreams["twitter"]
+    already_received = len(twitter.state.received)
+    due = datetime.now(timezone.utc) + timedelta(seconds=args.schedule_lead)
+    summary = await drive(
+        lambda index: client.post("/schedule-tweet", json={
+            "content": f"Scheduled benchmark post {index}", "scheduled_time": due.isoformat()
+        }),
+        args.requests, args.concurrency
+    )
+    if datetime.now(timezone.utc) >= due:
+        print(f"⚠️ scheduling took longer than --schedule-lead ({args.schedule_lead}s); lag figures include it")
+
+    scheduled = args.requests - summary["errors"]
+    deadline = time.monotonic() + args.schedule_lead + args.drain_timeout
+    while time.monotonic() < deadline:
+        response = await client.get("/scheduled-tweets", params={"status": "pending", "limit": 1})
+        if not response.json()["scheduled_tweets"]:
+            break
+        await asyncio.sleep(0.05)
+    else:
+        print(f"⚠️ scheduled tweets still pending after {args.drain_timeout}s")
+
+    received = twitter.state.received[already_received:]
+    lags = [received_at - due.timestamp() for received_at, _ in received]
+    summary["posted"] = len(received)
+    summary["failed_posts"] = scheduled - len(received)
+    if lags:
+        summary.update(
+            lag_p50_ms=round(percentile(lags, 50) * 1000, 3),
+            lag_p95_ms=round(percentile(lags, 95) * 1000, 3),
+            lag_p99_ms=round(percentile(lags, 99) * 1000, 3),
+            drain_s=round(max(lags), 4),
+        )
+    return summary
+
+
+async def scenario_list(client, args, upstreams):
+    """Page through and fully list a large posted-tweet history seeded before startup"""
+    first_page = await drive(
+        lambda index: client.get("/posted-tweets", params={"limit": args.page_size}),
+        args.requests, args.concurrency
+    )
+    full_list = await drive(
+        lambda index: client.get("/posted-tweets"),
+        max(1, args.requests // 50), min(args.concurrency, 4)
+    )
+    return {"first_page": first_page, "full_list": full_list}
+
+
+async def seed_history(backend: str, data_dir: str, count: int):
+    """Write ``count`` posted tweets straight to storage so the app starts with a large history"""
+    from storage import POSTED_TWEETS, create_storage
+
+    store = create_storage(backend, data_dir)
+    await store.open()
+    started = datetime.now(timezone.utc) - timedelta(days=365)
+    records = {}
+    for index in range(count):
+        record_id = str(uuid.uuid4())
+        records[record_id] = {
+            "id": record_id,
+            "content": f"Historic benchmark tweet {index} #bench",
+            "posted_at": (started + timedelta(seconds=index * 60)).isoformat(),
+            "status": "posted",
+        }
+    await store.put_many(POSTED_TWEETS, records)
+    await store.close()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: dict):
+    for name, summary in results.items():
+        if "requests" in summary:
+            print(format_summary(name, summary))
+        else:
+            for part, part_summary in summary.items():
+                print(format_summary(f"{name}/{part}", part_summary))
+        if "lag_p50_ms" in summary:
+            print(f"{'':26s} lag p50={summary['lag_p50_ms']:8.2f}ms p95={summary['lag_p95_ms']:8.2f}ms "
+                  f"p99={summary['lag_p99_ms']:8.2f}ms drained in {summary['drain_s']:.2f}s "
+                  f"posted={summary['posted']} failed={summary['failed_posts']}")
+
+
+def print_comparison(results: dict, baseline: dict):
+    """Per-scenario change in p50/p95/p99, throughput and goodput against an earlier run"""
+    def flatten(scenarios):
+        for name, summary in scenarios.items():
+            if "requests" in summary:
+                yield name, summary
+            else:
+                for part, part_summary in summary.items():
+                    yield f"{name}/{part}", part_summary
+
+    before = dict(flatten(baseline["results"]))
+    print(f"\nCompared with {baseline['commit']} ({baseline['timestamp']}):")
+    for name, summary in flatten(results):
+        if name not in before:
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "goodput_rps"):
+            old, new = before[name].get(key), summary.get(key)
+            if old and new is not None:
+                deltas.append(f"{key.split('_')[0]} {(new - old) / old * 100:+6.1f}%")
+        print(f"{name:26s} " + "  ".join(deltas))
+
+
+async def run(args):
+    faults = dict(error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after)
+    upstreams = {
+        "openrouter": make_openrouter_app(args.openrouter_latency, FaultInjector(seed=args.seed, **faults)),
+        "twitter": make_twitter_clone_app(args.twitter_latency, FaultInjector(seed=args.seed + 1, **faults)),
+    }
+    servers = [
+        run_in_thread(upstreams["openrouter"], port=args.port + 1),
+        run_in_thread(upstreams["twitter"], port=args.port + 2),
+    ]
+
+    data_dir = tempfile.mkdtemp(prefix="tweet-bench-")
+    if "list" in args.scenarios and args.history:
+        await seed_history(args.storage, data_dir, args.history)
+
+    os.environ.update(
+        OPENROUTER_API_KEY="sk-or-v1-" + "0" * 64,
+        OPENROUTER_MODEL="bench/model",
+        OPENROUTER_BASE_URL=f"http://127.0.0.1:{args.port + 1}/api/v1",
+        TWITTER_CLONE_URL=f"http://127.0.0.1:{args.port + 2}/post_tweet",
+        TWITTER_CLONE_API_KEY="bench",
+        TWITTER_CLONE_USERNAME="bench",
+        STORAGE_BACKEND=args.storage,
+        DATA_DIR=data_dir,
+        LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+    )
+    # main reads its configuration at import time
+    import main
+
+    servers.append(run_in_thread(main.app, port=args.port))
+    results = {}
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits,
+                                     timeout=120.0) as client:
+            for name in args.scenarios:
+                handler = globals()[f"scenario_{name.replace('-', '_')}"]
+                results[name] = await handler(client, args, upstreams)
+    finally:
+        for server in reversed(servers):
+            stop_server(server)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=500, help="Requests (or scheduled tweets) per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--storage", choices=("sqlite", "json"), default="sqlite")
+    parser.add_argument("--history", type=int, default=20000, help="Posted tweets seeded for the list scenario")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--openrouter-latency", type=float, default=0.05, help="Seconds per OpenRouter call")
+    parser.add_argument("--twitter-latency", type=float, default=0.02, help="Seconds per Twitter clone call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream calls answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="Fraction of upstream calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with injected 429s")
+    parser.add_argument("--schedule-lead", type=float, default=3.0,
+                        help="Seconds between the start of the burst and its due time")
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0, help="Seed for injected failures")
+    parser.add_argument("--port", type=int, default=8910, help="App port; the fake upstreams use the next two")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = asyncio.run(run(args))
+    print_results(results)
+
+    commit = git_commit()
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report = {
+        "commit": commit,
+        "timestamp": timestamp,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{timestamp}-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Measure tail latency and upstream cost of hedged model routing.
+
+Serves the app against a fake OpenRouter whose two models answer in
+``--latency`` seconds but now and then (``--tail-rate``) take
+``--tail-latency`` instead, and drives ``POST /generate-tweet`` with
+hedging off and on. Reports p50/p95/p99 latency, upstream calls per
+request (the cost of hedging), the hedge rate and how often the hedge won.
+
+    python benchmarks/bench_hedging.py --requests 400 --tail-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.bench_api import RESULTS_DIR, drive, git_commit  # noqa: E402
+from benchmarks.fake_upstreams import make_openrouter_app, run_in_thread, stop_server  # noqa: E402
+from benchmarks.stats import format_summary  # noqa: E402
+
+MODELS = ("bench/primary", "bench/backup")
+
+
+async def run(args):
+    draws = random.Random(args.seed)
+
+    def latency_for(model: str) -> float:
+        return args.tail_latency if draws.random() < args.tail_rate else args.latency
+
+    openrouter = make_openrouter_app(latency_for=latency_for)
+    servers = [run_in_thread(openrouter, port=args.port + 1)]
+    os.environ.update(
+        OPENROUTER_API_KEY="sk-or-v1-" + "0" * 64,
+        OPENROUTER_MODEL=MODELS[0],
+        OPENROUTER_MODELS=",".join(MODELS),
+        OPENROUTER_BASE_URL=f"http://127.0.0.1:{args.port + 1}/api/v1",
+        DATA_DIR=tempfile.mkdtemp(prefix="tweet-bench-hedging-"),
+        LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+    )
+    # main reads its configuration at import time
+    import main
+    from routing import ModelRouter
+
+    servers.append(run_in_thread(main.app, port=args.port))
+    results = {}
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=120.0) as client:
+            for name, max_hedges in (("unhedged", 0), ("hedged", 1)):
+                main.model_router = ModelRouter(
+                    MODELS, main.model_router.breakers, hedge_quantile=args.hedge_quantile,
+                    hedge_delay=args.hedge_delay, max_hedges=max_hedges
+                )
+                calls = openrouter.state.calls
+                summary = await drive(
+                    lambda index: client.post("/generate-tweet", json={"topic": f"hedging {index}", "no_cache": True}),
+                    args.requests, args.concurrency
+                )
+                snapshot = main.model_router.snapshot()
+                summary.update(
+                    upstream_calls_per_request=round((openrouter.state.calls - calls) / args.requests, 3),
+                    hedge_rate=snapshot["hedge_rate"],
+                    hedge_win_rate=snapshot["hedge_win_rate"],
+                )
+                results[name] = summary
+    finally:
+        for server in reversed(servers):
+            stop_server(server)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="Usual seconds per model call")
+    parser.add_argument("--tail-latency", type=float, default=1.0, help="Seconds for a slow model call")
+    parser.add_argument("--tail-rate", type=float, default=0.1, help="Fraction of model calls that are slow")
+    parser.add_argument("--hedge-quantile", type=float, default=0.95)
+    parser.add_argument("--hedge-delay", type=float, default=0.2, help="Hedge delay until a model has been measured")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8930, help="App port; the fake OpenRouter uses the next one")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<timestamp>-<commit>-hedging.json)")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    for name, summary in results.items():
+        print(format_summary(name, summary) + f" calls/request={summary['upstream_calls_per_request']:.3f}"
+              f" hedge_rate={summary['hedge_rate']} hedge_win_rate={summary['hedge_win_rate']}")
+
+    commit = git_commit()
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report = {
+        "commit": commit,
+        "timestamp": timestamp,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{timestamp}-{commit}-hedging.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
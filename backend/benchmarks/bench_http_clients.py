@@ -0,0 +1,69 @@
+"""Compare a fresh httpx.AsyncClient per request against one pooled client.
+
+Starts a local stand-in upstream and sends the same request stream through
+both strategies, reporting per-request latency percentiles.
+
+    python benchmarks/bench_http_clients.py --requests 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import create_http_client  # noqa: E402
+from benchmarks.fake_upstreams import run_in_thread, make_twitter_clone_app, stop_server  # noqa: E402
+from benchmarks.stats import format_summary, summarize  # noqa: E402
+
+
+async def drive(send, requests: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await send()
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies, time.perf_counter() - started
+
+
+async def main(args):
+    server = run_in_thread(make_twitter_clone_app(latency=args.latency), port=args.port)
+    url = f"http://127.0.0.1:{args.port}/post_tweet"
+    payload = {"username": "bench", "text": "benchmark tweet"}
+    headers = {"api-key": "bench"}
+
+    async def fresh_client():
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            return await client.post(url, json=payload, headers=headers)
+
+    shared = create_http_client(30.0)
+
+    async def shared_client():
+        return await shared.post(url, json=payload, headers=headers)
+
+    try:
+        for name, send in (("fresh client per request", fresh_client), ("shared pooled client", shared_client)):
+            latencies, elapsed = await drive(send, args.requests, args.concurrency)
+            print(format_summary(name, summarize(latencies, elapsed, args.requests)))
+    finally:
+        await shared.aclose()
+        stop_server(server)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="Artificial upstream latency in seconds")
+    parser.add_argument("--port", type=int, default=8901)
+    asyncio.run(main(parser.parse_args()))
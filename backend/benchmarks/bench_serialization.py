@@ -0,0 +1,188 @@
+"""Measure CPU time and memory of the record serialization paths.
+
+Compares, for a list of ``--records`` posted tweets:
+
+* building records: Pydantic models vs the slotted record types
+* encoding for storage: indented stdlib ``json.dumps`` vs ``jsoncodec``
+* rendering a list response: FastAPI's ``jsonable_encoder`` + ``JSONResponse``
+  (the path every list endpoint used to take) vs a single ``jsoncodec`` call
+* ``GET /posted-tweets`` end to end on SQLite, with the list cache disabled
+  (every request reads and encodes) and enabled (repeat requests reuse the
+  encoded body)
+
+Each case reports CPU milliseconds per operation and the peak memory
+allocated by one operation (tracemalloc). Results are written as JSON like
+``bench_api.py``'s and accept the same ``--compare``.
+
+    python benchmarks/bench_serialization.py --records 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import jsoncodec  # noqa: E402
+from benchmarks.bench_api import RESULTS_DIR, git_commit  # noqa: E402
+from records import PostedTweet  # noqa: E402
+
+
+class PostedTweetModel(BaseModel):
+    """The Pydantic model posted tweets were built with before the slotted records"""
+    id: str
+    content: str
+    posted_at: str
+    status: str
+
+
+def measure(operation, repeat: int) -> dict:
+    """CPU ms per call of ``operation()`` and the peak KiB allocated by one call"""
+    operation()  # warm up
+    started = time.process_time()
+    for _ in range(repeat):
+        operation()
+    cpu_ms = (time.process_time() - started) / repeat * 1000
+
+    tracemalloc.start()
+    operation()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"cpu_ms": round(cpu_ms, 3), "peak_kib": round(peak / 1024, 1)}
+
+
+def make_fields(count: int) -> list:
+    started = datetime.now(timezone.utc) - timedelta(days=365)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "content": f"Historic benchmark tweet {index} about serialization #bench #json",
+            "posted_at": (started + timedelta(seconds=index * 60)).isoformat(),
+            "status": "posted",
+        }
+        for index in range(count)
+    ]
+
+
+def bench_in_process(fields: list, repeat: int) -> dict:
+    records = {record["id"]: record for record in fields}
+    listing = {"posted_tweets": fields, "next_cursor": None}
+    rows = [jsoncodec.dumps(record).decode() for record in fields]
+    return {
+        "build/pydantic": measure(lambda: [PostedTweetModel(**record).model_dump() for record in fields], repeat),
+        "build/slotted": measure(lambda: [PostedTweet(**record).dict() for record in fields], repeat),
+        "store/json-indent": measure(lambda: json.dumps(records, indent=2, default=str).encode(), repeat),
+        f"store/{jsoncodec.BACKEND}": measure(lambda: jsoncodec.dumps(records), repeat),
+        "rows-decode/json": measure(lambda: [json.loads(row) for row in rows], repeat),
+        f"rows-decode/{jsoncodec.BACKEND}": measure(lambda: [jsoncodec.loads(row) for row in rows], repeat),
+        "response/fastapi": measure(lambda: JSONResponse(jsonable_encoder(listing)).body, repeat),
+        f"response/{jsoncodec.BACKEND}": measure(lambda: jsoncodec.dumps(listing), repeat),
+    }
+
+
+async def seed(data_dir: str, fields: list):
+    from storage import POSTED_TWEETS, create_storage
+
+    store = create_storage("sqlite", data_dir)
+    await store.open()
+    await store.put_many(POSTED_TWEETS, {record["id"]: record for record in fields})
+    await store.close()
+
+
+def bench_endpoint(fields: list, repeat: int, page_size: int) -> dict:
+    data_dir = tempfile.mkdtemp(prefix="tweet-bench-serialization-")
+    asyncio.run(seed(data_dir, fields))
+    os.environ.update(STORAGE_BACKEND="sqlite", DATA_DIR=data_dir, LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"))
+    # main reads its configuration at import time
+    import main
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(main.storage.open())
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench")
+
+    def get(params: dict):
+        return lambda: loop.run_until_complete(client.get("/posted-tweets", params=params)).raise_for_status()
+
+    results = {}
+    configured_size = main.LIST_CACHE_SIZE
+    try:
+        for cache, size in (("uncached", 0), ("cached", configured_size or 32)):
+            main.LIST_CACHE_SIZE = size
+            results[f"GET full list/{cache}"] = measure(get({}), repeat)
+            results[f"GET page of {page_size}/{cache}"] = measure(get({"limit": page_size}), repeat * 20)
+    finally:
+        main.LIST_CACHE_SIZE = configured_size
+        loop.run_until_complete(client.aclose())
+        loop.run_until_complete(main.storage.close())
+        loop.close()
+    return results
+
+
+def print_results(results: dict):
+    for name, result in results.items():
+        print(f"{name:34s} cpu={result['cpu_ms']:10.3f}ms  peak={result['peak_kib']:10.1f}KiB")
+
+
+def print_comparison(results: dict, baseline: dict):
+    print(f"\nCompared with {baseline['commit']} ({baseline['timestamp']}):")
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+        deltas = [f"{key.split('_')[0]} {(result[key] - before[key]) / before[key] * 100:+6.1f}%"
+                  for key in ("cpu_ms", "peak_kib") if before.get(key)]
+        print(f"{name:34s} " + "  ".join(deltas))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000, help="Posted tweets in the list")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed calls per case")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<timestamp>-<commit>-serialization.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    fields = make_fields(args.records)
+    print(f"📦 {args.records} records, JSON backend: {jsoncodec.BACKEND}")
+    results = bench_in_process(fields, args.repeat)
+    results.update(bench_endpoint(fields, args.repeat, args.page_size))
+    print_results(results)
+
+    commit = git_commit()
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report = {
+        "commit": commit,
+        "timestamp": timestamp,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "json_backend": jsoncodec.BACKEND,
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{timestamp}-{commit}-serialization.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
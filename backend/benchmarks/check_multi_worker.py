@@ -0,0 +1,238 @@
+"""Check that scheduled tweets are posted exactly once with several workers.
+
+Runs ``uvicorn main:app --workers N`` on the SQLite backend against a local
+Twitter clone stand-in, schedules a burst of tweets through whichever
+workers accept the connections, and waits for them to be posted. It then
+kills the worker that runs the scheduler, schedules a second burst, and
+checks that another worker takes over. Last it slows the clone down and
+kills the new scheduler worker in the middle of a burst, while tweets are
+being posted. Exits non-zero if any tweet was posted twice or never, or
+if a tweet is left claimed ("posting") by a dead worker; tweets of the
+interrupted burst may instead end up failed.
+
+    python benchmarks/check_multi_worker.py --workers 4 --tweets 200
+
+test_multi_worker.py runs a smaller version of the same check through
+run_check().
+"""
+import argparse
+import collections
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fake_upstreams import free_port, make_twitter_clone_app, run_in_thread, stop_server  # noqa: E402
+
+
+def fresh_client(base_url: str) -> httpx.Client:
+    # No keep-alive, so every request may land on a different worker
+    return httpx.Client(base_url=base_url, timeout=30.0, limits=httpx.Limits(max_keepalive_connections=0))
+
+
+def wait_until_up(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with fresh_client(base_url) as client:
+                if client.get("/health").status_code == 200:
+                    return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"API did not start within {timeout}s")
+
+
+def schedule_burst(base_url: str, prefix: str, count: int, due: datetime) -> list:
+    contents = [f"{prefix}-{index}" for index in range(count)]
+    with fresh_client(base_url) as client:
+        for content in contents:
+            response = client.post("/schedule-tweet", json={"content": content, "scheduled_time": due.isoformat()})
+            response.raise_for_status()
+    return contents
+
+
+def wait_for_drain(base_url: str, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    with fresh_client(base_url) as client:
+        while time.monotonic() < deadline:
+            busy = [
+                client.get("/scheduled-tweets", params={"status": status, "limit": 1}).json()["scheduled_tweets"]
+                for status in ("pending", "posting")
+            ]
+            if not any(busy):
+                return True
+            time.sleep(0.2)
+    return False
+
+
+def wait_for_status(base_url: str, status: str, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    with fresh_client(base_url) as client:
+        while time.monotonic() < deadline:
+            if client.get("/scheduled-tweets", params={"status": status, "limit": 1}).json()["scheduled_tweets"]:
+                return True
+            time.sleep(0.05)
+    return False
+
+
+def scheduled_statuses(base_url: str) -> dict:
+    """Status of every scheduled tweet, by content"""
+    statuses = {}
+    cursor = None
+    with fresh_client(base_url) as client:
+        while True:
+            params = {"limit": 500, **({"cursor": cursor} if cursor else {})}
+            page = client.get("/scheduled-tweets", params=params).json()
+            statuses.update((tweet["content"], tweet["status"]) for tweet in page["scheduled_tweets"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return statuses
+
+
+def find_leader(base_url: str, attempts: int = 200):
+    """PID of the worker running the scheduler, found by asking /health on fresh connections"""
+    with fresh_client(base_url) as client:
+        for _ in range(attempts):
+            health = client.get("/health").json()
+            if health.get("scheduler_leader"):
+                return health["worker_pid"]
+            time.sleep(0.05)
+    return None
+
+
+def run_check(workers: int = 4, tweets: int = 100, lease_ttl: float = 3.0, failover: bool = True,
+              post_latency: float = 1.0) -> dict:
+    """Run the scenario and return what the Twitter clone received.
+
+    ``duplicates`` maps tweets posted more than once to their count,
+    ``missing`` lists tweets that were neither posted nor (for the
+    interrupted burst) failed, and ``stuck`` lists tweets still pending or
+    posting at the end. ``error`` is set when the scenario couldn't run.
+    """
+    twitter = make_twitter_clone_app()
+    api_port, twitter_port = free_port(), free_port()
+    twitter_server = run_in_thread(twitter, port=twitter_port)
+    base_url = f"http://127.0.0.1:{api_port}"
+    data_dir = tempfile.mkdtemp(prefix="tweet-multi-worker-")
+    env = dict(
+        os.environ,
+        STORAGE_BACKEND="sqlite",
+        DATA_DIR=data_dir,
+        TWITTER_CLONE_URL=f"http://127.0.0.1:{twitter_port}/post_tweet",
+        TWITTER_CLONE_API_KEY="check",
+        TWITTER_CLONE_USERNAME="check",
+        SCHEDULER_LEASE_TTL=str(lease_ttl),
+        LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+    )
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(api_port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+
+    expected = []
+    interrupted = []
+    statuses = {}
+    error = None
+    try:
+        wait_until_up(base_url)
+        print(f"🚀 {workers} workers up, data in {data_dir}")
+
+        due = datetime.now(timezone.utc) + timedelta(seconds=3)
+        expected += schedule_burst(base_url, "burst-1", tweets, due)
+        drained = wait_for_drain(base_url, timeout=60)
+        print(f"⏰ burst 1: {len(twitter.state.received)} posts received, drained={drained}")
+
+        if failover:
+            error = run_failover(base_url, twitter, tweets, lease_ttl, post_latency, expected, interrupted)
+        statuses = scheduled_statuses(base_url)
+    finally:
+        api.send_signal(signal.SIGINT)
+        try:
+            api.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            api.kill()
+        stop_server(twitter_server)
+
+    posted = collections.Counter(body["text"] for _, body in twitter.state.received)
+    # Tweets cut off by the kill may be failed, whether or not they got out, but not lost
+    missing = [text for text in expected if text not in posted]
+    missing += [text for text in interrupted if text not in posted and statuses.get(text) != "failed"]
+    return {
+        "error": error,
+        "expected": len(expected) + len(interrupted),
+        "posted": sum(posted.values()),
+        "duplicates": {text: count for text, count in posted.items() if count > 1},
+        "missing": missing,
+        "stuck": [text for text, status in statuses.items() if status in ("pending", "posting")],
+        "interrupted": [text for text in interrupted if statuses.get(text) == "failed"],
+    }
+
+
+def run_failover(base_url: str, twitter, tweets: int, lease_ttl: float, post_latency: float,
+                 expected: list, interrupted: list):
+    """Kill the scheduler worker between bursts and then mid-burst. Returns an error message or None."""
+    leader = find_leader(base_url)
+    if leader is None:
+        return "no worker reported itself as scheduler leader"
+    os.kill(leader, signal.SIGKILL)
+    print(f"💀 killed scheduler worker {leader}")
+    # Due before the dead worker's lease lapses, so the takeover has a backlog to clear
+    due = datetime.now(timezone.utc) + timedelta(seconds=1)
+    expected += schedule_burst(base_url, "burst-2", tweets, due)
+    drained = wait_for_drain(base_url, timeout=60 + lease_ttl)
+    new_leader = find_leader(base_url)
+    print(f"⏰ burst 2: {len(twitter.state.received)} posts received, drained={drained}, "
+          f"new leader={new_leader}")
+    if new_leader is None:
+        return "no worker took over the scheduler"
+
+    twitter.state.latency = post_latency
+    due = datetime.now(timezone.utc) + timedelta(seconds=1)
+    interrupted += schedule_burst(base_url, "burst-3", tweets, due)
+    if not wait_for_status(base_url, "posting", timeout=30):
+        return "burst 3 never started posting"
+    leader = find_leader(base_url)
+    os.kill(leader, signal.SIGKILL)
+    print(f"💀 killed scheduler worker {leader} mid-burst")
+    drained = wait_for_drain(base_url, timeout=60 + lease_ttl)
+    print(f"⏰ burst 3: {len(twitter.state.received)} posts received, drained={drained}, "
+          f"new leader={find_leader(base_url)}")
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--tweets", type=int, default=100, help="Tweets per burst")
+    parser.add_argument("--lease-ttl", type=float, default=3.0, help="SCHEDULER_LEASE_TTL for the workers")
+    parser.add_argument("--no-failover", action="store_true", help="Skip killing the scheduler worker")
+    parser.add_argument("--post-latency", type=float, default=1.0,
+                        help="Twitter clone latency while the scheduler worker is killed mid-burst")
+    args = parser.parse_args(argv)
+
+    result = run_check(args.workers, args.tweets, args.lease_ttl, not args.no_failover, args.post_latency)
+    if result["error"]:
+        print(f"❌ {result['error']}")
+        return 1
+    duplicates, missing, stuck = result["duplicates"], result["missing"], result["stuck"]
+    print(f"📊 expected={result['expected']} posted={result['posted']} duplicates={len(duplicates)} "
+          f"missing={len(missing)} stuck={len(stuck)} interrupted={len(result['interrupted'])}")
+    if duplicates or missing or stuck:
+        print(f"❌ duplicates: {list(duplicates)[:10]} missing: {missing[:10]} stuck: {stuck[:10]}")
+        return 1
+    print("✅ every scheduled tweet was posted exactly once, or failed if the kill interrupted it")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Local stand-ins for the upstream services used by the benchmarks."""
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_threads = {}
+
+
+class FaultInjector:
+    """Decides, per request, whether an upstream should fail or rate-limit.
+
+    Draws come from a seeded generator so a run with the same settings sees
+    the same sequence of failures.
+    """
+
+    def __init__(self, error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: float = 1.0,
+                 seed: Optional[int] = 0):
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+
+    def response(self) -> Optional[JSONResponse]:
+        """A 429 or 500 response to send instead of the real one, or None"""
+        draw = self._random.random()
+        if draw < self.rate_limit_rate:
+            return JSONResponse(
+                {"error": {"message": "Rate limit exceeded", "code": 429}},
+                status_code=429,
+                headers={"Retry-After": f"{self.retry_after:g}"}
+            )
+        if draw < self.rate_limit_rate + self.error_rate:
+            return JSONResponse({"error": {"message": "Injected upstream failure", "code": 500}}, status_code=500)
+        return None
+
+
+def make_twitter_clone_app(latency: float = 0.0, faults: Optional[FaultInjector] = None) -> FastAPI:
+    """A Twitter clone that accepts posts after ``latency`` seconds.
+
+    Accepted posts are kept in ``app.state.received`` as
+    ``(received_at, body)`` pairs. ``app.state.latency`` can be changed
+    while the app runs.
+    """
+    app = FastAPI()
+    app.state.received = []
+    app.state.latency = latency
+    # Client port of each accepted post, to tell reused connections from new ones
+    app.state.peers = []
+
+    @app.post("/post_tweet")
+    async def post_tweet(request: Request):
+        body = await request.json()
+        if app.state.latency:
+            await asyncio.sleep(app.state.latency)
+        failure = faults.response() if faults else None
+        if failure is not None:
+            return failure
+        app.state.received.append((time.time(), body))
+        app.state.peers.append(request.client.port)
+        return {"success": True}
+
+    return app
+
+
+def make_openrouter_app(latency: float = 0.0, faults: Optional[FaultInjector] = None,
+                        chunk_delay: float = 0.005, latency_for: Optional[Callable[[str], float]] = None) -> FastAPI:
+    """An OpenRouter chat-completions endpoint that answers after ``latency`` seconds.
+
+    ``latency_for(model)``, when given, picks the delay of each call instead.
+    Honours ``n`` and ``stream``; streamed replies arrive in small chunks
+    ``chunk_delay`` seconds apart. Calls per model are counted in
+    ``app.state.model_calls``.
+    """
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.model_calls = {}
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        app.state.model_calls[body.get("model")] = app.state.model_calls.get(body.get("model"), 0) + 1
+        delay = latency_for(body.get("model")) if latency_for else latency
+        if delay:
+            await asyncio.sleep(delay)
+        failure = faults.response() if faults else None
+        if failure is not None:
+            return failure
+
+        prompt = body["messages"][-1]["content"]
+        topic = prompt.split("about:", 1)[-1].split("\n", 1)[0].strip()
+        text = f"Benchmarking {topic} one request at a time #bench #perf"
+
+        if body.get("stream"):
+            async def chunks():
+                for start in range(0, len(text), 8):
+                    delta = {"choices": [{"delta": {"content": text[start:start + 8]}}]}
+                    yield f"data: {json.dumps(delta)}\n\n"
+                    if chunk_delay:
+                        await asyncio.sleep(chunk_delay)
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        choices = [{"message": {"role": "assistant", "content": f"{text} v{index}"}}
+                   for index in range(body.get("n", 1))]
+        return {"id": "bench", "model": body.get("model"), "choices": choices}
+
+    return app
+
+
+def free_port(host: str = "127.0.0.1") -> int:
+    """A TCP port that nothing is listening on right now"""
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def run_in_thread(app: FastAPI, port: int, host: str = "127.0.0.1") -> uvicorn.Server:
+    """Serve ``app`` from a daemon thread and wait until it accepts connections"""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = _threads[id(server)] = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def stop_server(server: uvicorn.Server, timeout: float = 30.0):
+    """Ask a server started by ``run_in_thread`` to exit and wait for its shutdown handlers"""
+    server.should_exit = True
+    thread = _threads.pop(id(server), None)
+    if thread is not None:
+        thread.join(timeout)
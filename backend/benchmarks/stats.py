@@ -0,0 +1,39 @@
+"""Latency summaries shared by the benchmark scripts."""
+import statistics
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed: float, requests: int, errors: int = 0) -> dict:
+    """Throughput and latency percentiles (in milliseconds) for one run"""
+    summary = {
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else None,
+        "goodput_rps": round((requests - errors) / elapsed, 2) if elapsed else None,
+    }
+    if latencies:
+        summary.update(
+            p50_ms=round(percentile(latencies, 50) * 1000, 3),
+            p95_ms=round(percentile(latencies, 95) * 1000, 3),
+            p99_ms=round(percentile(latencies, 99) * 1000, 3),
+            mean_ms=round(statistics.mean(latencies) * 1000, 3),
+        )
+    return summary
+
+
+def format_summary(name: str, summary: dict) -> str:
+    line = f"{name:26s}"
+    if "p50_ms" in summary:
+        line += (f" p50={summary['p50_ms']:8.2f}ms p95={summary['p95_ms']:8.2f}ms"
+                 f" p99={summary['p99_ms']:8.2f}ms mean={summary['mean_ms']:8.2f}ms")
+    if summary.get("throughput_rps") is not None:
+        line += f" throughput={summary['throughput_rps']:8.1f} req/s"
+    if summary.get("errors"):
+        line += f" goodput={summary['goodput_rps']:8.1f} req/s errors={summary['errors']}"
+    return line
@@ -0,0 +1,79 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire ``ttl`` seconds after insertion"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class SingleFlightCache:
+    """TTL cache that also coalesces concurrent computations of the same key.
+
+    The first caller for a key runs ``compute`` in its own task; callers
+    arriving while it runs await the same task instead of starting another.
+    A cancelled caller doesn't cancel the shared computation, and failures
+    are passed to every waiter but never cached.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self._cache = TTLCache(max_size, ttl)
+        self._inflight = {}
+
+    def __len__(self):
+        return len(self._cache)
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]):
+        """Return ``(value, outcome)`` where outcome is "hit", "coalesced" or "miss" """
+        value = self._cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value, "hit"
+
+        task = self._inflight.get(key)
+        if task is not None:
+            return await asyncio.shield(task), "coalesced"
+
+        task = asyncio.create_task(compute())
+        self._inflight[key] = task
+
+        def finished(done: asyncio.Task):
+            self._inflight.pop(key, None)
+            if not done.cancelled() and done.exception() is None:
+                self._cache.set(key, done.result())
+
+        task.add_done_callback(finished)
+        return await asyncio.shield(task), "miss"
+
+    def clear(self):
+        self._cache.clear()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+
+import pytest
+
+# main.py reads its settings and opens storage at import time, so point it at
+# a throwaway data directory and stand-in upstreams before any test
+# imports it. load_dotenv() never overrides variables that are already set.
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="twitter-automation-tests-")
+os.environ.setdefault("OPENROUTER_API_KEY", "sk-or-test-0000000000000000")
+os.environ.setdefault("OPENROUTER_MODEL", "test/model")
+os.environ.setdefault("TWITTER_CLONE_URL", "http://twitter-clone.test/api/tweets")
+os.environ.setdefault("TWITTER_CLONE_API_KEY", "test-key")
+os.environ.setdefault("TWITTER_CLONE_USERNAME", "tester")
+
+# test_api.py is a manual check that posts a real tweet to the configured
+# Twitter clone, so it isn't collected with the rest of the suite
+collect_ignore = ["test_api.py"]
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: runs real servers for several seconds (deselect with -m 'not slow')")
+
+
+@pytest.fixture(scope="session")
+def client():
+    """One app lifespan for the whole run.
+
+    The scheduler and the posting semaphore bind to the first event loop that
+    uses them, just as they do under uvicorn, so every test shares one loop.
+    """
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def route_twitter_clone(monkeypatch):
+    """Call with an httpx MockTransport handler to have it answer every
+    account's posts; lanes made before the call are set aside."""
+    import httpx
+
+    import main
+
+    def route(handler):
+        monkeypatch.setattr(main.accounts, "client_factory",
+                            lambda max_connections: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        monkeypatch.setattr(main.accounts, "_lanes", {})
+
+    return route
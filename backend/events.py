@@ -0,0 +1,200 @@
+import asyncio
+import bisect
+import logging
+from collections import deque
+from typing import Optional
+
+from metrics import Counter, Gauge
+from storage import DRAFTS, POST_JOBS, POSTED_TWEETS, RECURRING_SCHEDULES, SCHEDULED_TWEETS, Storage
+
+logger = logging.getLogger(__name__)
+
+EVENT_CONNECTIONS = Gauge("event_stream_connections", "Open event stream connections", ["transport"])
+EVENTS_SENT = Counter("event_stream_events_sent", "Events pushed to clients", ["transport"])
+EVENT_STREAM_RESETS = Counter(
+    "event_stream_resets", "Clients told to refetch because the events they missed are gone", ["transport"])
+
+# Event type prefix for each collection that is pushed to clients
+EVENT_KINDS = {
+    DRAFTS: "draft",
+    SCHEDULED_TWEETS: "scheduled_tweet",
+    POSTED_TWEETS: "tweet",
+    POST_JOBS: "post_job",
+    RECURRING_SCHEDULES: "recurring_schedule",
+}
+
+
+def event_type(collection: str, op: str, record: Optional[dict]) -> Optional[str]:
+    """``"<kind>.<what happened>"`` for a change, or None when clients don't need it.
+
+    Scheduled tweets, recurring schedules and post jobs report their new
+    status, drafts whether they were created or updated, posted tweets that
+    they were posted.
+    """
+    kind = EVENT_KINDS.get(collection)
+    if kind is None or op == "archive":
+        return None
+    if op == "replace":
+        return f"{kind}.reset"
+    if op == "delete":
+        return f"{kind}.deleted"
+    if record is None:
+        # Replayed put of a record deleted since; its delete follows
+        return None
+    if collection == DRAFTS:
+        return f"{kind}.created" if record.get("created_at") == record.get("updated_at") else f"{kind}.updated"
+    if collection == POSTED_TWEETS:
+        return f"{kind}.posted"
+    return f"{kind}.{record.get('status')}"
+
+
+def make_event(change: dict, record: Optional[dict]) -> Optional[dict]:
+    name = event_type(change["collection"], change["op"], record)
+    if name is None:
+        return None
+    return {
+        "id": change["version"],
+        "type": name,
+        "collection": change["collection"],
+        "record_id": change["id"],
+        "record": record,
+    }
+
+
+class EventHub:
+    """Turns the storage change feed into events for push connections.
+
+    Event ids are storage versions, so a client can resume from the last
+    id it saw. Recent events are kept in a ring buffer; older ones are
+    rebuilt from the change log, and a client that fell behind even that
+    gets a ``reset`` event telling it to refetch the lists. Events read
+    from the change log (older ones, and writes by other workers) carry
+    the record's current state rather than its state at the time.
+
+    Connections don't get their own queue: each keeps a cursor and reads
+    the events after it when woken, at the pace it can send them. A slow
+    client only falls behind, and an idle one costs a parked coroutine.
+    Writes by this worker arrive through a storage listener; while anyone
+    is connected the hub also polls the change feed every
+    ``poll_interval`` seconds for writes made by other workers.
+    """
+
+    def __init__(self, storage: Storage, buffer_size: int = 1000, poll_interval: float = 1.0):
+        self.storage = storage
+        self.poll_interval = poll_interval
+        self.version: Optional[int] = None
+        self._events = deque(maxlen=buffer_size)
+        # Every event after this version is in the buffer
+        self._floor: Optional[int] = None
+        self._wakeups = set()
+        self._poll_task: Optional[asyncio.Task] = None
+        storage.add_listener(self._on_change)
+
+    async def start(self):
+        self.version = self._floor = await self.storage.current_version()
+        self._poll_task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+
+    def _append(self, change: dict, record: Optional[dict]):
+        self.version = change["version"]
+        event = make_event(change, record)
+        if event is None:
+            return
+        if len(self._events) == self._events.maxlen:
+            self._floor = self._events[0]["id"]
+        self._events.append(event)
+        for wakeup in self._wakeups:
+            wakeup.set()
+
+    def _on_change(self, change: dict, record: Optional[dict]):
+        # Anything after a gap is picked up by the poll, in order
+        if self.version is not None and change["version"] == self.version + 1:
+            self._append(change, record)
+
+    async def catch_up(self):
+        """Apply changes this worker wasn't notified of"""
+        while True:
+            result = await self.storage.changes_since(self.version, 500)
+            if result["reset"]:
+                # The log moved past the hub; clients behind it are reset on resume
+                self.version = self._floor = result["version"]
+                self._events.clear()
+                return
+            for change in result["changes"]:
+                if change["version"] > self.version:
+                    self._append(change, change["record"])
+            if not result["has_more"]:
+                return
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self._wakeups:
+                continue
+            try:
+                await self.catch_up()
+            except Exception as e:
+                logger.error("❌ Error polling the change feed for events", extra={"error": str(e)})
+
+    async def events_after(self, last_id: int, limit: int = 500) -> tuple:
+        """``(events, cursor, reset)``: up to ``limit`` events after ``last_id`` and the id to continue from"""
+        if last_id > self.version:
+            # A client resuming on this worker may have seen events it hasn't caught up with yet
+            await self.catch_up()
+            if last_id > self.version:
+                return [], self.version, True
+        if last_id >= self._floor:
+            ids = [event["id"] for event in self._events]
+            start = bisect.bisect_right(ids, last_id)
+            events = list(self._events)[start:start + limit]
+            return events, events[-1]["id"] if len(events) == limit else self.version, False
+        result = await self.storage.changes_since(last_id, limit)
+        if result["reset"] or not result["changes"]:
+            return [], self.version, True
+        events = []
+        for change in result["changes"]:
+            if change["version"] > self._floor:
+                break
+            event = make_event(change, change["record"])
+            if event is not None:
+                events.append(event)
+        return events, min(result["changes"][-1]["version"], self._floor), False
+
+    async def subscribe(self, last_id: Optional[int] = None, heartbeat: float = 30.0):
+        """Yield events after ``last_id`` (only new ones when None) as they happen.
+
+        Yields ``{"type": "reset"}`` when the missed events are gone and
+        ``None`` after ``heartbeat`` idle seconds so transports can keep
+        the connection alive.
+        """
+        wakeup = asyncio.Event()
+        self._wakeups.add(wakeup)
+        try:
+            cursor = self.version if last_id is None else last_id
+            while True:
+                wakeup.clear()
+                events, next_cursor, reset = await self.events_after(cursor)
+                if reset:
+                    yield {"id": next_cursor, "type": "reset"}
+                for event in events:
+                    yield event
+                if next_cursor != cursor or reset:
+                    cursor = next_cursor
+                    continue
+                try:
+                    await asyncio.wait_for(wakeup.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._wakeups.discard(wakeup)
+
+    def __len__(self) -> int:
+        return len(self._wakeups)
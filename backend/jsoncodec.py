@@ -0,0 +1,27 @@
+"""JSON encoding for stored records and API responses.
+
+Uses orjson when it is installed (several times faster, and it produces
+bytes directly) and falls back to the standard library otherwise. Output
+is compact either way; values JSON can't represent are stringified.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    def dumps(value) -> bytes:
+        return orjson.dumps(value, default=str)
+
+    loads = orjson.loads
+else:
+    _encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=str)
+
+    def dumps(value) -> bytes:
+        return _encoder.encode(value).encode()
+
+    loads = json.loads
@@ -0,0 +1,156 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_STANDARD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+# Secrets that may show up in messages even when their exact value is unknown
+_SECRET_PATTERNS = [
+    (re.compile(r"sk-or-v1-[A-Za-z0-9]+"), "sk-or-v1-[REDACTED]"),
+    (re.compile(r"(Bearer\s+)[^\s'\",}]+", re.IGNORECASE), r"\1[REDACTED]"),
+    (re.compile(r"(['\"]?(?:api[-_]key|authorization)['\"]?\s*[:=]\s*['\"]?)[^'\",}\s]+", re.IGNORECASE),
+     r"\1[REDACTED]"),
+]
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_payload_sample_rate = 0.0
+
+
+class RedactingFilter(logging.Filter):
+    """Masks configured secret values and well-known credential patterns"""
+
+    def __init__(self, secrets: Iterable[Optional[str]] = ()):
+        super().__init__()
+        self.secrets = [secret for secret in secrets if secret and len(secret) >= 8]
+
+    def redact(self, text: str) -> str:
+        for secret in self.secrets:
+            text = text.replace(secret, "[REDACTED]")
+        for pattern, replacement in _SECRET_PATTERNS:
+            text = pattern.sub(replacement, text)
+        return text
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg = self.redact(record.getMessage())
+        record.args = None
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and isinstance(value, str):
+                setattr(record, key, self.redact(value))
+        return True
+
+
+class StructuredFormatter(logging.Formatter):
+    """One line per record, as JSON or as ``key=value`` text"""
+
+    def __init__(self, json_output: bool = False):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields.update((key, value) for key, value in record.__dict__.items() if key not in _STANDARD_ATTRS)
+        exc = record.exc_text or (self.formatException(record.exc_info) if record.exc_info else None)
+        if exc:
+            fields["exc"] = exc
+        if self.json_output:
+            return json.dumps(fields, default=str, ensure_ascii=False)
+        extra = " ".join(f"{key}={value!r}" for key, value in fields.items()
+                         if key not in ("ts", "level", "logger", "msg", "exc"))
+        line = f"{fields['ts']} {fields['level']:<7} {fields['logger']}: {fields['msg']}"
+        if extra:
+            line += f" | {extra}"
+        if "exc" in fields:
+            line += "\n" + fields["exc"]
+        return line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the message; formatting and redaction happen on the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = "INFO", json_output: bool = False, secrets: Iterable[Optional[str]] = (),
+                  payload_sample_rate: float = 0.0):
+    """Route all logging through a queue drained by a background thread.
+
+    Callers on the event loop only enqueue records; formatting, secret
+    redaction and the write to stdout happen on the listener thread.
+    """
+    global _listener, _payload_sample_rate
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(StructuredFormatter(json_output))
+    output.addFilter(RedactingFilter(secrets))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _QueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    _payload_sample_rate = payload_sample_rate
+
+
+def shutdown_logging():
+    """Drain queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+def set_log_level(level: str, logger_name: Optional[str] = None) -> str:
+    """Change a logger's level at runtime. Returns the effective level name."""
+    logger = logging.getLogger(logger_name)
+    logger.setLevel(level.upper())
+    return logging.getLevelName(logger.getEffectiveLevel())
+
+
+def get_log_levels() -> dict:
+    """Effective level of the root logger and of every logger configured explicitly"""
+    levels = {"root": logging.getLevelName(logging.getLogger().getEffectiveLevel())}
+    for name, logger in sorted(logging.root.manager.loggerDict.items()):
+        if isinstance(logger, logging.Logger) and logger.level != logging.NOTSET:
+            levels[name] = logging.getLevelName(logger.level)
+    return levels
+
+
+def payload_log_level(logger: logging.Logger) -> Optional[int]:
+    """Level at which to log full request/response bodies for this call, or None to skip them.
+
+    Bodies are always logged at DEBUG; otherwise a ``payload_sample_rate``
+    fraction of calls logs them at INFO.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        return logging.DEBUG
+    if _payload_sample_rate > 0 and random.random() < _payload_sample_rate:
+        return logging.INFO
+    return None
@@ -1,15 +1,43 @@
-from fastapi import FastAPI, HTTPException, Header
+from fastapi import FastAPI, HTTPException, Header, Query, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import AfterValidator, BaseModel, Field, field_validator
 import httpx
 import os
-from typing import Optional, List
+from typing import Annotated, Optional, List
 import json
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 import asyncio
+import logging
+import math
+import time
 import uuid
-import aiofiles
+
+from accounts import (
+    ACCOUNT_ID_PATTERN, DEFAULT_ACCOUNT_ID, AccountLane, AccountRegistry, UnknownAccount, public_account,
+    validate_account_url
+)
+from analytics import Analytics
+from archive import Archive, page_with_archive
+from cache import SingleFlightCache
+from events import EVENT_CONNECTIONS, EVENT_STREAM_RESETS, EVENTS_SENT, EventHub
+import jsoncodec
+from logging_setup import get_log_levels, payload_log_level, set_log_level, setup_logging, shutdown_logging
+from metrics import Counter, Gauge, Histogram, RequestMetricsMiddleware, render_metrics
+from outbox import Outbox, PermanentError, RetryableError, job_id_for_key
+from records import Account, DraftTweet, PostedTweet, RecurringSchedule, ScheduledTweet
+from recurrence import CronSchedule
+from routing import ModelRouter
+from resilience import (
+    CircuitBreaker, CircuitOpenError, RateLimitExceeded, TokenBucket, backoff_delay, parse_retry_after
+)
+from scheduler import LeaderElection, TweetScheduler
+from search import SEARCH_TYPES, SearchIndex
+from storage import (
+    create_storage, lease_holder_id, ACCOUNTS, DRAFTS, POST_JOBS, POSTED_TWEETS, RECURRING_SCHEDULES, SCHEDULED_TWEETS
+)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -30,68 +58,94 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
-# File paths for persistent storage
-DRAFTS_FILE = "data/drafts.json"
-POSTED_TWEETS_FILE = "data/posted_tweets.json"
-SCHEDULED_TWEETS_FILE = "data/scheduled_tweets.json"
+# Persistent storage ("sqlite" or "json")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+DATA_DIR = os.getenv("DATA_DIR", "data")
+# Write-behind settings for the json backend
+STORAGE_FLUSH_INTERVAL = float(os.getenv("STORAGE_FLUSH_INTERVAL", 1.0))
+STORAGE_MAX_DIRTY = int(os.getenv("STORAGE_MAX_DIRTY", 500))
+# Number of recent changes kept for the /changes feed
+CHANGE_LOG_SIZE = int(os.getenv("CHANGE_LOG_SIZE", 10000))
+# Posted tweets older than ARCHIVE_AFTER_DAYS are moved, a whole month (or day,
+# see ARCHIVE_PARTITION) at a time, into compressed segments under
+# DATA_DIR/archive by the scheduler leader every ARCHIVE_INTERVAL seconds
+# (0 disables); ARCHIVE_CACHE_SEGMENTS decoded segments are kept for queries
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", 90))
+ARCHIVE_PARTITION = os.getenv("ARCHIVE_PARTITION", "month")
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", 3600))
+ARCHIVE_CACHE_SEGMENTS = int(os.getenv("ARCHIVE_CACHE_SEGMENTS", 4))
 
 # Ensure data directory exists
-os.makedirs("data", exist_ok=True)
-
-# Storage management functions
-async def load_json_file(file_path: str) -> dict:
-    """Load data from JSON file"""
-    try:
-        if os.path.exists(file_path):
-            async with aiofiles.open(file_path, 'r') as f:
-                content = await f.read()
-                return json.loads(content) if content.strip() else {}
-        return {}
-    except Exception as e:
-        print(f"Error loading {file_path}: {e}")
-        return {}
-
-async def save_json_file(file_path: str, data: dict):
-    """Save data to JSON file"""
-    try:
-        async with aiofiles.open(file_path, 'w') as f:
-            await f.write(json.dumps(data, indent=2, default=str))
-    except Exception as e:
-        print(f"Error saving {file_path}: {e}")
-
-async def get_drafts():
-    """Get all drafts from file"""
-    return await load_json_file(DRAFTS_FILE)
-
-async def save_drafts(drafts: dict):
-    """Save drafts to file"""
-    await save_json_file(DRAFTS_FILE, drafts)
+os.makedirs(DATA_DIR, exist_ok=True)
 
-async def get_posted_tweets():
-    """Get all posted tweets from file"""
-    return await load_json_file(POSTED_TWEETS_FILE)
-
-async def save_posted_tweets(posted_tweets: dict):
-    """Save posted tweets to file"""
-    await save_json_file(POSTED_TWEETS_FILE, posted_tweets)
-
-async def get_scheduled_tweets():
-    """Get all scheduled tweets from file"""
-    return await load_json_file(SCHEDULED_TWEETS_FILE)
+storage = create_storage(
+    STORAGE_BACKEND,
+    DATA_DIR,
+    flush_interval=STORAGE_FLUSH_INTERVAL,
+    max_dirty=STORAGE_MAX_DIRTY,
+    change_log_size=CHANGE_LOG_SIZE,
+)
 
-async def save_scheduled_tweets(scheduled_tweets: dict):
-    """Save scheduled tweets to file"""
-    await save_json_file(SCHEDULED_TWEETS_FILE, scheduled_tweets)
+# Collections whose older records live in an archive; list endpoints and views read both
+archives = {
+    POSTED_TWEETS: Archive(os.path.join(DATA_DIR, "archive"), POSTED_TWEETS, ARCHIVE_PARTITION, ARCHIVE_CACHE_SEGMENTS),
+}
 
 # Models
 class GenerateTweetRequest(BaseModel):
     topic: str
     hashtags: Optional[str] = ""
     tone: Optional[str] = "engaging"
+    no_cache: bool = False  # skip the generation cache for this request
+
+class BatchGenerateRequest(BaseModel):
+    items: List[GenerateTweetRequest] = Field(..., min_length=1, max_length=100)
+    n: int = Field(1, ge=1, le=10)  # variants per item
 
 class PostTweetRequest(BaseModel):
     content: str
+    account_id: Optional[str] = None  # registered account to post as (default: the TWITTER_CLONE_* one)
+
+class FanOutPostRequest(BaseModel):
+    content: str
+    account_ids: List[str] = Field(..., min_length=1, max_length=100)
+
+AccountUrl = Annotated[str, AfterValidator(validate_account_url)]
+
+class AccountRequest(BaseModel):
+    id: str = Field(..., pattern=ACCOUNT_ID_PATTERN)
+    username: str
+    api_key: str
+    # Unset settings follow TWITTER_CLONE_URL, TWITTER_CLONE_RATE_LIMIT,
+    # TWITTER_CLONE_RATE_BURST and TWITTER_CLONE_MAX_CONNECTIONS
+    url: Optional[AccountUrl] = None
+    rate_limit: Optional[float] = Field(None, ge=0)  # tweets per second, 0 for no limit
+    rate_burst: Optional[int] = Field(None, ge=1)
+    max_connections: Optional[int] = Field(None, ge=1, le=1000)
+
+class AccountUpdateRequest(BaseModel):
+    # Omitted fields are left as they are; the limits can be set to null
+    # to follow the defaults again
+    username: Optional[str] = None
+    api_key: Optional[str] = None
+    url: Optional[AccountUrl] = None
+    rate_limit: Optional[float] = Field(None, ge=0)
+    rate_burst: Optional[int] = Field(None, ge=1)
+    max_connections: Optional[int] = Field(None, ge=1, le=1000)
+    
+    @field_validator("username", "api_key", "url")
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("Can be left out but not set to null")
+        return value
+
+class BatchPostRequest(BaseModel):
+    items: List[PostTweetRequest] = Field(..., min_length=1, max_length=500)
+    concurrency: Optional[int] = Field(None, ge=1, le=100)  # defaults to POST_BATCH_CONCURRENCY
+    interval: float = Field(0.0, ge=0, le=60)  # minimum seconds between consecutive sends
 
 class SaveDraftRequest(BaseModel):
     content: str
@@ -101,31 +155,34 @@ class SaveDraftRequest(BaseModel):
 class ScheduleTweetRequest(BaseModel):
     content: str
     scheduled_time: str  # ISO format datetime string
+    account_id: Optional[str] = None
 
-class TweetResponse(BaseModel):
+class RecurringScheduleRequest(BaseModel):
     content: str
-    hashtags: list[str]
+    cron: str  # "minute hour day-of-month month day-of-week", or @hourly/@daily/@weekly/@monthly/@yearly
+    timezone: str = "UTC"  # IANA name the cron fields are read in, e.g. "Europe/Paris"
+    start_at: Optional[str] = None  # ISO datetime; no occurrence before it (default: now)
+    end_at: Optional[str] = None  # ISO datetime; no occurrence after it
+    max_occurrences: Optional[int] = Field(None, ge=1)
+    account_id: Optional[str] = None
 
-class DraftTweet(BaseModel):
-    id: str
-    content: str
-    hashtags: str
-    tone: str
-    created_at: str
-    updated_at: str
+class RecurrencePreviewRequest(BaseModel):
+    cron: str
+    timezone: str = "UTC"
+    start_at: Optional[str] = None
+    end_at: Optional[str] = None
+    max_occurrences: Optional[int] = Field(None, ge=1)
+    since: Optional[str] = None  # window to list occurrences in (default: from now, open-ended)
+    until: Optional[str] = None
+    limit: int = Field(10, ge=1)
 
-class PostedTweet(BaseModel):
-    id: str
-    content: str
-    posted_at: str
-    status: str
+class LogLevelRequest(BaseModel):
+    level: str
+    logger: Optional[str] = None  # root logger when omitted
 
-class ScheduledTweet(BaseModel):
-    id: str
+class TweetResponse(BaseModel):
     content: str
-    scheduled_time: str
-    created_at: str
-    status: str  # "pending", "posted", "failed"
+    hashtags: list[str]
 
 # Configuration from environment
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
@@ -133,7 +190,164 @@ OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL")
 TWITTER_CLONE_API_KEY = os.getenv("TWITTER_CLONE_API_KEY")
 TWITTER_CLONE_USERNAME = os.getenv("TWITTER_CLONE_USERNAME")
 TWITTER_CLONE_URL = os.getenv("TWITTER_CLONE_URL")
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+# Whether OPENROUTER_MODEL honours the "n" parameter (several choices per call)
+OPENROUTER_SUPPORTS_N = os.getenv("OPENROUTER_SUPPORTS_N", "false").lower() == "true"
+# Maximum number of batch items generated at the same time
+GENERATION_BATCH_CONCURRENCY = int(os.getenv("GENERATION_BATCH_CONCURRENCY", 5))
+# Opt-in cache of generation results for identical requests
+GENERATION_CACHE_ENABLED = os.getenv("GENERATION_CACHE_ENABLED", "false").lower() == "true"
+GENERATION_CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", 300))
+GENERATION_CACHE_SIZE = int(os.getenv("GENERATION_CACHE_SIZE", 1000))
 PORT = int(os.getenv("PORT", 8000))
+# Largest page the list endpoints return when "limit" is given
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+# Encoded list responses kept for reuse until their collection changes (0 disables)
+LIST_CACHE_SIZE = int(os.getenv("LIST_CACHE_SIZE", 32))
+LIST_CACHE_TTL = float(os.getenv("LIST_CACHE_TTL", 300))
+# Default number of tweets a /post-tweets/batch request sends at the same time
+POST_BATCH_CONCURRENCY = int(os.getenv("POST_BATCH_CONCURRENCY", 10))
+# Maximum number of scheduled tweets posted at the same time
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", 20))
+# With several workers, one is elected to run the scheduler through a lease of
+# this many seconds, and it picks up tweets scheduled by the other workers
+# every SCHEDULER_SYNC_INTERVAL seconds
+SCHEDULER_LEASE_TTL = float(os.getenv("SCHEDULER_LEASE_TTL", 15.0))
+SCHEDULER_SYNC_INTERVAL = float(os.getenv("SCHEDULER_SYNC_INTERVAL", 1.0))
+# Deadline in seconds for posting a single scheduled tweet
+SCHEDULED_POST_TIMEOUT = float(os.getenv("SCHEDULED_POST_TIMEOUT", 30.0))
+# Outbox for /post-tweet requests sent with an Idempotency-Key: jobs delivered
+# at the same time, attempts per job, backoff between attempts in seconds,
+# how often the outbox checks for jobs queued by other workers, and how long
+# finished jobs are kept
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", 10))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+OUTBOX_RETRY_BASE_DELAY = float(os.getenv("OUTBOX_RETRY_BASE_DELAY", 1.0))
+OUTBOX_RETRY_MAX_DELAY = float(os.getenv("OUTBOX_RETRY_MAX_DELAY", 60.0))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1.0))
+OUTBOX_RETENTION = float(os.getenv("OUTBOX_RETENTION", 7 * 86400))
+# Push channel (/ws/events and /events): recent events kept for clients that
+# resume from a last event id, how often writes by other workers are picked up
+# while clients are connected, and seconds between keep-alives on idle connections
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", 1000))
+EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", 1.0))
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", 30.0))
+
+# Connection pool settings for the shared upstream HTTP clients
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30.0))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5.0))
+OPENROUTER_READ_TIMEOUT = float(os.getenv("OPENROUTER_READ_TIMEOUT", 45.0))
+TWITTER_CLONE_READ_TIMEOUT = float(os.getenv("TWITTER_CLONE_READ_TIMEOUT", 30.0))
+# Defaults for every Twitter clone account (the TWITTER_CLONE_* one and those
+# registered through /accounts, which can override them): tweets per second
+# (0 disables the limit) and burst, connections in the account's own pool,
+# and how long an immediate /post-tweet may wait for the account's rate limit
+# before failing with a 429
+TWITTER_CLONE_RATE_LIMIT = float(os.getenv("TWITTER_CLONE_RATE_LIMIT", 0))
+TWITTER_CLONE_RATE_BURST = int(os.getenv("TWITTER_CLONE_RATE_BURST", 5))
+TWITTER_CLONE_MAX_CONNECTIONS = int(os.getenv("TWITTER_CLONE_MAX_CONNECTIONS", HTTP_MAX_CONNECTIONS))
+TWITTER_CLONE_RATE_LIMIT_MAX_WAIT = float(os.getenv("TWITTER_CLONE_RATE_LIMIT_MAX_WAIT", 10.0))
+
+# Outbound OpenRouter rate limit (requests per second, 0 disables) and the
+# longest a request may wait for a slot before being refused with a 429.
+# Retry-After pauses from OpenRouter are honoured either way.
+OPENROUTER_RATE_LIMIT = float(os.getenv("OPENROUTER_RATE_LIMIT", 0))
+OPENROUTER_RATE_BURST = int(os.getenv("OPENROUTER_RATE_BURST", 20))
+OPENROUTER_RATE_LIMIT_MAX_WAIT = float(os.getenv("OPENROUTER_RATE_LIMIT_MAX_WAIT", 10.0))
+# Retries for timeouts, network errors, 429s and 5xx responses
+OPENROUTER_MAX_RETRIES = int(os.getenv("OPENROUTER_MAX_RETRIES", 3))
+OPENROUTER_RETRY_BASE_DELAY = float(os.getenv("OPENROUTER_RETRY_BASE_DELAY", 0.5))
+OPENROUTER_RETRY_MAX_DELAY = float(os.getenv("OPENROUTER_RETRY_MAX_DELAY", 10.0))
+# Consecutive failures that open the circuit, and seconds before probing again
+OPENROUTER_BREAKER_THRESHOLD = int(os.getenv("OPENROUTER_BREAKER_THRESHOLD", 5))
+OPENROUTER_BREAKER_RESET = float(os.getenv("OPENROUTER_BREAKER_RESET", 30.0))
+# Candidate models for tweet generation, comma separated (default: OPENROUTER_MODEL).
+# Each request goes to the fastest healthy one; when it hasn't answered within
+# its recent OPENROUTER_HEDGE_QUANTILE latency (OPENROUTER_HEDGE_DELAY seconds
+# until it has been measured), the request is also sent to the next model and
+# the first answer wins. OPENROUTER_MAX_HEDGES=0 disables hedging.
+OPENROUTER_MODELS = [model.strip() for model in os.getenv("OPENROUTER_MODELS", "").split(",") if model.strip()] or [OPENROUTER_MODEL]
+OPENROUTER_HEDGE_QUANTILE = float(os.getenv("OPENROUTER_HEDGE_QUANTILE", 0.95))
+OPENROUTER_HEDGE_DELAY = float(os.getenv("OPENROUTER_HEDGE_DELAY", 5.0))
+OPENROUTER_MAX_HEDGES = int(os.getenv("OPENROUTER_MAX_HEDGES", 1))
+
+# Logging: level, "text" or "json" output, and the fraction of upstream calls
+# whose full payloads are logged at INFO (they are always logged at DEBUG)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 0.0))
+# When set, /admin endpoints require this value in the "admin-api-key" header
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+setup_logging(
+    LOG_LEVEL,
+    json_output=LOG_FORMAT == "json",
+    secrets=[OPENROUTER_API_KEY, TWITTER_CLONE_API_KEY, ADMIN_API_KEY],
+    payload_sample_rate=LOG_PAYLOAD_SAMPLE_RATE,
+)
+logger = logging.getLogger("api")
+# httpx logs every request at INFO, which would double the hot-path log volume
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Long-lived OpenRouter client, opened in startup_event; Twitter clone
+# accounts each get their own from the account registry
+openrouter_client: Optional[httpx.AsyncClient] = None
+
+UPSTREAM_REQUEST_SECONDS = Histogram(
+    "upstream_request_duration_seconds", "Time from sending an upstream request until its response headers arrive",
+    ["upstream"])
+UPSTREAM_RESPONSES = Counter(
+    "upstream_responses", "Upstream responses by status code, or \"error\" when none arrived", ["upstream", "status"])
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Records latency and status codes for every request sent to one upstream"""
+    
+    def __init__(self, transport: httpx.AsyncBaseTransport, upstream: str):
+        self._transport = transport
+        self.upstream = upstream
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - started, upstream=self.upstream)
+            UPSTREAM_RESPONSES.inc(upstream=self.upstream, status="error")
+            raise
+        UPSTREAM_REQUEST_SECONDS.observe(time.perf_counter() - started, upstream=self.upstream)
+        UPSTREAM_RESPONSES.inc(upstream=self.upstream, status=str(response.status_code))
+        return response
+    
+    async def aclose(self):
+        await self._transport.aclose()
+
+def create_http_client(read_timeout: float, base_url: str = "", upstream: str = "upstream",
+                       max_connections: int = HTTP_MAX_CONNECTIONS) -> httpx.AsyncClient:
+    """Build a pooled client that keeps connections to one upstream alive between requests"""
+    http2 = HTTP2_ENABLED
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("⚠️ HTTP2_ENABLED is set but the 'h2' package is not installed, using HTTP/1.1")
+            http2 = False
+    
+    transport = httpx.AsyncHTTPTransport(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=min(HTTP_MAX_KEEPALIVE, max_connections),
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        )
+    )
+    return httpx.AsyncClient(
+        base_url=base_url,
+        timeout=httpx.Timeout(read_timeout, connect=HTTP_CONNECT_TIMEOUT),
+        transport=InstrumentedTransport(transport, upstream)
+    )
 
 def get_current_utc_time():
     """Get current UTC time as timezone-aware datetime"""
@@ -162,107 +376,144 @@ async def root():
         "openrouter_configured": bool(OPENROUTER_API_KEY and len(OPENROUTER_API_KEY) > 10),
         "twitter_clone_configured": bool(TWITTER_CLONE_URL and TWITTER_CLONE_API_KEY),
         "model": OPENROUTER_MODEL,
+        "models": OPENROUTER_MODELS,
         "environment_loaded": True
     }
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": get_current_utc_time().isoformat()}
+    return {
+        "status": "healthy",
+        "timestamp": get_current_utc_time().isoformat(),
+        "openrouter_circuit": openrouter_breaker.snapshot(),
+        "openrouter_models": model_router.snapshot(),
+        "worker_pid": os.getpid(),
+        "scheduler_leader": scheduler_election.is_leader
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    SCHEDULER_PENDING.set(len(scheduler))
+    RECURRING_SCHEDULER_PENDING.set(len(recurring_scheduler))
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
+def check_admin_key(admin_api_key: Optional[str]):
+    """Reject admin calls without the configured ADMIN_API_KEY.
+    
+    Admin endpoints stay disabled until a key is configured.
+    """
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_API_KEY to enable them")
+    if admin_api_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid admin API key")
+
+@app.get("/admin/log-level")
+async def get_log_level(admin_api_key: Optional[str] = Header(None)):
+    """Effective log levels of the root logger and any explicitly configured loggers"""
+    check_admin_key(admin_api_key)
+    return {"levels": get_log_levels()}
+
+@app.put("/admin/log-level")
+async def update_log_level(request: LogLevelRequest, admin_api_key: Optional[str] = Header(None)):
+    """Change a log level at runtime, e.g. {"level": "DEBUG", "logger": "api"}"""
+    check_admin_key(admin_api_key)
+    if request.level.upper() not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
+        raise HTTPException(status_code=400, detail=f"Unknown log level: {request.level}")
+    level = set_log_level(request.level, request.logger)
+    logger.info("🔧 Log level changed", extra={"target": request.logger or "root", "new_level": level})
+    return {"logger": request.logger or "root", "level": level}
 
 @app.get("/test-openrouter")
 async def test_openrouter():
     """Test OpenRouter API with a simple request"""
     try:
-        print(f"🔑 Testing OpenRouter API...")
-        print(f"🔑 API Key: {OPENROUTER_API_KEY[:20]}... (length: {len(OPENROUTER_API_KEY)})")
-        print(f"🤖 Model: {OPENROUTER_MODEL}")
+        logger.info("🔑 Testing OpenRouter API...", extra={"model": OPENROUTER_MODEL})
         
         if not OPENROUTER_API_KEY or len(OPENROUTER_API_KEY) < 20:
             return {"success": False, "error": "API key is missing or too short"}
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "http://localhost:3000",
-                    "X-Title": "Twitter Automation Tool"
-                },
-                json={
-                    "model": OPENROUTER_MODEL,
-                    "messages": [{"role": "user", "content": "Say 'Hello World' in exactly 2 words."}],
-                    "max_tokens": 10,
-                    "temperature": 0.1
-                }
-            )
-            
-            print(f"📊 Status: {response.status_code}")
-            response_text = response.text
-            print(f"📄 Response: {response_text}")
+        response = await openrouter_client.post(
+            "/chat/completions",
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "http://localhost:3000",
+                "X-Title": "Twitter Automation Tool"
+            },
+            json={
+                "model": OPENROUTER_MODEL,
+                "messages": [{"role": "user", "content": "Say 'Hello World' in exactly 2 words."}],
+                "max_tokens": 10,
+                "temperature": 0.1
+            }
+        )
+        
+        response_text = response.text
+        logger.info("📊 OpenRouter test finished", extra={"status_code": response.status_code})
+        logger.debug("📄 OpenRouter test response", extra={"body": response_text})
+        
+        if response.status_code == 200:
+            result = response.json()
+            return {
+                "success": True,
+                "status_code": response.status_code,
+                "content": result.get("choices", [{}])[0].get("message", {}).get("content", "No content"),
+                "model_used": result.get("model", "unknown")
+            }
+        else:
+            return {
+                "success": False,
+                "status_code": response.status_code,
+                "error": response_text
+            }
             
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    "success": True,
-                    "status_code": response.status_code,
-                    "content": result.get("choices", [{}])[0].get("message", {}).get("content", "No content"),
-                    "model_used": result.get("model", "unknown")
-                }
-            else:
-                return {
-                    "success": False,
-                    "status_code": response.status_code,
-                    "error": response_text
-                }
-                
     except Exception as e:
-        print(f"💥 Error: {str(e)}")
+        logger.exception("💥 OpenRouter test failed")
         return {"success": False, "error": str(e)}
 
 @app.get("/test-simple")
 async def test_simple():
     """Simple test with minimal request"""
     try:
-        print(f"🧪 Testing with minimal request...")
+        logger.info("🧪 Testing with minimal request...")
         
         if not OPENROUTER_API_KEY:
             return {"success": False, "error": "No API key found"}
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "http://localhost:3000",
-                    "X-Title": "Twitter Automation Tool"
-                },
-                json={
-                    "model": "google/gemini-flash-1.5",
-                    "messages": [
-                        {"role": "user", "content": "Say hello"}
-                    ],
-                    "max_tokens": 50
-                }
-            )
-            
-            print(f"Status: {response.status_code}")
-            print(f"Response: {response.text}")
+        response = await openrouter_client.post(
+            "/chat/completions",
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "http://localhost:3000",
+                "X-Title": "Twitter Automation Tool"
+            },
+            json={
+                "model": "google/gemini-flash-1.5",
+                "messages": [
+                    {"role": "user", "content": "Say hello"}
+                ],
+                "max_tokens": 50
+            }
+        )
+        
+        logger.info("📊 Minimal test finished", extra={"status_code": response.status_code})
+        logger.debug("📄 Minimal test response", extra={"body": response.text})
+        
+        if response.status_code == 200:
+            result = response.json()
+            return {
+                "success": True,
+                "response": result
+            }
+        else:
+            return {
+                "success": False,
+                "status": response.status_code,
+                "error": response.text
+            }
             
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    "success": True,
-                    "response": result
-                }
-            else:
-                return {
-                    "success": False,
-                    "status": response.status_code,
-                    "error": response.text
-                }
-                
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -270,11 +521,7 @@ async def test_simple():
 async def debug_api_key():
     """Debug API key loading"""
     try:
-        print(f"🔍 Debugging API key...")
-        print(f"🔑 Raw API Key from env: '{OPENROUTER_API_KEY}'")
-        print(f"📏 API Key length: {len(OPENROUTER_API_KEY) if OPENROUTER_API_KEY else 0}")
-        print(f"🔤 API Key starts with: {OPENROUTER_API_KEY[:10] if OPENROUTER_API_KEY else 'None'}...")
-        print(f"🔤 API Key ends with: ...{OPENROUTER_API_KEY[-10:] if OPENROUTER_API_KEY else 'None'}")
+        logger.info("🔍 Debugging API key...", extra={"api_key_length": len(OPENROUTER_API_KEY or "")})
         
         # Test with a very simple request
         if not OPENROUTER_API_KEY:
@@ -293,8 +540,7 @@ async def debug_api_key():
         
         return {
             "api_key_length": len(OPENROUTER_API_KEY),
-            "api_key_prefix": OPENROUTER_API_KEY[:20],
-            "api_key_suffix": OPENROUTER_API_KEY[-10:],
+            "api_key_prefix": "sk-or-v1-" if OPENROUTER_API_KEY.startswith("sk-or-v1-") else None,
             "issues": issues,
             "model": OPENROUTER_MODEL
         }
@@ -302,28 +548,23 @@ async def debug_api_key():
     except Exception as e:
         return {"error": str(e)}
 
-@app.post("/generate-tweet")
-async def generate_tweet(request: GenerateTweetRequest):
-    try:
-        print(f"\n🎯 === GENERATING TWEET ===")
-        print(f"📝 Topic: {request.topic}")
-        print(f"🏷️ Hashtags: {request.hashtags}")
-        print(f"🎭 Tone: {request.tone}")
-        print(f"🔑 API Key: {OPENROUTER_API_KEY[:20] if OPENROUTER_API_KEY else 'MISSING'}...")
-        print(f"🤖 Model: {OPENROUTER_MODEL}")
-        
-        # Validate inputs
-        if not request.topic or not request.topic.strip():
-            raise HTTPException(status_code=400, detail="Topic cannot be empty")
-        
-        if not OPENROUTER_API_KEY:
-            raise HTTPException(status_code=500, detail="OpenRouter API key is missing")
-        
-        if len(OPENROUTER_API_KEY) < 20:
-            raise HTTPException(status_code=500, detail="OpenRouter API key appears to be invalid (too short)")
-        
-        # Create a simple, clear prompt optimized for Gemini
-        prompt = f"""Write a {request.tone} tweet about: {request.topic}
+# Tweet generation helpers shared by the plain and streaming endpoints
+TWEET_SYSTEM_PROMPT = "You are a social media expert who writes engaging tweets. Respond with ONLY the tweet content, no quotes, no extra text, no explanations."
+
+def validate_generation_request(request: GenerateTweetRequest):
+    """Reject requests that can't be sent to OpenRouter"""
+    if not request.topic or not request.topic.strip():
+        raise HTTPException(status_code=400, detail="Topic cannot be empty")
+    
+    if not OPENROUTER_API_KEY:
+        raise HTTPException(status_code=500, detail="OpenRouter API key is missing")
+    
+    if len(OPENROUTER_API_KEY) < 20:
+        raise HTTPException(status_code=500, detail="OpenRouter API key appears to be invalid (too short)")
+
+def build_tweet_prompt(request: GenerateTweetRequest) -> str:
+    # Create a simple, clear prompt optimized for Gemini
+    return f"""Write a {request.tone} tweet about: {request.topic}
 
 Requirements:
 - Maximum 280 characters
@@ -332,148 +573,466 @@ Requirements:
 - No quotes around the response
 
 Tweet:"""
-        
-        print(f"📝 Prompt: {prompt}")
-        
-        # Make API call with proper headers for Gemini
-        async with httpx.AsyncClient(timeout=45.0) as client:  # Increased timeout
-            print("📡 Making OpenRouter API call...")
-            
-            payload = {
-                "model": OPENROUTER_MODEL,
-                "messages": [
-                    {
-                        "role": "system", 
-                        "content": "You are a social media expert who writes engaging tweets. Respond with ONLY the tweet content, no quotes, no extra text, no explanations."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                "max_tokens": 150,  # Increased for Gemini
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "frequency_penalty": 0,
-                "presence_penalty": 0
-            }
-            
-            headers = {
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "http://localhost:3000",
-                "X-Title": "Twitter Automation Tool"
+
+def build_generation_payload(request: GenerateTweetRequest, **overrides) -> dict:
+    """Chat completion payload for a tweet generation request"""
+    payload = {
+        "model": OPENROUTER_MODEL,
+        "messages": [
+            {
+                "role": "system", 
+                "content": TWEET_SYSTEM_PROMPT
+            },
+            {
+                "role": "user", 
+                "content": build_tweet_prompt(request)
             }
+        ],
+        "max_tokens": 150,  # Increased for Gemini
+        "temperature": 0.7,
+        "top_p": 0.9,
+        "frequency_penalty": 0,
+        "presence_penalty": 0
+    }
+    payload.update(overrides)
+    return payload
+
+def openrouter_headers() -> dict:
+    return {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "http://localhost:3000",
+        "X-Title": "Twitter Automation Tool"
+    }
+
+openrouter_limiter = TokenBucket(
+    "openrouter", OPENROUTER_RATE_LIMIT, OPENROUTER_RATE_BURST, max_wait=OPENROUTER_RATE_LIMIT_MAX_WAIT
+)
+openrouter_breaker = CircuitBreaker("openrouter", OPENROUTER_BREAKER_THRESHOLD, OPENROUTER_BREAKER_RESET)
+# With several candidate models each gets its own breaker, so one failing model
+# is routed around instead of refusing calls to all of them
+model_router = ModelRouter(
+    OPENROUTER_MODELS,
+    {OPENROUTER_MODELS[0]: openrouter_breaker} if len(OPENROUTER_MODELS) == 1 else {
+        model: CircuitBreaker(f"openrouter:{model}", OPENROUTER_BREAKER_THRESHOLD, OPENROUTER_BREAKER_RESET)
+        for model in OPENROUTER_MODELS
+    },
+    hedge_quantile=OPENROUTER_HEDGE_QUANTILE, hedge_delay=OPENROUTER_HEDGE_DELAY, max_hedges=OPENROUTER_MAX_HEDGES
+)
+OPENROUTER_RETRIES = Counter("openrouter_retries", "OpenRouter calls retried, by reason", ["reason"])
+# Statuses worth retrying; anything else is returned to the caller as-is
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+async def send_openrouter_request(payload: dict, stream: bool = False,
+                                  breaker: Optional[CircuitBreaker] = None) -> httpx.Response:
+    """POST a chat completion through the rate limiter, circuit breaker and retry policy.
+    
+    Timeouts, network errors, 429s and 5xx responses are retried up to
+    OPENROUTER_MAX_RETRIES times with jittered exponential backoff, waiting
+    at least as long as any Retry-After header asks. A 429 also pauses the
+    limiter so concurrent requests back off together. When retries run out
+    the last response is returned (or the last error raised). With
+    ``stream`` the caller must close the returned response.
+    
+    Raises CircuitOpenError or RateLimitExceeded instead of calling out when
+    the upstream is known to be unhealthy or the local limit is saturated.
+    ``breaker`` is the payload model's circuit breaker (default: the shared
+    OpenRouter one).
+    """
+    breaker = breaker or openrouter_breaker
+    for attempt in range(OPENROUTER_MAX_RETRIES + 1):
+        final = attempt == OPENROUTER_MAX_RETRIES
+        breaker.before_call()
+        await openrouter_limiter.acquire()
+        request = openrouter_client.build_request(
+            "POST", "/chat/completions", headers=openrouter_headers(), json=payload
+        )
+        try:
+            response = await openrouter_client.send(request, stream=stream)
+        except httpx.RequestError as e:
+            breaker.record_failure()
+            if final:
+                raise
+            reason = "timeout" if isinstance(e, httpx.TimeoutException) else "network"
+            delay = backoff_delay(attempt, OPENROUTER_RETRY_BASE_DELAY, OPENROUTER_RETRY_MAX_DELAY)
+        else:
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                breaker.record_success()
+                return response
             
-            print(f"📦 Payload: {json.dumps(payload, indent=2)}")
-            
-            try:
-                response = await client.post(
-                    "https://openrouter.ai/api/v1/chat/completions",
-                    headers=headers,
-                    json=payload
-                )
-            except httpx.TimeoutException:
-                print("⏰ Request timed out")
-                raise HTTPException(status_code=408, detail="Request timeout - OpenRouter API took too long to respond")
-            except httpx.RequestError as e:
-                print(f"🌐 Network error: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Network error connecting to OpenRouter: {str(e)}")
-            
-            print(f"📊 Response Status: {response.status_code}")
-            print(f"📄 Response Headers: {dict(response.headers)}")
-            
-            # Get response text for debugging
-            response_text = response.text
-            print(f"📄 Raw Response: {response_text}")
-            
-            if response.status_code != 200:
-                print(f"❌ Error Response: {response_text}")
-                
-                # Try to parse error for better message
-                try:
-                    error_json = response.json()
-                    error_message = error_json.get("error", {}).get("message", response_text)
-                    error_code = error_json.get("error", {}).get("code", "unknown")
-                    print(f"❌ Parsed Error: {error_message} (Code: {error_code})")
-                except:
-                    error_message = response_text
-                
-                # Handle specific error cases
-                if response.status_code == 401:
-                    raise HTTPException(status_code=500, detail="Invalid OpenRouter API key")
-                elif response.status_code == 429:
-                    raise HTTPException(status_code=500, detail="Rate limit exceeded. Please try again in a moment.")
-                elif response.status_code == 400:
-                    raise HTTPException(status_code=500, detail=f"Bad request to OpenRouter: {error_message}")
-                else:
-                    raise HTTPException(
-                        status_code=500, 
-                        detail=f"OpenRouter API error ({response.status_code}): {error_message}"
-                    )
-            
-            # Parse response
-            try:
-                result = response.json()
-                print(f"✅ Parsed JSON Response: {json.dumps(result, indent=2)}")
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON Parse Error: {str(e)}")
-                print(f"❌ Raw Response Text: {response_text}")
-                raise HTTPException(status_code=500, detail="Invalid JSON response from OpenRouter API")
-            
-            # Extract content with better error handling
-            if "choices" not in result:
-                print(f"❌ No 'choices' in response: {result}")
-                raise HTTPException(status_code=500, detail="Invalid response format from OpenRouter - no choices")
-            
-            if not result["choices"]:
-                print(f"❌ Empty choices array: {result}")
-                raise HTTPException(status_code=500, detail="Empty response from OpenRouter")
-            
-            choice = result["choices"][0]
-            print(f"📋 First choice: {choice}")
-            
-            if "message" not in choice:
-                print(f"❌ No 'message' in choice: {choice}")
-                raise HTTPException(status_code=500, detail="Invalid choice format - no message")
-            
-            if "content" not in choice["message"]:
-                print(f"❌ No 'content' in message: {choice['message']}")
-                raise HTTPException(status_code=500, detail="Invalid message format - no content")
-            
-            generated_content = choice["message"]["content"]
-            
-            if not generated_content:
-                print(f"❌ Empty content: {generated_content}")
-                raise HTTPException(status_code=500, detail="Empty content from OpenRouter")
-            
-            generated_content = generated_content.strip()
-            
-            # Clean up the content (remove quotes if present)
-            if generated_content.startswith('"') and generated_content.endswith('"'):
-                generated_content = generated_content[1:-1]
-            
-            # Remove any "Tweet:" prefix if present
-            if generated_content.lower().startswith('tweet:'):
-                generated_content = generated_content[6:].strip()
-            
-            print(f"✅ Generated Content: {generated_content}")
-            print(f"📏 Content Length: {len(generated_content)} characters")
-            
-            # Extract hashtags
-            hashtags = [word for word in generated_content.split() if word.startswith('#')]
-            print(f"🏷️ Extracted Hashtags: {hashtags}")
-            
-            return TweetResponse(content=generated_content, hashtags=hashtags)
-            
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if response.status_code == 429:
+                # Throttling isn't an outage, so it doesn't count towards the breaker
+                openrouter_limiter.pause(retry_after or OPENROUTER_RETRY_BASE_DELAY)
+            else:
+                breaker.record_failure()
+            if final or (retry_after or 0) > OPENROUTER_RETRY_MAX_DELAY:
+                return response
+            if stream:
+                await response.aclose()
+            reason = str(response.status_code)
+            delay = max(backoff_delay(attempt, OPENROUTER_RETRY_BASE_DELAY, OPENROUTER_RETRY_MAX_DELAY), retry_after or 0)
+        
+        OPENROUTER_RETRIES.inc(reason=reason)
+        logger.info("🔁 Retrying OpenRouter call", extra={"attempt": attempt + 1, "reason": reason, "delay": round(delay, 3)})
+        await asyncio.sleep(delay)
+
+def openrouter_unavailable(e: Exception) -> HTTPException:
+    """Map a locally refused OpenRouter call to a response telling the client when to retry"""
+    status_code = 503 if isinstance(e, CircuitOpenError) else 429
+    return HTTPException(status_code=status_code, detail=str(e), headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+
+def clean_generated_content(generated_content: str) -> str:
+    """Strip wrapping quotes and a leading "Tweet:" from model output"""
+    generated_content = generated_content.strip()
+    
+    # Clean up the content (remove quotes if present)
+    if generated_content.startswith('"') and generated_content.endswith('"'):
+        generated_content = generated_content[1:-1]
+    
+    # Remove any "Tweet:" prefix if present
+    if generated_content.lower().startswith('tweet:'):
+        generated_content = generated_content[6:].strip()
+    
+    return generated_content
+
+def extract_hashtags(content: str) -> List[str]:
+    return [word for word in content.split() if word.startswith('#')]
+
+async def request_tweet_completions(request: GenerateTweetRequest, n: int = 1) -> List[str]:
+    """Generate with the fastest candidate model, hedged to the next one when it is slow.
+    
+    With ``n`` > 1 the model is asked for several variants in one call; models
+    that ignore ``n`` simply return fewer choices.
+    """
+    return await model_router.call(lambda model: request_model_completions(request, model, n))
+
+async def request_model_completions(request: GenerateTweetRequest, model: str, n: int = 1) -> List[str]:
+    """Call OpenRouter once with ``model`` and return the cleaned tweet text of every choice"""
+    # Make API call with proper headers for Gemini
+    payload = build_generation_payload(request, model=model, **({"n": n} if n > 1 else {}))
+    
+    dump_level = payload_log_level(logger)
+    logger.info("📡 Making OpenRouter API call...", extra={"model": payload["model"], "n": n})
+    if dump_level:
+        logger.log(dump_level, "📦 OpenRouter payload", extra={"payload": json.dumps(payload)})
+    
+    try:
+        response = await send_openrouter_request(payload, breaker=model_router.breaker(model))
+    except (CircuitOpenError, RateLimitExceeded) as e:
+        logger.warning("🚧 OpenRouter call refused", extra={"model": model, "error": str(e)})
+        raise openrouter_unavailable(e)
+    except httpx.TimeoutException:
+        logger.warning("⏰ OpenRouter request timed out")
+        raise HTTPException(status_code=504, detail="Request timeout - OpenRouter API took too long to respond")
+    except httpx.RequestError as e:
+        logger.warning("🌐 Network error connecting to OpenRouter", extra={"error": str(e)})
+        raise HTTPException(status_code=500, detail=f"Network error connecting to OpenRouter: {str(e)}")
+    
+    response_text = response.text
+    logger.info("📊 OpenRouter responded", extra={"model": model, "status_code": response.status_code, "bytes": len(response.content)})
+    if dump_level:
+        logger.log(dump_level, "📄 OpenRouter response", extra={"headers": json.dumps(dict(response.headers)), "body": response_text})
+    
+    if response.status_code != 200:
+        # Try to parse error for better message
+        try:
+            error_json = response.json()
+            error_message = error_json.get("error", {}).get("message", response_text)
+            error_code = error_json.get("error", {}).get("code", "unknown")
+            logger.warning("❌ OpenRouter error", extra={"status_code": response.status_code, "error": error_message, "code": error_code})
+        except:
+            error_message = response_text
+            logger.warning("❌ OpenRouter error", extra={"status_code": response.status_code, "error": error_message[:500]})
+        
+        # Handle specific error cases
+        if response.status_code == 401:
+            raise HTTPException(status_code=500, detail="Invalid OpenRouter API key")
+        elif response.status_code == 429:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded. Please try again in a moment.",
+                headers={"Retry-After": response.headers.get("Retry-After", "1")}
+            )
+        elif response.status_code == 400:
+            raise HTTPException(status_code=500, detail=f"Bad request to OpenRouter: {error_message}")
+        else:
+            raise HTTPException(
+                status_code=500, 
+                detail=f"OpenRouter API error ({response.status_code}): {error_message}"
+            )
+    
+    # Parse response
+    try:
+        result = response.json()
+    except json.JSONDecodeError as e:
+        logger.error("❌ Invalid JSON from OpenRouter", extra={"error": str(e), "body": response_text[:500]})
+        raise HTTPException(status_code=500, detail="Invalid JSON response from OpenRouter API")
+    
+    # Extract content with better error handling
+    if "choices" not in result:
+        logger.error("❌ No 'choices' in OpenRouter response", extra={"body": response_text[:500]})
+        raise HTTPException(status_code=500, detail="Invalid response format from OpenRouter - no choices")
+    
+    if not result["choices"]:
+        logger.error("❌ Empty choices array from OpenRouter")
+        raise HTTPException(status_code=500, detail="Empty response from OpenRouter")
+    
+    contents = []
+    for choice in result["choices"]:
+        if "message" not in choice:
+            logger.error("❌ No 'message' in OpenRouter choice", extra={"choice": str(choice)[:500]})
+            raise HTTPException(status_code=500, detail="Invalid choice format - no message")
+        
+        if "content" not in choice["message"]:
+            logger.error("❌ No 'content' in OpenRouter message", extra={"choice": str(choice)[:500]})
+            raise HTTPException(status_code=500, detail="Invalid message format - no content")
+        
+        generated_content = choice["message"]["content"]
+        if generated_content:
+            contents.append(clean_generated_content(generated_content))
+    
+    if not contents or not any(contents):
+        logger.error("❌ Empty content from OpenRouter")
+        raise HTTPException(status_code=500, detail="Empty content from OpenRouter")
+    
+    return [content for content in contents if content]
+
+generation_cache = SingleFlightCache(GENERATION_CACHE_SIZE, GENERATION_CACHE_TTL)
+
+GENERATION_CACHE_REQUESTS = Counter(
+    "generation_cache_requests", "Generation cache lookups by outcome (hit, miss, coalesced, bypass)", ["result"])
+GENERATION_CACHE_ENTRIES = Gauge(
+    "generation_cache_entries", "Generation results currently cached")
+
+def generation_cache_key(request: GenerateTweetRequest, n: int, variant: int) -> str:
+    """Identify a generation by its normalized inputs and model parameters"""
+    def normalize(value: Optional[str]) -> str:
+        return " ".join((value or "").split()).lower()
+    
+    normalized = GenerateTweetRequest(
+        topic=normalize(request.topic),
+        hashtags=normalize(request.hashtags),
+        tone=normalize(request.tone)
+    )
+    return json.dumps([build_generation_payload(normalized), n, variant], sort_keys=True)
+
+async def cached_tweet_completions(request: GenerateTweetRequest, n: int = 1, variant: int = 0) -> List[str]:
+    """request_tweet_completions behind the generation cache.
+    
+    ``variant`` keeps otherwise identical calls apart when several distinct
+    results are wanted for the same request.
+    """
+    if not GENERATION_CACHE_ENABLED or request.no_cache:
+        GENERATION_CACHE_REQUESTS.inc(result="bypass")
+        return await request_tweet_completions(request, n=n)
+    
+    contents, outcome = await generation_cache.get_or_compute(
+        generation_cache_key(request, n, variant),
+        lambda: request_tweet_completions(request, n=n)
+    )
+    GENERATION_CACHE_REQUESTS.inc(result=outcome)
+    GENERATION_CACHE_ENTRIES.set(len(generation_cache))
+    logger.debug("🗃️ Generation cache lookup", extra={"outcome": outcome})
+    return contents
+
+@app.post("/generate-tweet")
+async def generate_tweet(request: GenerateTweetRequest):
+    try:
+        logger.info("🎯 Generating tweet", extra={"topic": request.topic, "tone": request.tone, "hashtags": request.hashtags})
+        
+        validate_generation_request(request)
+        
+        generated_content = (await cached_tweet_completions(request))[0]
+        
+        # Extract hashtags
+        hashtags = extract_hashtags(generated_content)
+        logger.info("✅ Generated tweet", extra={"length": len(generated_content), "hashtags": " ".join(hashtags)})
+        logger.debug("✅ Generated content", extra={"content": generated_content})
+        
+        return TweetResponse(content=generated_content, hashtags=hashtags)
+        
     except HTTPException:
         raise
     except Exception as e:
-        print(f"💥 Unexpected error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("💥 Unexpected error generating tweet")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+async def generate_variants(request: GenerateTweetRequest, n: int, slots: asyncio.Semaphore) -> List[TweetResponse]:
+    """Generate ``n`` variants, asking for them in one upstream call when the model supports it.
+    
+    Every upstream call holds one of ``slots`` while it runs.
+    """
+    async def call(variants: int, variant: int = 0) -> List[str]:
+        async with slots:
+            return await cached_tweet_completions(request, n=variants, variant=variant)
+    
+    contents = []
+    if OPENROUTER_SUPPORTS_N and n > 1:
+        contents = await call(n)
+    # Top up one call at a time for models that ignore ``n``
+    missing = n - len(contents)
+    if missing > 0:
+        extra = await asyncio.gather(*(call(1, variant) for variant in range(n - missing, n)))
+        contents.extend(result[0] for result in extra)
+    return [TweetResponse(content=content, hashtags=extract_hashtags(content)) for content in contents[:n]]
+
+@app.post("/generate-tweets/batch")
+async def generate_tweets_batch(request: BatchGenerateRequest):
+    """Generate tweets for many topic/tone/hashtag specs at once.
+    
+    Items run concurrently with at most GENERATION_BATCH_CONCURRENCY upstream
+    calls in flight.
+    A failing item doesn't fail the batch; its error is returned in place.
+    """
+    if not OPENROUTER_API_KEY or len(OPENROUTER_API_KEY) < 20:
+        raise HTTPException(status_code=500, detail="OpenRouter API key is missing or invalid")
+    
+    logger.info("🎯 Generating batch", extra={"items": len(request.items), "variants": request.n})
+    slots = asyncio.Semaphore(GENERATION_BATCH_CONCURRENCY)
+    
+    async def generate_item(index: int, item: GenerateTweetRequest):
+        result = {"index": index, "topic": item.topic, "tone": item.tone, "hashtags": item.hashtags}
+        try:
+            validate_generation_request(item)
+            variants = await generate_variants(item, request.n, slots)
+            result.update(success=True, variants=[variant.dict() for variant in variants])
+        except HTTPException as e:
+            result.update(success=False, status_code=e.status_code, error=e.detail)
+        except Exception as e:
+            result.update(success=False, status_code=500, error=f"Unexpected error: {str(e)}")
+        return result
+    
+    results = await asyncio.gather(*(generate_item(index, item) for index, item in enumerate(request.items)))
+    succeeded = sum(1 for result in results if result["success"])
+    
+    return {
+        "success": succeeded == len(results),
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }
+
+class StreamingTweetCleaner:
+    """Applies clean_generated_content incrementally to streamed tokens.
+    
+    Text is held back while it could still turn out to be a "Tweet:" prefix,
+    and trailing whitespace or a trailing quote is held until more text
+    arrives, so the emitted text is always a prefix of what finish() returns
+    and clients can render tokens as they come. Output that opens with a
+    quote is held until the stream ends, because only the last character
+    decides whether the quote is a wrapper that gets stripped.
+    """
+    
+    def __init__(self):
+        self.raw = ""
+        self.emitted = ""
+    
+    def _preview(self) -> Optional[str]:
+        text = self.raw.lstrip()
+        if 'tweet:'.startswith(text.lower()) or text.startswith('"'):
+            return None
+        if text.lower().startswith('tweet:'):
+            text = text[6:].lstrip()
+        return text.rstrip().rstrip('"')
+    
+    def feed(self, chunk: str) -> str:
+        """Add raw model output and return the newly publishable text"""
+        self.raw += chunk
+        preview = self._preview()
+        if preview is None or not preview.startswith(self.emitted):
+            return ""
+        delta = preview[len(self.emitted):]
+        self.emitted = preview
+        return delta
+    
+    def finish(self) -> str:
+        """Return the fully cleaned content once the stream has ended"""
+        return clean_generated_content(self.raw)
+
+def sse_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/generate-tweet/stream")
+async def generate_tweet_stream(request: GenerateTweetRequest):
+    """Generate a tweet and stream it back as Server-Sent Events.
+    
+    Emits ``token`` events with cleaned text as OpenRouter produces it, then
+    one ``done`` event with the final content and hashtags, or an ``error``
+    event. Disconnecting closes the upstream request. The stream comes from
+    the fastest healthy candidate model; it is not hedged.
+    """
+    validate_generation_request(request)
+    model = model_router.ranked()[0]
+    payload = build_generation_payload(request, stream=True, model=model)
+    
+    async def events():
+        cleaner = StreamingTweetCleaner()
+        try:
+            response = await send_openrouter_request(payload, stream=True, breaker=model_router.breaker(model))
+        except (CircuitOpenError, RateLimitExceeded) as e:
+            yield sse_event("error", {"status_code": openrouter_unavailable(e).status_code, "detail": str(e)})
+            return
+        except httpx.TimeoutException:
+            yield sse_event("error", {"status_code": 504, "detail": "Request timeout - OpenRouter API took too long to respond"})
+            return
+        except httpx.RequestError as e:
+            yield sse_event("error", {"status_code": 500, "detail": f"Network error connecting to OpenRouter: {str(e)}"})
+            return
+        
+        try:
+            if response.status_code != 200:
+                error_text = (await response.aread()).decode(errors="replace")
+                logger.warning("❌ OpenRouter streaming error", extra={"status_code": response.status_code, "error": error_text[:500]})
+                yield sse_event("error", {"status_code": response.status_code, "detail": error_text})
+                return
+                
+            async for line in response.aiter_lines():
+                # OpenRouter sends ": OPENROUTER PROCESSING" comments while waiting
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                if "error" in chunk:
+                    yield sse_event("error", {"status_code": 502, "detail": chunk["error"].get("message", str(chunk["error"]))})
+                    return
+                choices = chunk.get("choices") or [{}]
+                token = (choices[0].get("delta") or {}).get("content")
+                if token:
+                    text = cleaner.feed(token)
+                    if text:
+                        yield sse_event("token", {"text": text})
+        except httpx.TimeoutException:
+            yield sse_event("error", {"status_code": 504, "detail": "Request timeout - OpenRouter API took too long to respond"})
+            return
+        except httpx.RequestError as e:
+            yield sse_event("error", {"status_code": 500, "detail": f"Network error connecting to OpenRouter: {str(e)}"})
+            return
+        finally:
+            await response.aclose()
+        
+        generated_content = cleaner.finish()
+        if not generated_content:
+            yield sse_event("error", {"status_code": 500, "detail": "Empty content from OpenRouter"})
+            return
+        # Flush anything held back, e.g. a quote that turned out not to be wrapping
+        if generated_content.startswith(cleaner.emitted) and len(generated_content) > len(cleaner.emitted):
+            yield sse_event("token", {"text": generated_content[len(cleaner.emitted):]})
+        yield sse_event("done", {"content": generated_content, "hashtags": extract_hashtags(generated_content)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/save-draft")
 async def save_draft(request: SaveDraftRequest):
     try:
@@ -489,45 +1048,125 @@ async def save_draft(request: SaveDraftRequest):
             updated_at=current_time
         )
         
-        # Load existing drafts and add new one
-        drafts_storage = await get_drafts()
-        drafts_storage[draft_id] = draft.dict()
-        await save_drafts(drafts_storage)
+        await storage.put(DRAFTS, draft_id, draft.dict())
         
         return {"success": True, "draft_id": draft_id, "message": "Draft saved successfully"}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving draft: {str(e)}")
 
+async def check_not_modified(request: Request, response: Response, collection: str) -> Optional[Response]:
+    """Set ETag/Last-Modified for a collection listing and answer 304 if the client is current.
+    
+    Both validators come from the collection's change version, so a listing
+    is only re-sent after a write to that collection.
+    """
+    version, changed_at = await storage.collection_version(collection)
+    headers = {"ETag": f'W/"{collection}-{version}"', "Cache-Control": "no-cache"}
+    last_modified = None
+    if changed_at:
+        last_modified = parse_datetime_string(changed_at).replace(microsecond=0)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    response.headers.update(headers)
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        if "*" in tags or headers["ETag"] in tags or headers["ETag"][2:] in tags:
+            return Response(status_code=304, headers=headers)
+        return None
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            if last_modified <= parsedate_to_datetime(if_modified_since):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+async def list_page(collection: str, descending: bool, limit: Optional[int], cursor: Optional[str],
+                    status: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                    account_id: Optional[str] = None):
+    """Read one page of a collection from its sort-order index and its archive"""
+    for name, value in (("since", since), ("until", until)):
+        if value:
+            try:
+                parse_datetime_string(value)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid '{name}': {str(e)}")
+    try:
+        return await page_with_archive(storage, archives.get(collection), collection, limit=limit, cursor=cursor,
+                                       descending=descending, status=status, since=since, until=until,
+                                       account_id=account_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+LIST_CACHE_REQUESTS = Counter(
+    "list_cache_requests", "List responses by cache outcome (hit, coalesced, miss, disabled)", ["outcome"])
+
+list_cache = SingleFlightCache(max(LIST_CACHE_SIZE, 1), LIST_CACHE_TTL)
+
+# Headers set by check_not_modified that a pre-encoded response carries over
+LIST_RESPONSE_HEADERS = ("etag", "last-modified", "cache-control")
+
+async def list_response(request: Request, response: Response, collection: str, field: str, descending: bool,
+                        limit: Optional[int], cursor: Optional[str], status: Optional[str] = None,
+                        since: Optional[str] = None, until: Optional[str] = None) -> Response:
+    """One page of a collection as ``{field: [...], "next_cursor": ...}``, encoded once per collection version.
+    
+    The encoded body is cached under the listing's ETag and query, so
+    repeated requests skip both the storage read and the encoding until
+    the next write to the collection changes the ETag.
+    """
+    not_modified = await check_not_modified(request, response, collection)
+    if not_modified:
+        return not_modified
+    
+    async def encode() -> bytes:
+        records, next_cursor = await list_page(collection, descending, limit, cursor, status, since, until)
+        return jsoncodec.dumps({field: records, "next_cursor": next_cursor})
+    
+    if LIST_CACHE_SIZE > 0:
+        key = (response.headers["etag"], limit, cursor, status, since, until)
+        payload, outcome = await list_cache.get_or_compute(key, encode)
+    else:
+        payload, outcome = await encode(), "disabled"
+    LIST_CACHE_REQUESTS.inc(outcome=outcome)
+    headers = {name: response.headers[name] for name in LIST_RESPONSE_HEADERS if name in response.headers}
+    return Response(content=payload, media_type="application/json", headers=headers)
+
 @app.get("/drafts")
-async def get_drafts_endpoint():
+async def get_drafts_endpoint(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """Drafts by updated_at descending. Pass ``limit`` and then ``next_cursor`` to page through them."""
     try:
-        drafts_storage = await get_drafts()
-        drafts = list(drafts_storage.values())
-        # Sort by updated_at descending
-        drafts.sort(key=lambda x: x['updated_at'], reverse=True)
-        return {"drafts": drafts}
+        return await list_response(request, response, DRAFTS, "drafts", True, limit, cursor, since=since, until=until)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching drafts: {str(e)}")
 
 @app.put("/drafts/{draft_id}")
 async def update_draft(draft_id: str, request: SaveDraftRequest):
     try:
-        drafts_storage = await get_drafts()
-        
-        if draft_id not in drafts_storage:
-            raise HTTPException(status_code=404, detail="Draft not found")
-        
         current_time = get_current_utc_time().isoformat()
         
-        drafts_storage[draft_id].update({
+        updated = await storage.update(DRAFTS, draft_id, {
             "content": request.content,
             "hashtags": request.hashtags,
             "tone": request.tone,
             "updated_at": current_time
         })
         
-        await save_drafts(drafts_storage)
+        if updated is None:
+            raise HTTPException(status_code=404, detail="Draft not found")
         
         return {"success": True, "message": "Draft updated successfully"}
         
@@ -539,14 +1178,9 @@ async def update_draft(draft_id: str, request: SaveDraftRequest):
 @app.delete("/drafts/{draft_id}")
 async def delete_draft(draft_id: str):
     try:
-        drafts_storage = await get_drafts()
-        
-        if draft_id not in drafts_storage:
+        if not await storage.delete(DRAFTS, draft_id):
             raise HTTPException(status_code=404, detail="Draft not found")
         
-        del drafts_storage[draft_id]
-        await save_drafts(drafts_storage)
-        
         return {"success": True, "message": "Draft deleted successfully"}
         
     except HTTPException:
@@ -554,58 +1188,108 @@ async def delete_draft(draft_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting draft: {str(e)}")
 
+# Every account tweets can be posted as, each with its own connection pool,
+# rate limit and cap on tweets in flight
+accounts = AccountRegistry(
+    storage,
+    {"username": TWITTER_CLONE_USERNAME, "api_key": TWITTER_CLONE_API_KEY, "url": TWITTER_CLONE_URL},
+    lambda max_connections: create_http_client(
+        TWITTER_CLONE_READ_TIMEOUT, upstream="twitter_clone", max_connections=max_connections
+    ),
+    rate_limit=TWITTER_CLONE_RATE_LIMIT,
+    rate_burst=TWITTER_CLONE_RATE_BURST,
+    max_connections=TWITTER_CLONE_MAX_CONNECTIONS,
+    throttle_pause=OUTBOX_RETRY_BASE_DELAY
+)
+
+async def account_lane(account_id: Optional[str]) -> AccountLane:
+    """The lane to post a request's tweet through; 400 for an unknown account"""
+    try:
+        return await accounts.lane(account_id)
+    except UnknownAccount as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def job_response(job: dict) -> dict:
+    return {
+        "success": job["status"] != "failed",
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/jobs/{job['id']}",
+        "job": job
+    }
+
+def check_idempotency_key(idempotency_key: str):
+    if not idempotency_key.strip() or len(idempotency_key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be 1 to 255 characters")
+
+async def enqueue_post(content: str, idempotency_key: str, response: Response, account_id: Optional[str] = None) -> dict:
+    """Queue a tweet in the outbox, or return the job already queued under this key"""
+    check_idempotency_key(idempotency_key)
+    account_id = (await account_lane(account_id)).id
+    job, created = await outbox.enqueue(job_id_for_key(idempotency_key), content, idempotency_key, account_id)
+    if not created:
+        if job["content"] != content or (job.get("account_id") or DEFAULT_ACCOUNT_ID) != account_id:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different tweet")
+        response.headers["Idempotent-Replayed"] = "true"
+    logger.info("📥 Tweet queued" if created else "📥 Tweet already queued",
+                extra={"job_id": job["id"], "status": job["status"]})
+    response.status_code = 202
+    return job_response(job)
+
 @app.post("/post-tweet")
-async def post_tweet(request: PostTweetRequest):
+async def post_tweet(request: PostTweetRequest, response: Response, idempotency_key: Optional[str] = Header(None)):
+    """Post a tweet and wait for the Twitter clone to accept it.
+    
+    With an ``Idempotency-Key`` header the tweet is queued in the outbox
+    instead and a 202 with the job id comes back right away; repeating the
+    request with the same key returns the same job rather than posting again.
+    """
+    if idempotency_key is not None:
+        try:
+            return await enqueue_post(request.content, idempotency_key, response, request.account_id)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error queueing tweet: {str(e)}")
+    
     try:
-        print(f"\n🚀 === POSTING TWEET ===")
-        print(f"📝 Content: {request.content}")
+        lane = await account_lane(request.account_id)
+        logger.info("🚀 Posting tweet", extra={"length": len(request.content), "account_id": lane.id})
         
         # Post to Twitter Clone API
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            payload = {
-                "username": TWITTER_CLONE_USERNAME,
-                "text": request.content
-            }
-            
-            headers = {
-                "api-key": TWITTER_CLONE_API_KEY,
-                "Content-Type": "application/json"
-            }
-            
-            response = await client.post(
-                TWITTER_CLONE_URL,
-                headers=headers,
-                json=payload
-            )
-            
-            if response.status_code not in [200, 201]:
-                error_detail = f"Status: {response.status_code}, Response: {response.text}"
-                raise HTTPException(
-                    status_code=response.status_code, 
-                    detail=f"Failed to post tweet: {error_detail}"
-                )
-            
-            # Save to posted tweets
-            posted_id = str(uuid.uuid4())
-            posted_tweet = PostedTweet(
-                id=posted_id,
-                content=request.content,
-                posted_at=get_current_utc_time().isoformat(),
-                status="posted"
+        async with lane.turn(TWITTER_CLONE_RATE_LIMIT_MAX_WAIT):
+            response = await lane.send(request.content)
+        
+        if response.status_code not in [200, 201]:
+            error_detail = f"Status: {response.status_code}, Response: {response.text}"
+            raise HTTPException(
+                status_code=response.status_code, 
+                detail=f"Failed to post tweet: {error_detail}"
             )
-            
-            posted_tweets_storage = await get_posted_tweets()
-            posted_tweets_storage[posted_id] = posted_tweet.dict()
-            await save_posted_tweets(posted_tweets_storage)
-            
-            return {
-                "success": True,
-                "message": f"✅ Successfully posted to Twitter Clone!",
-                "content": request.content,
-                "verify_url": "https://twitter-clone-ui.pages.dev",
-                "posted_id": posted_id
-            }
-            
+        
+        # Save to posted tweets
+        posted_id = str(uuid.uuid4())
+        posted_tweet = PostedTweet(
+            id=posted_id,
+            content=request.content,
+            posted_at=get_current_utc_time().isoformat(),
+            status="posted",
+            account_id=lane.id
+        )
+        
+        await storage.put(POSTED_TWEETS, posted_id, posted_tweet.dict())
+        
+        return {
+            "success": True,
+            "message": f"✅ Successfully posted to Twitter Clone!",
+            "content": request.content,
+            "verify_url": "https://twitter-clone-ui.pages.dev",
+            "posted_id": posted_id,
+            "account_id": lane.id
+        }
+        
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
     except httpx.TimeoutException:
         raise HTTPException(status_code=408, detail="Request timeout - Twitter Clone API is slow to respond")
     except httpx.RequestError as e:
@@ -615,17 +1299,324 @@ async def post_tweet(request: PostTweetRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+@app.post("/post-tweets/batch")
+async def post_tweets_batch(request: BatchPostRequest):
+    """Post many tweets at once.
+    
+    Items are sent concurrently (``concurrency`` at a time, starting at least
+    ``interval`` seconds apart) and every success is recorded with a single
+    storage write. Each item also waits for its account's own connection
+    and rate limit, outside the batch's slots, so a throttled account only
+    holds up its own items. A failing item doesn't fail the batch; its
+    status code and error are returned in place.
+    """
+    concurrency = request.concurrency or POST_BATCH_CONCURRENCY
+    logger.info("🚀 Posting batch", extra={"items": len(request.items), "concurrency": concurrency})
+    slots = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    next_send = loop.time()
+    posted = {}
+    
+    async def post_item(index: int, item: PostTweetRequest):
+        nonlocal next_send
+        result = {"index": index}
+        try:
+            lane = await accounts.lane(item.account_id)
+            result["account_id"] = lane.id
+            async with lane.turn(), slots:
+                if request.interval:
+                    now = loop.time()
+                    send_at = max(now, next_send)
+                    next_send = send_at + request.interval
+                    await asyncio.sleep(send_at - now)
+                response = await lane.send(item.content)
+            if response.status_code in [200, 201]:
+                posted_id = str(uuid.uuid4())
+                posted[posted_id] = PostedTweet(
+                    id=posted_id,
+                    content=item.content,
+                    posted_at=get_current_utc_time().isoformat(),
+                    status="posted",
+                    account_id=lane.id
+                ).dict()
+                result.update(success=True, posted_id=posted_id)
+            else:
+                result.update(success=False, status_code=response.status_code,
+                              error=f"Failed to post tweet: Status: {response.status_code}, Response: {response.text}")
+        except UnknownAccount as e:
+            result.update(success=False, status_code=400, error=str(e))
+        except httpx.TimeoutException:
+            result.update(success=False, status_code=408, error="Request timeout - Twitter Clone API is slow to respond")
+        except httpx.RequestError as e:
+            result.update(success=False, status_code=500, error=f"Network error: {str(e)}")
+        except Exception as e:
+            result.update(success=False, status_code=500, error=f"Unexpected error: {str(e)}")
+        return result
+    
+    results = await asyncio.gather(*(post_item(index, item) for index, item in enumerate(request.items)))
+    succeeded = len(posted)
+    
+    response = {
+        "success": succeeded == len(results),
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }
+    try:
+        await storage.put_many(POSTED_TWEETS, posted)
+    except Exception as e:
+        # The tweets are already live, so report them instead of failing the request
+        logger.exception("💥 Failed to record batch-posted tweets")
+        response.update(success=False, storage_error=f"Posted tweets could not be saved: {str(e)}")
+    return response
+
+@app.post("/post-tweets/fan-out")
+async def post_tweet_fan_out(request: FanOutPostRequest, response: Response,
+                             idempotency_key: Optional[str] = Header(None)):
+    """Queue the same tweet for several accounts, one outbox job each.
+    
+    Each account's job is delivered through that account's own connection
+    pool and rate limit, so the accounts post concurrently and one that is
+    throttled or slow doesn't hold up the rest. With an ``Idempotency-Key``
+    header, repeating the request returns the same jobs.
+    """
+    account_ids = list(dict.fromkeys(request.account_ids))
+    if idempotency_key is not None:
+        check_idempotency_key(idempotency_key)
+    try:
+        unknown = [account_id for account_id in account_ids if await accounts.get(account_id) is None]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown accounts: {', '.join(unknown)}")
+        
+        jobs = []
+        replayed = 0
+        for account_id in account_ids:
+            job_id = job_id_for_key(f"{idempotency_key}\n{account_id}") if idempotency_key is not None else str(uuid.uuid4())
+            job, created = await outbox.enqueue(job_id, request.content, idempotency_key, account_id)
+            if not created:
+                if job["content"] != request.content:
+                    raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different tweet")
+                replayed += 1
+            jobs.append({"account_id": account_id, **job_response(job)})
+        
+        if replayed == len(jobs):
+            response.headers["Idempotent-Replayed"] = "true"
+        logger.info("📥 Tweet queued for accounts", extra={"accounts": len(account_ids), "replayed": replayed})
+        response.status_code = 202
+        return {
+            "success": True,
+            "total": len(jobs),
+            "jobs": jobs
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error queueing tweets: {str(e)}")
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of a tweet queued with an Idempotency-Key"""
+    try:
+        job = await storage.get(POST_JOBS, job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching job: {str(e)}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_response(job)
+
+def account_response(account: dict) -> dict:
+    return {**public_account(account), "status": accounts.status(account["id"])}
+
+@app.post("/accounts")
+async def create_account(request: AccountRequest):
+    """Register a Twitter clone account to post as"""
+    if request.id == DEFAULT_ACCOUNT_ID:
+        raise HTTPException(status_code=409, detail="The default account is configured with TWITTER_CLONE_* settings")
+    try:
+        now = get_current_utc_time().isoformat()
+        account = Account(
+            id=request.id,
+            username=request.username,
+            api_key=request.api_key,
+            url=request.url,
+            rate_limit=request.rate_limit,
+            rate_burst=request.rate_burst,
+            max_connections=request.max_connections,
+            created_at=now,
+            updated_at=now
+        ).dict()
+        if not await storage.insert(ACCOUNTS, request.id, account):
+            raise HTTPException(status_code=409, detail=f"Account '{request.id}' already exists")
+        logger.info("👤 Account registered", extra={"account_id": request.id})
+        return {"success": True, "account": public_account(account)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error registering account: {str(e)}")
+
+@app.get("/accounts")
+async def get_accounts():
+    """Every account, default first, with this worker's view of its posting status"""
+    try:
+        stored, _ = await storage.page(ACCOUNTS)
+        return {"accounts": [account_response(await accounts.get(DEFAULT_ACCOUNT_ID))] + [
+            account_response(accounts.settings(account)) for account in stored
+        ]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching accounts: {str(e)}")
+
+@app.get("/accounts/{account_id}")
+async def get_account(account_id: str):
+    """One account, its posting status in this worker and its jobs waiting in the outbox"""
+    account = await accounts.get(account_id)
+    if account is None:
+        raise HTTPException(status_code=404, detail="Account not found")
+    jobs = {status: await storage.count(POST_JOBS, status=status, account_id=account["id"])
+            for status in ("queued", "sending")}
+    return {**account_response(account), "jobs": jobs}
+
+@app.put("/accounts/{account_id}")
+async def update_account(account_id: str, request: AccountUpdateRequest):
+    """Change an account's credentials or limits; tweets already in flight finish on the old settings"""
+    if account_id == DEFAULT_ACCOUNT_ID:
+        raise HTTPException(status_code=409, detail="The default account is configured with TWITTER_CLONE_* settings")
+    try:
+        changes = request.model_dump(exclude_unset=True)
+        account = await storage.update(ACCOUNTS, account_id, {**changes, "updated_at": get_current_utc_time().isoformat()})
+        if account is None:
+            raise HTTPException(status_code=404, detail="Account not found")
+        return {"success": True, "account": public_account(account)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating account: {str(e)}")
+
+@app.delete("/accounts/{account_id}")
+async def delete_account(account_id: str):
+    """Remove an account; its queued jobs fail now and its scheduled tweets when they come due"""
+    if account_id == DEFAULT_ACCOUNT_ID:
+        raise HTTPException(status_code=409, detail="The default account is configured with TWITTER_CLONE_* settings")
+    try:
+        if not await storage.delete(ACCOUNTS, account_id):
+            raise HTTPException(status_code=404, detail="Account not found")
+        failed = await outbox.fail_lane(account_id, str(UnknownAccount(account_id)))
+        return {"success": True, "failed_jobs": failed, "message": "Account deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting account: {str(e)}")
+
+@app.get("/accounts/{account_id}/posted-tweets")
+async def get_account_posted_tweets(
+    account_id: str,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Tweets posted as one account, newest first, read from the per-account
+    index; tweets posted before accounts existed belong to the default account."""
+    try:
+        found, next_cursor = await list_page(POSTED_TWEETS, True, limit, cursor, account_id=account_id)
+        return {"account_id": account_id, "posted_tweets": found, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching posted tweets: {str(e)}")
+
 @app.get("/posted-tweets")
-async def get_posted_tweets_endpoint():
+async def get_posted_tweets_endpoint(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """Posted tweets by posted_at descending, optionally filtered by status ("posted", "posted_scheduled") and time range"""
     try:
-        posted_tweets_storage = await get_posted_tweets()
-        posted = list(posted_tweets_storage.values())
-        # Sort by posted_at descending
-        posted.sort(key=lambda x: x['posted_at'], reverse=True)
-        return {"posted_tweets": posted}
+        return await list_response(request, response, POSTED_TWEETS, "posted_tweets", True, limit, cursor, status, since, until)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching posted tweets: {str(e)}")
 
+SEARCH_SECONDS = Histogram("search_duration_seconds", "Time spent answering one /search query")
+SEARCH_DOCUMENTS = Gauge("search_index_documents", "Drafts and posted tweets in the search index")
+
+search_index = SearchIndex(storage, archives)
+
+@app.get("/search")
+async def search(
+    q: Optional[str] = None,
+    search_type: Optional[str] = Query(None, alias="type"),
+    hashtag: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0)
+):
+    """Drafts and posted tweets matching every word of ``q``, best match first.
+    
+    ``type`` limits results to "draft" or "posted"; ``hashtag`` (comma
+    separated, "#" optional) keeps only results carrying every given tag.
+    With only ``hashtag``, results come newest first.
+    """
+    if search_type is not None and search_type not in SEARCH_TYPES:
+        raise HTTPException(status_code=400, detail=f"'type' must be one of: {', '.join(SEARCH_TYPES)}")
+    hashtags = tuple(tag for tag in (hashtag or "").split(",") if tag.strip().lstrip("#"))
+    if not (q and q.strip()) and not hashtags:
+        raise HTTPException(status_code=400, detail="Provide 'q' and/or 'hashtag'")
+    try:
+        started = time.perf_counter()
+        await search_index.refresh()
+        total, results = await search_index.search(
+            q or "", hashtags, SEARCH_TYPES.get(search_type), limit=limit, offset=offset
+        )
+        SEARCH_SECONDS.observe(time.perf_counter() - started)
+        SEARCH_DOCUMENTS.set(len(search_index))
+        next_offset = offset + limit if offset + limit < total else None
+        return {"results": results, "total": total, "next_offset": next_offset}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching: {str(e)}")
+
+analytics = Analytics(storage, archives)
+
+# Default /analytics window per interval, and the longest allowed
+ANALYTICS_DEFAULT_WINDOW = {"hour": timedelta(days=2), "day": timedelta(days=30)}
+ANALYTICS_MAX_WINDOW = timedelta(days=366)
+
+@app.get("/analytics")
+async def get_analytics(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    interval: str = Query("day", pattern="^(hour|day)$"),
+    top: int = Query(10, ge=1, le=100)
+):
+    """Posting statistics for ``[since, until)``: posts per ``interval``
+    (immediate vs scheduled), scheduled-tweet outcomes and the most used hashtags.
+    
+    ``until`` defaults to now and ``since`` to 2 days (hourly) or 30 days
+    (daily) before it. Scheduled tweets count by their scheduled time.
+    """
+    try:
+        end = parse_datetime_string(until) if until else get_current_utc_time()
+        start = parse_datetime_string(since) if since else end - ANALYTICS_DEFAULT_WINDOW[interval]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'since' must be before 'until'")
+    if end - start > ANALYTICS_MAX_WINDOW:
+        raise HTTPException(status_code=400, detail=f"Window can be at most {ANALYTICS_MAX_WINDOW.days} days")
+    try:
+        await analytics.refresh()
+        return {
+            "since": start.isoformat(),
+            "until": end.isoformat(),
+            "interval": interval,
+            **analytics.summary(start, end, interval, top)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing analytics: {str(e)}")
+
 @app.post("/schedule-tweet")
 async def schedule_tweet(request: ScheduleTweetRequest):
     try:
@@ -640,18 +1631,19 @@ async def schedule_tweet(request: ScheduleTweetRequest):
         if scheduled_datetime <= current_time:
             raise HTTPException(status_code=400, detail="Scheduled time must be in the future")
         
+        account_id = (await account_lane(request.account_id)).id
         scheduled_id = str(uuid.uuid4())
         scheduled_tweet = ScheduledTweet(
             id=scheduled_id,
             content=request.content,
             scheduled_time=scheduled_datetime.isoformat(),
             created_at=current_time.isoformat(),
-            status="pending"
+            status="pending",
+            account_id=account_id
         )
         
-        scheduled_tweets_storage = await get_scheduled_tweets()
-        scheduled_tweets_storage[scheduled_id] = scheduled_tweet.dict()
-        await save_scheduled_tweets(scheduled_tweets_storage)
+        await storage.put(SCHEDULED_TWEETS, scheduled_id, scheduled_tweet.dict())
+        scheduler.add(scheduled_id, scheduled_datetime)
         
         return {
             "success": True,
@@ -665,26 +1657,127 @@ async def schedule_tweet(request: ScheduleTweetRequest):
         raise HTTPException(status_code=500, detail=f"Error scheduling tweet: {str(e)}")
 
 @app.get("/scheduled-tweets")
-async def get_scheduled_tweets_endpoint():
+async def get_scheduled_tweets_endpoint(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """Scheduled tweets by scheduled_time ascending, optionally filtered by status ("pending", "posting", "posted", "failed") and time range"""
     try:
-        scheduled_tweets_storage = await get_scheduled_tweets()
-        scheduled = list(scheduled_tweets_storage.values())
-        # Sort by scheduled_time ascending
-        scheduled.sort(key=lambda x: x['scheduled_time'])
-        return {"scheduled_tweets": scheduled}
+        return await list_response(request, response, SCHEDULED_TWEETS, "scheduled_tweets", False, limit, cursor, status, since, until)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching scheduled tweets: {str(e)}")
 
+@app.get("/changes")
+async def get_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Drafts, posted tweets and scheduled-tweet status changes made after version ``since``.
+    
+    Poll with the returned ``version`` as the next ``since``. When ``reset``
+    is true the requested changes are no longer retained and the client
+    should refetch the full lists.
+    """
+    try:
+        result = await storage.changes_since(since, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching changes: {str(e)}")
+    # Account records carry API keys
+    result["changes"] = [
+        {**change, "record": public_account(change["record"])}
+        if change["collection"] == ACCOUNTS and change.get("record") else change
+        for change in result["changes"]
+    ]
+    return result
+
+event_hub = EventHub(storage, EVENTS_BUFFER_SIZE, EVENTS_POLL_INTERVAL)
+
+@app.websocket("/ws/events")
+async def events_websocket(websocket: WebSocket, last_event_id: Optional[int] = None):
+    """Push draft, scheduled-tweet, posted-tweet and post-job events as JSON messages.
+    
+    Each message is ``{"id", "type", "collection", "record_id", "record"}``,
+    e.g. type "scheduled_tweet.posted" or "draft.deleted". Reconnect with
+    the last ``id`` seen as ``last_event_id`` to receive what was missed; a
+    "reset" message means those events are gone and the lists should be
+    refetched. Idle connections get a "heartbeat" message every
+    EVENTS_HEARTBEAT seconds.
+    """
+    await websocket.accept()
+    EVENT_CONNECTIONS.inc(transport="websocket")
+    stream = event_hub.subscribe(last_event_id, EVENTS_HEARTBEAT)
+    
+    async def send_events():
+        async for event in stream:
+            if event is None:
+                event = {"type": "heartbeat"}
+            elif event["type"] == "reset":
+                EVENT_STREAM_RESETS.inc(transport="websocket")
+            else:
+                EVENTS_SENT.inc(transport="websocket")
+            await websocket.send_text(jsoncodec.dumps(event).decode())
+    
+    sender = asyncio.create_task(send_events())
+    try:
+        # Clients don't send anything; reading just notices when they leave
+        while not sender.done():
+            receiving = asyncio.ensure_future(websocket.receive())
+            await asyncio.wait({receiving, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if not receiving.done():
+                receiving.cancel()
+            elif receiving.result()["type"] == "websocket.disconnect":
+                break
+    finally:
+        sender.cancel()
+        try:
+            await sender
+        except (asyncio.CancelledError, Exception):
+            pass
+        await stream.aclose()
+        EVENT_CONNECTIONS.dec(transport="websocket")
+
+@app.get("/events")
+async def events_sse(
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[int] = Header(None, alias="Last-Event-ID")
+):
+    """The /ws/events stream as Server-Sent Events, for clients that can't use WebSockets.
+    
+    Browsers reconnect with the Last-Event-ID header on their own; the
+    ``last_event_id`` query parameter does the same for other clients.
+    """
+    resume_from = last_event_id if last_event_id is not None else last_event_id_header
+    
+    async def stream():
+        EVENT_CONNECTIONS.inc(transport="sse")
+        try:
+            async for event in event_hub.subscribe(resume_from, EVENTS_HEARTBEAT):
+                if event is None:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event["type"] == "reset":
+                    EVENT_STREAM_RESETS.inc(transport="sse")
+                else:
+                    EVENTS_SENT.inc(transport="sse")
+                yield sse_event(event["type"], event, event["id"])
+        finally:
+            EVENT_CONNECTIONS.dec(transport="sse")
+    
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.delete("/scheduled-tweets/{scheduled_id}")
 async def cancel_scheduled_tweet(scheduled_id: str):
     try:
-        scheduled_tweets_storage = await get_scheduled_tweets()
-        
-        if scheduled_id not in scheduled_tweets_storage:
+        if not await storage.delete(SCHEDULED_TWEETS, scheduled_id):
             raise HTTPException(status_code=404, detail="Scheduled tweet not found")
-        
-        del scheduled_tweets_storage[scheduled_id]
-        await save_scheduled_tweets(scheduled_tweets_storage)
+        scheduler.remove(scheduled_id)
         
         return {"success": True, "message": "Scheduled tweet cancelled successfully"}
         
@@ -693,100 +1786,498 @@ async def cancel_scheduled_tweet(scheduled_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error cancelling scheduled tweet: {str(e)}")
 
-# Background task to check and post scheduled tweets
-async def check_scheduled_tweets():
+def parse_recurrence(request) -> tuple:
+    """``(CronSchedule, start_at, end_at)`` for a recurring schedule or preview request; 400 when invalid"""
+    try:
+        cron = CronSchedule(request.cron, request.timezone)
+        start_at, end_at = (
+            parse_datetime_string(value).isoformat() if value else None for value in (request.start_at, request.end_at)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return cron, start_at, end_at
+
+def next_occurrence(cron: CronSchedule, schedule: dict, after: datetime, occurrences: int) -> Optional[datetime]:
+    """A rule's first occurrence after ``after`` once it has run ``occurrences`` times, or None when it is over"""
+    if schedule["max_occurrences"] is not None and occurrences >= schedule["max_occurrences"]:
+        return None
+    if schedule["start_at"]:
+        after = max(after, parse_datetime_string(schedule["start_at"]) - timedelta(microseconds=1))
+    next_run = cron.next_after(after)
+    if next_run is not None and schedule["end_at"] and next_run > parse_datetime_string(schedule["end_at"]):
+        return None
+    return next_run
+
+def upcoming_occurrences(cron: CronSchedule, schedule: dict, first: Optional[datetime], occurrences: int,
+                         until: Optional[datetime], limit: int) -> List[dict]:
+    """Occurrences from ``first`` on, computed one at a time up to ``until`` or ``limit``"""
+    result = []
+    current = first
+    while current is not None and (until is None or current < until) and len(result) < limit:
+        result.append({"at": current.isoformat(), "local": current.astimezone(cron.tz).isoformat()})
+        occurrences += 1
+        current = next_occurrence(cron, schedule, current, occurrences)
+    return result
+
+def parse_window_end(until: Optional[str]) -> Optional[datetime]:
+    if not until:
+        return None
+    try:
+        return parse_datetime_string(until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid 'until': {str(e)}")
+
+@app.post("/recurring-schedules")
+async def create_recurring_schedule(request: RecurringScheduleRequest):
+    """Post ``content`` at every occurrence of a cron rule. Only the rule is
+    stored; each occurrence becomes a scheduled tweet when it comes due."""
+    try:
+        cron, start_at, end_at = parse_recurrence(request)
+        account_id = (await account_lane(request.account_id)).id
+        current_time = get_current_utc_time()
+        schedule_id = str(uuid.uuid4())
+        schedule = RecurringSchedule(
+            id=schedule_id,
+            content=request.content,
+            cron=cron.expression,
+            timezone=request.timezone,
+            start_at=start_at,
+            end_at=end_at,
+            max_occurrences=request.max_occurrences,
+            occurrences=0,
+            next_run_at=None,
+            last_run_at=None,
+            created_at=current_time.isoformat(),
+            status="active",
+            account_id=account_id
+        ).dict()
+        next_run = next_occurrence(cron, schedule, current_time, 0)
+        if next_run is None:
+            raise HTTPException(status_code=400, detail="The schedule has no occurrences after now")
+        schedule["next_run_at"] = next_run.isoformat()
+        
+        await storage.put(RECURRING_SCHEDULES, schedule_id, schedule)
+        recurring_scheduler.add(schedule_id, next_run)
+        
+        return {
+            "success": True,
+            "schedule_id": schedule_id,
+            "next_run_at": schedule["next_run_at"],
+            "message": f"Recurring schedule created, first tweet at {next_run.strftime('%Y-%m-%d %H:%M:%S UTC')}"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating recurring schedule: {str(e)}")
+
+@app.get("/recurring-schedules")
+async def get_recurring_schedules_endpoint(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """Recurring schedules by next_run_at ascending, optionally filtered by status ("active", "finished") and time range"""
+    try:
+        return await list_response(request, response, RECURRING_SCHEDULES, "recurring_schedules", False, limit, cursor, status, since, until)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching recurring schedules: {str(e)}")
+
+@app.post("/recurring-schedules/preview")
+async def preview_recurring_schedule(request: RecurrencePreviewRequest):
+    """The occurrences a schedule created now would have, up to ``until`` and ``limit``"""
+    if request.limit > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"'limit' must be at most {MAX_PAGE_SIZE}")
+    cron, start_at, end_at = parse_recurrence(request)
+    until = parse_window_end(request.until)
+    schedule = {"start_at": start_at, "end_at": end_at, "max_occurrences": request.max_occurrences}
+    first = next_occurrence(cron, schedule, get_current_utc_time(), 0)
+    return {"occurrences": upcoming_occurrences(cron, schedule, first, 0, until, request.limit)}
+
+@app.get("/recurring-schedules/{schedule_id}/occurrences")
+async def get_recurring_schedule_occurrences(
+    schedule_id: str,
+    until: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE)
+):
+    """The upcoming occurrences of a stored schedule, up to ``until`` and ``limit``"""
+    schedule = await storage.get(RECURRING_SCHEDULES, schedule_id)
+    if schedule is None:
+        raise HTTPException(status_code=404, detail="Recurring schedule not found")
+    first = parse_datetime_string(schedule["next_run_at"]) if schedule["status"] == "active" else None
+    cron = CronSchedule(schedule["cron"], schedule["timezone"])
+    return {
+        "schedule_id": schedule_id,
+        "occurrences": upcoming_occurrences(
+            cron, schedule, first, schedule["occurrences"], parse_window_end(until), limit
+        )
+    }
+
+@app.delete("/recurring-schedules/{schedule_id}")
+async def delete_recurring_schedule(schedule_id: str):
+    """Stop a recurring schedule; tweets it already scheduled are left alone"""
+    try:
+        if not await storage.delete(RECURRING_SCHEDULES, schedule_id):
+            raise HTTPException(status_code=404, detail="Recurring schedule not found")
+        recurring_scheduler.remove(schedule_id)
+        
+        return {"success": True, "message": "Recurring schedule deleted successfully"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting recurring schedule: {str(e)}")
+
+# Background posting of scheduled tweets
+SCHEDULER_LAG_SECONDS = Histogram(
+    "scheduler_lag_seconds", "Delay between a tweet's scheduled_time and when it was actually posted",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+SCHEDULED_POSTS = Counter(
+    "scheduled_posts", "Scheduled tweets handled by outcome (posted, rejected, timeout, error)", ["result"])
+SCHEDULER_PENDING = Gauge("scheduler_pending", "Scheduled tweets waiting to come due")
+SCHEDULER_LEADER = Gauge("scheduler_leader", "1 if this worker currently runs the scheduler")
+RECURRING_SCHEDULER_PENDING = Gauge("recurring_scheduler_pending", "Active recurring schedules waiting for their next occurrence")
+RECURRING_RUNS = Counter(
+    "recurring_schedule_runs", "Occurrences of recurring schedules turned into scheduled tweets, by outcome (scheduled, duplicate)",
+    ["result"])
+
+async def send_scheduled_tweet(lane: AccountLane, tweet_data: dict) -> httpx.Response:
+    # Wait for the account's own connection and rate limit before taking
+    # a shared slot, so a throttled account only holds up its own tweets
+    async with lane.turn(), scheduled_post_slots:
+        return await lane.send(tweet_data['content'])
+
+async def post_scheduled_tweet(scheduled_id: str):
+    """Post one due scheduled tweet and record the outcome"""
+    # Claim the tweet first so it is posted at most once, even if two workers
+    # briefly both think they run the scheduler
+    tweet_data = await storage.update(
+        SCHEDULED_TWEETS, scheduled_id, {"status": "posting"}, where={"status": "pending"}
+    )
+    if tweet_data is None:
+        return
+    
+    try:
+        lane = await accounts.lane(tweet_data.get("account_id"))
+        # The deadline covers waiting for the account's turn and a free slot as well as the request
+        response = await asyncio.wait_for(send_scheduled_tweet(lane, tweet_data), timeout=SCHEDULED_POST_TIMEOUT)
+    except asyncio.TimeoutError:
+        await storage.update(SCHEDULED_TWEETS, scheduled_id, {"status": "failed"})
+        SCHEDULED_POSTS.inc(result="timeout")
+        logger.warning("❌ Scheduled tweet timed out", extra={"scheduled_id": scheduled_id, "timeout": SCHEDULED_POST_TIMEOUT})
+        return
+    except Exception as e:
+        await storage.update(SCHEDULED_TWEETS, scheduled_id, {"status": "failed"})
+        SCHEDULED_POSTS.inc(result="error")
+        logger.warning("❌ Error posting scheduled tweet", extra={"scheduled_id": scheduled_id, "error": str(e)})
+        return
+    
+    if response.status_code not in [200, 201]:
+        await storage.update(SCHEDULED_TWEETS, scheduled_id, {"status": "failed"})
+        SCHEDULED_POSTS.inc(result="rejected")
+        logger.warning("❌ Failed to post scheduled tweet", extra={"scheduled_id": scheduled_id, "status_code": response.status_code, "body": response.text[:500]})
+        return
+    
+    SCHEDULED_POSTS.inc(result="posted")
+    try:
+        lag = (get_current_utc_time() - parse_datetime_string(tweet_data['scheduled_time'])).total_seconds()
+        SCHEDULER_LAG_SECONDS.observe(max(lag, 0.0))
+    except ValueError:
+        pass
+    
+    try:
+        # Keyed by the scheduled tweet's id, so recording it twice can't add a second tweet
+        posted_tweet = PostedTweet(
+            id=scheduled_id,
+            content=tweet_data['content'],
+            posted_at=get_current_utc_time().isoformat(),
+            status="posted_scheduled",
+            account_id=lane.id
+        )
+        await storage.put(POSTED_TWEETS, scheduled_id, posted_tweet.dict())
+        await storage.update(SCHEDULED_TWEETS, scheduled_id, {"status": "posted"})
+        logger.info("✅ Scheduled tweet posted", extra={"scheduled_id": scheduled_id, "account_id": lane.id})
+    except Exception as e:
+        # The tweet is live, so it mustn't be marked failed and posted again
+        logger.error("❌ Scheduled tweet posted but not recorded", extra={"scheduled_id": scheduled_id, "error": str(e)})
+
+# Shared by every dispatch batch so overlapping batches respect the same limit
+scheduled_post_slots = asyncio.Semaphore(SCHEDULER_CONCURRENCY)
+
+async def post_due_scheduled_tweets(scheduled_ids: List[str]):
+    """Post a batch of due tweets concurrently, at most SCHEDULER_CONCURRENCY at a time"""
+    await asyncio.gather(*(post_scheduled_tweet(scheduled_id) for scheduled_id in scheduled_ids))
+
+scheduler = TweetScheduler(post_due_scheduled_tweets)
+
+# Occurrence ids are derived from the rule and the due time, so running an
+# occurrence twice (after a crash, or from two workers) schedules one tweet
+RECURRENCE_NAMESPACE = uuid.UUID("5b0c2a57-93a4-4d6e-9f0e-1c7d4e8a6b21")
+
+async def run_recurring_schedule(schedule_id: str):
+    """Schedule a rule's due occurrence as a tweet and move the rule on to its next occurrence"""
+    schedule = await storage.get(RECURRING_SCHEDULES, schedule_id)
+    if schedule is None or schedule["status"] != "active":
+        return
+    due = parse_datetime_string(schedule["next_run_at"])
+    current_time = get_current_utc_time()
+    if due > current_time:
+        recurring_scheduler.add(schedule_id, due)
+        return
+    
+    occurrence_id = str(uuid.uuid5(RECURRENCE_NAMESPACE, f"{schedule_id}/{schedule['next_run_at']}"))
+    occurrence = ScheduledTweet(
+        id=occurrence_id,
+        content=schedule["content"],
+        scheduled_time=due.isoformat(),
+        created_at=current_time.isoformat(),
+        status="pending",
+        account_id=schedule.get("account_id")
+    )
+    inserted = await storage.insert(SCHEDULED_TWEETS, occurrence_id, occurrence.dict())
+    RECURRING_RUNS.inc(result="scheduled" if inserted else "duplicate")
+    
+    # Counting from now rather than from the due time skips the occurrences
+    # missed while no worker ran the scheduler instead of posting them all
+    occurrences = schedule["occurrences"] + 1
+    cron = CronSchedule(schedule["cron"], schedule["timezone"])
+    next_run = next_occurrence(cron, schedule, max(due, current_time), occurrences)
+    advanced = await storage.update(RECURRING_SCHEDULES, schedule_id, {
+        "occurrences": occurrences,
+        "last_run_at": due.isoformat(),
+        "next_run_at": next_run.isoformat() if next_run else None,
+        "status": "active" if next_run else "finished"
+    }, where={"next_run_at": schedule["next_run_at"]})
+    if advanced is not None and next_run is not None:
+        recurring_scheduler.add(schedule_id, next_run)
+    scheduler.add(occurrence_id, due)
+    logger.info("🔁 Recurring schedule ran", extra={
+        "schedule_id": schedule_id, "scheduled_id": occurrence_id, "next_run_at": advanced and advanced["next_run_at"]
+    })
+
+async def run_due_recurring_schedules(schedule_ids: List[str]):
+    async def run(schedule_id: str):
+        try:
+            await run_recurring_schedule(schedule_id)
+        except Exception as e:
+            logger.error("❌ Error running recurring schedule", extra={"schedule_id": schedule_id, "error": str(e)})
+    
+    await asyncio.gather(*(run(schedule_id) for schedule_id in schedule_ids))
+
+# One entry per active rule, due at its next occurrence
+recurring_scheduler = TweetScheduler(run_due_recurring_schedules)
+
+async def load_recurring_schedules():
+    """Seed the recurring scheduler with every active rule in storage"""
+    active, _ = await storage.page(RECURRING_SCHEDULES, status="active")
+    for schedule in active:
+        recurring_scheduler.add(schedule["id"], parse_datetime_string(schedule["next_run_at"]))
+    return len(recurring_scheduler)
+
+async def load_pending_scheduled_tweets():
+    """Seed the scheduler with every pending tweet in storage"""
+    pending, _ = await storage.page(SCHEDULED_TWEETS, status="pending")
+    for tweet_data in pending:
+        scheduled_id = tweet_data['id']
+        try:
+            scheduler.add(scheduled_id, parse_datetime_string(tweet_data['scheduled_time']))
+        except ValueError:
+            logger.warning("Invalid datetime format for scheduled tweet", extra={"scheduled_id": scheduled_id, "scheduled_time": tweet_data['scheduled_time']})
+    return len(scheduler)
+
+async def recover_interrupted_scheduled_tweets():
+    """Fail tweets a previous leader claimed but never recorded an outcome for.
+
+    Nobody else will move them out of "posting", and whether they reached
+    the Twitter clone is unknown, so they are failed rather than retried.
+    A leader that was only slow still overwrites this with its outcome.
+    """
+    recovered = 0
     while True:
+        interrupted, _ = await storage.page(SCHEDULED_TWEETS, limit=500, status="posting")
+        if not interrupted:
+            return recovered
+        for tweet_data in interrupted:
+            await storage.update(SCHEDULED_TWEETS, tweet_data["id"], {
+                "status": "failed",
+                "error": "Posting was interrupted; the tweet may or may not have been posted",
+            }, where={"status": "posting"})
+            logger.warning("Marked interrupted scheduled tweet failed", extra={"scheduled_id": tweet_data["id"]})
+        recovered += len(interrupted)
+
+async def sync_recurring_schedule(change: dict):
+    if change["op"] == "replace":
+        await load_recurring_schedules()
+    elif change["op"] == "delete" or change["status"] != "active":
+        recurring_scheduler.remove(change["id"])
+    else:
+        schedule = await storage.get(RECURRING_SCHEDULES, change["id"])
+        if schedule is not None and schedule["status"] == "active":
+            recurring_scheduler.add(change["id"], parse_datetime_string(schedule["next_run_at"]))
+
+async def sync_scheduled_tweets(version: int):
+    """Follow the change feed so the schedulers see tweets and recurring
+    schedules created, edited or cancelled by other workers"""
+    while True:
+        await asyncio.sleep(SCHEDULER_SYNC_INTERVAL)
         try:
-            current_time = get_current_utc_time()
-            scheduled_tweets_storage = await get_scheduled_tweets()
-            posted_tweets_storage = await get_posted_tweets()
-            
-            tweets_to_update = {}
-            
-            for scheduled_id, tweet_data in scheduled_tweets_storage.items():
-                if tweet_data['status'] != 'pending':
+            result = await storage.changes_since(version, 500)
+            version = result["version"]
+            if result["reset"]:
+                await load_pending_scheduled_tweets()
+                await load_recurring_schedules()
+                continue
+            for change in result["changes"]:
+                if change["collection"] == RECURRING_SCHEDULES:
+                    await sync_recurring_schedule(change)
                     continue
-                
-                try:
-                    scheduled_time = parse_datetime_string(tweet_data['scheduled_time'])
-                except ValueError:
-                    print(f"Invalid datetime format for tweet {scheduled_id}: {tweet_data['scheduled_time']}")
+                if change["collection"] != SCHEDULED_TWEETS:
                     continue
-                
-                if current_time >= scheduled_time:
-                    try:
-                        # Post the tweet
-                        async with httpx.AsyncClient(timeout=30.0) as client:
-                            payload = {
-                                "username": TWITTER_CLONE_USERNAME,
-                                "text": tweet_data['content']
-                            }
-                            
-                            headers = {
-                                "api-key": TWITTER_CLONE_API_KEY,
-                                "Content-Type": "application/json"
-                            }
-                            
-                            response = await client.post(
-                                TWITTER_CLONE_URL,
-                                headers=headers,
-                                json=payload
-                            )
-                            
-                            if response.status_code in [200, 201]:
-                                # Mark as posted and move to posted tweets
-                                tweets_to_update[scheduled_id] = 'posted'
-                                
-                                posted_id = str(uuid.uuid4())
-                                posted_tweet = PostedTweet(
-                                    id=posted_id,
-                                    content=tweet_data['content'],
-                                    posted_at=current_time.isoformat(),
-                                    status="posted_scheduled"
-                                )
-                                
-                                posted_tweets_storage[posted_id] = posted_tweet.dict()
-                                
-                                print(f"✅ Scheduled tweet posted successfully: {tweet_data['content'][:50]}...")
-                            else:
-                                # Mark as failed
-                                tweets_to_update[scheduled_id] = 'failed'
-                                print(f"❌ Failed to post scheduled tweet: {response.text}")
-                                
-                    except Exception as e:
-                        # Mark as failed
-                        tweets_to_update[scheduled_id] = 'failed'
-                        print(f"❌ Error posting scheduled tweet: {str(e)}")
-            
-            # Update statuses and save files
-            if tweets_to_update:
-                for scheduled_id, new_status in tweets_to_update.items():
-                    if scheduled_id in scheduled_tweets_storage:
-                        scheduled_tweets_storage[scheduled_id]['status'] = new_status
-                
-                await save_scheduled_tweets(scheduled_tweets_storage)
-                await save_posted_tweets(posted_tweets_storage)
-            
+                if change["op"] == "replace":
+                    await load_pending_scheduled_tweets()
+                elif change["op"] == "delete" or change["status"] != "pending":
+                    scheduler.remove(change["id"])
+                else:
+                    tweet_data = await storage.get(SCHEDULED_TWEETS, change["id"])
+                    if tweet_data is not None and tweet_data["status"] == "pending":
+                        scheduler.add(change["id"], parse_datetime_string(tweet_data["scheduled_time"]))
+        except Exception:
+            logger.exception("Error syncing scheduled tweets")
+
+async def deliver_post_job(job: dict) -> dict:
+    """Send one outbox job to the Twitter clone as its account and record the posted tweet"""
+    try:
+        lane = await accounts.lane(job.get("account_id"))
+    except UnknownAccount as e:
+        raise PermanentError(str(e), 400)
+    try:
+        response = await lane.send(job["content"])
+    except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+        # The request never reached the Twitter clone, so it is safe to send again
+        raise RetryableError(f"Network error: {str(e)}")
+    except httpx.TimeoutException:
+        # It may have been posted; retrying could post it twice
+        raise PermanentError("Request timeout - Twitter Clone API did not respond; the tweet may have been posted", 408)
+    except httpx.RequestError as e:
+        raise PermanentError(f"Network error: {str(e)}")
+    
+    if response.status_code in [429, 500, 502, 503, 504]:
+        raise RetryableError(f"Failed to post tweet: Status: {response.status_code}, Response: {response.text}",
+                             response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+    if response.status_code not in [200, 201]:
+        raise PermanentError(f"Failed to post tweet: Status: {response.status_code}, Response: {response.text}",
+                             response.status_code)
+    
+    # Keyed by the job id, so recording the same job twice can't add a second tweet
+    posted_tweet = PostedTweet(
+        id=job["id"],
+        content=job["content"],
+        posted_at=get_current_utc_time().isoformat(),
+        status="posted",
+        account_id=lane.id
+    )
+    await storage.put(POSTED_TWEETS, job["id"], posted_tweet.dict())
+    logger.info("✅ Queued tweet posted", extra={"job_id": job["id"], "account_id": lane.id, "attempt": job["attempts"] + 1})
+    return {"posted_id": job["id"], "last_status_code": response.status_code}
+
+outbox = Outbox(
+    storage, deliver_post_job, concurrency=OUTBOX_CONCURRENCY, max_attempts=OUTBOX_MAX_ATTEMPTS,
+    base_delay=OUTBOX_RETRY_BASE_DELAY, max_delay=OUTBOX_RETRY_MAX_DELAY,
+    poll_interval=OUTBOX_POLL_INTERVAL, retention=OUTBOX_RETENTION, lanes=accounts.lanes
+)
+
+scheduler_sync_task: Optional[asyncio.Task] = None
+archive_task: Optional[asyncio.Task] = None
+
+async def archive_old_tweets():
+    """Move posted tweets older than ARCHIVE_AFTER_DAYS into the archive, every ARCHIVE_INTERVAL seconds"""
+    while True:
+        try:
+            cutoff = get_current_utc_time() - timedelta(days=ARCHIVE_AFTER_DAYS)
+            moved = await archives[POSTED_TWEETS].compact(storage, cutoff)
+            if moved:
+                logger.info("🗄️ Archived posted tweets", extra={"records": moved, "cutoff": cutoff.isoformat()})
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"Error in scheduled tweets checker: {str(e)}")
-        
-        # Check every 30 seconds
-        await asyncio.sleep(30)
+            logger.error("❌ Error archiving posted tweets", extra={"error": str(e)})
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+async def start_scheduler():
+    """Run the scheduler, the outbox and archiving in this worker, which has just been elected leader"""
+    global scheduler_sync_task, archive_task
+    version = await storage.current_version()
+    interrupted_count = await recover_interrupted_scheduled_tweets()
+    scheduler.start()
+    recurring_scheduler.start()
+    pending_count = await load_pending_scheduled_tweets()
+    recurring_count = await load_recurring_schedules()
+    scheduler_sync_task = asyncio.create_task(sync_scheduled_tweets(version))
+    outbox.start()
+    if ARCHIVE_AFTER_DAYS > 0 and ARCHIVE_INTERVAL > 0:
+        archive_task = asyncio.create_task(archive_old_tweets())
+    SCHEDULER_LEADER.set(1)
+    logger.info("⏰ Starting scheduler...", extra={
+        "pending": pending_count, "interrupted": interrupted_count, "recurring": recurring_count
+    })
+
+async def stop_scheduler():
+    """Stop running the scheduler, the outbox and archiving in this worker"""
+    global scheduler_sync_task, archive_task
+    for task in (scheduler_sync_task, archive_task):
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    scheduler_sync_task = archive_task = None
+    # Finish well before the lease could pass to another worker. Posts cut
+    # off here stay "posting" (or "sending") until the next leader fails them.
+    await asyncio.gather(
+        scheduler.stop(timeout=SCHEDULER_LEASE_TTL / 3),
+        recurring_scheduler.stop(timeout=SCHEDULER_LEASE_TTL / 3),
+        outbox.stop(timeout=SCHEDULER_LEASE_TTL / 3),
+    )
+    SCHEDULER_LEADER.set(0)
+
+scheduler_election = LeaderElection(
+    storage, "scheduler", lease_holder_id(), SCHEDULER_LEASE_TTL,
+    on_elected=start_scheduler, on_demoted=stop_scheduler
+)
 
 # Start the background task when the app starts
 @app.on_event("startup")
 async def startup_event():
-    print("🚀 Starting Twitter Automation API...")
-    print("📁 Initializing persistent storage...")
+    logger.info("🚀 Starting Twitter Automation API...")
+    logger.info("📁 Initializing persistent storage...", extra={"backend": STORAGE_BACKEND})
+    await storage.open()
     
-    # Initialize empty files if they don't exist
-    for file_path in [DRAFTS_FILE, POSTED_TWEETS_FILE, SCHEDULED_TWEETS_FILE]:
-        if not os.path.exists(file_path):
-            await save_json_file(file_path, {})
+    global openrouter_client
+    openrouter_client = create_http_client(OPENROUTER_READ_TIMEOUT, base_url=OPENROUTER_BASE_URL, upstream="openrouter")
     
-    print("⏰ Starting scheduled tweets checker...")
-    asyncio.create_task(check_scheduled_tweets())
-    print("✅ Twitter Automation API is ready!")
+    await scheduler_election.start()
+    await event_hub.start()
+    # Build the search index and analytics in the background; the first query waits for them
+    asyncio.create_task(search_index.refresh())
+    asyncio.create_task(analytics.refresh())
+    logger.info("✅ Twitter Automation API is ready!")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await event_hub.stop()
+    await scheduler_election.stop()
+    await openrouter_client.aclose()
+    await accounts.close()
+    logger.info("💾 Closing persistent storage...")
+    await storage.close()
+    shutdown_logging()
 
 if __name__ == "__main__":
     import uvicorn
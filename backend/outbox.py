@@ -0,0 +1,305 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+from metrics import Counter, Gauge, Histogram
+from resilience import backoff_delay
+from storage import POST_JOBS, Storage
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_DELIVERIES = Counter(
+    "outbox_deliveries", "Outbox delivery attempts by outcome (delivered, retry, failed)", ["result"])
+OUTBOX_DELIVERY_LATENCY = Histogram(
+    "outbox_delivery_latency_seconds", "Time from enqueueing a job until it was delivered",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0))
+OUTBOX_INFLIGHT = Gauge("outbox_inflight", "Outbox jobs being delivered right now")
+
+# Namespace for deriving job ids from client idempotency keys
+_IDEMPOTENCY_NAMESPACE = uuid.UUID("6f1d3f0e-3c52-4c1b-9a4e-6a1f4a1c2b7d")
+
+
+class RetryableError(Exception):
+    """Delivery failed in a way that may succeed on a later attempt"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class PermanentError(Exception):
+    """Delivery failed and retrying won't help"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def job_id_for_key(idempotency_key: str) -> str:
+    """Stable job id for a client idempotency key, so retries map to the same job"""
+    return str(uuid.uuid5(_IDEMPOTENCY_NAMESPACE, idempotency_key))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class Outbox:
+    """Durable queue of tweets to post, delivered in the background.
+
+    Jobs are records in the ``post_jobs`` collection, ordered by
+    ``next_attempt_at``. A job moves from ``queued`` to ``sending`` through a
+    compare-and-set before it is delivered, so no two deliveries of the same
+    job overlap, then to ``delivered``, back to ``queued`` with a later
+    ``next_attempt_at`` after a retryable failure, or to ``failed`` once
+    ``max_attempts`` are used up or the failure is permanent.
+
+    A job found in ``sending`` when the outbox starts was interrupted
+    mid-delivery; whether it reached the upstream is unknown, so it is
+    marked failed rather than risk posting it twice.
+
+    With ``lanes``, each job is delivered through the lane named by its
+    ``account_id`` (the account it is posted as), which has its own
+    concurrency and rate limit. Due jobs are read lane by lane, and a lane
+    that is busy or out of rate budget isn't read at all: its jobs stay
+    queued without taking delivery slots until a delivery in the lane
+    finishes or its rate allows the next one. A slow or throttled lane
+    only delays its own jobs.
+    """
+
+    # Seconds between sweeps of finished jobs past their retention
+    PRUNE_EVERY = 600.0
+
+    def __init__(self, storage: Storage, deliver: Callable[[dict], Awaitable[dict]], concurrency: int = 10,
+                 max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 poll_interval: float = 1.0, retention: float = 7 * 86400,
+                 lanes: Optional[Callable[[], Awaitable[list]]] = None):
+        self.storage = storage
+        self._deliver = deliver
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._lanes = lanes
+        self._first_lane = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight = set()
+        self._last_prune = 0.0
+
+    async def enqueue(self, job_id: str, content: str, idempotency_key: Optional[str] = None,
+                      account_id: Optional[str] = None) -> tuple:
+        """Store a new job. Returns ``(job, created)``; an existing job with the same id is returned as-is."""
+        now = _now().isoformat()
+        job = {
+            "id": job_id,
+            "idempotency_key": idempotency_key,
+            "content": content,
+            "account_id": account_id,
+            "status": "queued",
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+            "next_attempt_at": now,
+            "last_error": None,
+            "last_status_code": None,
+            "posted_id": None,
+        }
+        if await self.storage.insert(POST_JOBS, job_id, job):
+            self._wakeup.set()
+            return job, True
+        return await self.storage.get(POST_JOBS, job_id), False
+
+    async def fail_lane(self, lane_id: str, error: str) -> int:
+        """Fail the queued jobs of a lane that is gone, since nothing would deliver them. Returns how many."""
+        failed = 0
+        while True:
+            queued, _ = await self.storage.page(POST_JOBS, limit=500, status="queued", account_id=lane_id)
+            for job in queued:
+                if await self.storage.update(POST_JOBS, job["id"], {
+                    "status": "failed",
+                    "updated_at": _now().isoformat(),
+                    "last_error": error,
+                }, where={"status": "queued", "attempts": job["attempts"]}) is not None:
+                    failed += 1
+            if len(queued) < 500:
+                return failed
+
+    async def _recover_interrupted(self):
+        interrupted, _ = await self.storage.page(POST_JOBS, status="sending")
+        for job in interrupted:
+            await self.storage.update(POST_JOBS, job["id"], {
+                "status": "failed",
+                "updated_at": _now().isoformat(),
+                "last_error": "Delivery was interrupted; the tweet may or may not have been posted",
+            }, where={"status": "sending"})
+            logger.warning("Marked interrupted outbox job failed", extra={"job_id": job["id"]})
+
+    async def _prune(self):
+        cutoff = (_now() - timedelta(seconds=self.retention)).isoformat()
+        for status in ("delivered", "failed"):
+            while True:
+                expired, _ = await self.storage.page(POST_JOBS, limit=500, status=status, until=cutoff)
+                for job in expired:
+                    await self.storage.delete(POST_JOBS, job["id"])
+                if len(expired) < 500:
+                    break
+
+    async def _attempt(self, job: dict):
+        attempt = job["attempts"] + 1
+        try:
+            result = await self._deliver(job)
+        except RetryableError as e:
+            if attempt < self.max_attempts:
+                delay = max(backoff_delay(attempt - 1, self.base_delay, self.max_delay), e.retry_after or 0)
+                changes = {"status": "queued",
+                           "next_attempt_at": (_now() + timedelta(seconds=delay)).isoformat()}
+                outcome = "retry"
+            else:
+                changes = {"status": "failed"}
+                outcome = "failed"
+            changes.update(last_error=str(e), last_status_code=e.status_code)
+        except PermanentError as e:
+            changes = {"status": "failed", "last_error": str(e), "last_status_code": e.status_code}
+            outcome = "failed"
+        except Exception as e:
+            logger.exception("💥 Unexpected error delivering outbox job", extra={"job_id": job["id"]})
+            changes = {"status": "failed", "last_error": f"Unexpected error: {str(e)}"}
+            outcome = "failed"
+        else:
+            changes = {"status": "delivered", "last_error": None, **result}
+            outcome = "delivered"
+            OUTBOX_DELIVERY_LATENCY.observe(
+                (_now() - datetime.fromisoformat(job["created_at"])).total_seconds())
+
+        OUTBOX_DELIVERIES.inc(result=outcome)
+        changes.update(attempts=attempt, updated_at=_now().isoformat())
+        await self.storage.update(POST_JOBS, job["id"], changes)
+
+    async def _run_job(self, job: dict, lane: Optional[Any]):
+        try:
+            await self._attempt(job)
+        finally:
+            OUTBOX_INFLIGHT.dec()
+            self._inflight.discard(asyncio.current_task())
+            if lane is not None:
+                lane.release()
+            # A slot is free, so the next due job can go
+            self._wakeup.set()
+
+    async def _dispatch_lane(self, lane: Optional[Any], due_until: str) -> Optional[float]:
+        """Start delivering a lane's due jobs (every due job without lanes)
+        while delivery slots are free. Returns seconds until the lane's rate
+        allows its next job, if that is what stopped it."""
+        while len(self._inflight) < self.concurrency:
+            free = self.concurrency - len(self._inflight)
+            due, _ = await self.storage.page(POST_JOBS, limit=free, status="queued", until=due_until,
+                                             account_id=lane.id if lane is not None else None)
+            for job in due:
+                if lane is not None:
+                    if not await lane.try_acquire():
+                        return None
+                    ready_in = lane.ready_in()
+                    if ready_in > 0:
+                        lane.release()
+                        return ready_in
+                    lane.reserve()
+                claimed = await self.storage.update(POST_JOBS, job["id"], {"status": "sending"},
+                                                    where={"status": "queued", "attempts": job["attempts"]})
+                if claimed is None:
+                    if lane is not None:
+                        lane.release()
+                    continue
+                OUTBOX_INFLIGHT.inc()
+                self._inflight.add(asyncio.create_task(self._run_job(claimed, lane)))
+            if len(due) < free:
+                break
+        return None
+
+    async def _dispatch_due(self) -> Optional[float]:
+        """Start delivering due jobs while delivery slots are free.
+
+        Only as many due jobs as there are free slots are read, per lane
+        with lanes, so a large backlog costs one short read per delivery.
+        Lanes that are busy or waiting on their rate limit are skipped
+        without reading their jobs. Returns seconds until the next queued
+        job is due or a waiting lane may go, or None if there is nothing to
+        wait for or every slot is taken; a finishing delivery wakes the
+        outbox again.
+        """
+        due_until = (_now() + timedelta(microseconds=1)).isoformat()
+        waits = []
+        if self._lanes is None:
+            await self._dispatch_lane(None, due_until)
+        else:
+            lanes = await self._lanes()
+            # Start from a different lane each time so none gets first pick of the slots
+            self._first_lane = (self._first_lane + 1) % max(len(lanes), 1)
+            for lane in lanes[self._first_lane:] + lanes[:self._first_lane]:
+                if len(self._inflight) >= self.concurrency:
+                    break
+                if lane.busy:
+                    continue
+                ready_in = lane.ready_in()
+                if ready_in <= 0:
+                    ready_in = await self._dispatch_lane(lane, due_until)
+                if ready_in is not None:
+                    waits.append(ready_in)
+        if len(self._inflight) >= self.concurrency:
+            return None
+
+        # Due jobs left behind in a busy lane wait for one of its deliveries to finish
+        upcoming, _ = await self.storage.page(POST_JOBS, limit=1, status="queued", since=due_until)
+        if upcoming:
+            waits.append(max((datetime.fromisoformat(upcoming[0]["next_attempt_at"]) - _now()).total_seconds(), 0.0))
+        return min(waits) if waits else None
+
+    async def run(self):
+        await self._recover_interrupted()
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            try:
+                if loop.time() - self._last_prune >= self.PRUNE_EVERY:
+                    self._last_prune = loop.time()
+                    await self._prune()
+                next_in = await self._dispatch_due()
+            except Exception:
+                logger.exception("Error dispatching outbox jobs")
+                next_in = None
+            # Poll as well, since jobs may be enqueued by other workers
+            timeout = self.poll_interval if next_in is None else min(next_in, self.poll_interval)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: Optional[float] = None):
+        """Stop delivering jobs and wait up to ``timeout`` seconds for in-flight deliveries.
+
+        Deliveries still running after that are cancelled and their jobs
+        stay ``sending`` until the outbox starts again and fails them.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Let in-flight deliveries finish so their outcome is recorded
+        if self._inflight:
+            _, unfinished = await asyncio.wait(list(self._inflight), timeout=timeout)
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                logger.warning("Cancelled outbox deliveries still running at shutdown", extra={"count": len(unfinished)})
+                await asyncio.wait(unfinished)
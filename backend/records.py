@@ -0,0 +1,48 @@
+class Record:
+    """Base for the stored record types.
+
+    Records are built from already-validated requests, so unlike the
+    request models they skip validation: a slotted object that turns into
+    a plain dict for storage is all that's needed.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        missing = [name for name in self.__slots__ if name not in fields]
+        if missing or len(fields) != len(self.__slots__):
+            unexpected = sorted(set(fields) - set(self.__slots__))
+            raise TypeError(f"{type(self).__name__}: missing {missing}, unexpected {unexpected}")
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+
+class DraftTweet(Record):
+    __slots__ = ("id", "content", "hashtags", "tone", "created_at", "updated_at")
+
+
+class PostedTweet(Record):
+    __slots__ = ("id", "content", "posted_at", "status", "account_id")
+
+
+class ScheduledTweet(Record):
+    __slots__ = ("id", "content", "scheduled_time", "created_at", "status", "account_id")  # status: "pending", "posting", "posted", "failed"
+
+
+class RecurringSchedule(Record):
+    __slots__ = (
+        "id", "content", "cron", "timezone", "start_at", "end_at", "max_occurrences",
+        "occurrences", "next_run_at", "last_run_at", "created_at", "status", "account_id"
+    )  # status: "active", "finished"
+
+
+class Account(Record):
+    __slots__ = (
+        "id", "username", "api_key", "url", "rate_limit", "rate_burst", "max_connections", "created_at", "updated_at"
+    )  # url, rate_limit, rate_burst, max_connections: None for the TWITTER_CLONE_* defaults
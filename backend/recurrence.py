@@ -0,0 +1,134 @@
+import bisect
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Shorthands accepted in place of the five fields
+CRON_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+}
+_MONTH_NAMES = {name: index for index, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1)}
+_WEEKDAY_NAMES = {name: index for index, name in enumerate(("sun", "mon", "tue", "wed", "thu", "fri", "sat"))}
+# (name, lowest, highest, names)
+_FIELDS = (
+    ("minute", 0, 59, {}),
+    ("hour", 0, 23, {}),
+    ("day of month", 1, 31, {}),
+    ("month", 1, 12, _MONTH_NAMES),
+    ("day of week", 0, 7, _WEEKDAY_NAMES),
+)
+# How far ahead to look for the next occurrence before deciding there is none
+SEARCH_YEARS = 5
+
+
+def _parse_value(text: str, field: tuple) -> int:
+    name, lowest, highest, names = field
+    value = names.get(text.lower()) if not text.isdigit() else int(text)
+    if value is None or not lowest <= value <= highest:
+        raise ValueError(f"Invalid {name} '{text}' (expected {lowest}-{highest})")
+    return value
+
+
+def _parse_field(text: str, field: tuple) -> List[int]:
+    name, lowest, highest, _ = field
+    values = set()
+    for part in text.split(","):
+        part, _, step_text = part.partition("/")
+        step = 1
+        if step_text:
+            if not step_text.isdigit() or int(step_text) < 1:
+                raise ValueError(f"Invalid step '{step_text}' in {name}")
+            step = int(step_text)
+        if part == "*":
+            start, end = lowest, highest
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = _parse_value(start_text, field), _parse_value(end_text, field)
+            if start > end:
+                raise ValueError(f"Invalid range '{part}' in {name}")
+        else:
+            start = _parse_value(part, field)
+            end = highest if step_text else start
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+
+def parse_timezone(name: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone '{name}'")
+
+
+class CronSchedule:
+    """A five-field cron expression (minute hour day-of-month month
+    day-of-week) evaluated in a timezone.
+
+    Fields take ``*``, numbers, ranges, steps and lists, plus month and
+    weekday names; ``@daily`` and the other usual shorthands work too. As
+    in cron, when both day fields are restricted a day matching either
+    one counts. Times are matched on the local wall clock: a time that
+    falls in a daylight-saving gap runs as if the clock hadn't moved
+    (02:30 becomes 03:30), and one that happens twice runs only the first
+    time.
+
+    Nothing is expanded ahead of time; ``next_after`` walks forward a
+    field at a time from the given instant.
+    """
+
+    def __init__(self, expression: str, timezone_name: str = "UTC"):
+        self.expression = expression.strip()
+        self.tz = parse_timezone(timezone_name)
+        fields = CRON_ALIASES.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise ValueError("A cron expression needs 5 fields: minute hour day-of-month month day-of-week")
+        minutes, hours, days, months, weekdays = (_parse_field(text, field) for text, field in zip(fields, _FIELDS))
+        self.minutes, self.hours, self.days, self.months = minutes, hours, set(days), set(months)
+        # 0 and 7 are both Sunday; kept in Python's numbering (Monday is 0)
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self._any_day = fields[2] == "*" or fields[2].startswith("*/")
+        self._any_weekday = fields[4] == "*" or fields[4].startswith("*/")
+
+    def _day_matches(self, local: datetime) -> bool:
+        in_days = local.day in self.days
+        in_weekdays = local.weekday() in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, after: datetime) -> Optional[datetime]:
+        """The first occurrence strictly after ``after``, in UTC, or None within SEARCH_YEARS"""
+        local = after.astimezone(self.tz).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        last_year = local.year + SEARCH_YEARS
+        while local.year <= last_year:
+            if local.month not in self.months:
+                year, month = (local.year + 1, 1) if local.month == 12 else (local.year, local.month + 1)
+                local = datetime(year, month, 1)
+                continue
+            if not self._day_matches(local):
+                local = datetime(local.year, local.month, local.day) + timedelta(days=1)
+                continue
+            hour = bisect.bisect_left(self.hours, local.hour)
+            if hour == len(self.hours):
+                local = datetime(local.year, local.month, local.day) + timedelta(days=1)
+                continue
+            if self.hours[hour] != local.hour:
+                local = local.replace(hour=self.hours[hour], minute=0)
+            minute = bisect.bisect_left(self.minutes, local.minute)
+            if minute == len(self.minutes):
+                local = local.replace(minute=0) + timedelta(hours=1)
+                continue
+            local = local.replace(minute=self.minutes[minute])
+            occurrence = local.replace(tzinfo=self.tz).astimezone(timezone.utc)
+            if occurrence > after:
+                return occurrence
+            # The second pass through a repeated hour, which already ran
+            local += timedelta(minutes=1)
+        return None
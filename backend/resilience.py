@@ -0,0 +1,195 @@
+import asyncio
+import math
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from metrics import Counter, Gauge, Histogram
+
+CIRCUIT_STATE = Gauge(
+    "circuit_breaker_state", "Circuit breaker state (0 closed, 1 open, 2 half-open)", ["name"])
+CIRCUIT_TRANSITIONS = Counter(
+    "circuit_breaker_transitions", "Circuit breaker state changes", ["name", "state"])
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "rate_limiter_wait_seconds", "Time callers waited for an outbound rate limiter token", ["name"])
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limiter_rejections", "Calls refused because the rate limiter wait would be too long", ["name"])
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable, retry in {math.ceil(retry_after)}s")
+        self.retry_after = retry_after
+
+
+class RateLimitExceeded(Exception):
+    """Raised when waiting for an outbound rate limiter token would take too long"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Too many requests to {name}, retry in {math.ceil(retry_after)}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Outbound rate limiter allowing ``rate`` calls per second with bursts of up to ``burst``.
+
+    Callers reserve a token up front and sleep until it is theirs, so
+    waiting callers are released at the configured rate rather than all at
+    once. ``pause`` holds every caller back, e.g. for an upstream's
+    Retry-After. A rate of 0 disables the limit but still honours pauses.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int = 1, max_wait: float = 10.0):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_wait = max_wait
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        # _updated may lie in the future while paused
+        if now <= self._updated:
+            return
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait: Optional[float] = None) -> float:
+        """Take a token and return how long to wait before using it (refused beyond ``max_wait``)"""
+        now = time.monotonic()
+        self._refill(now)
+        delay = max(self._paused_until - now, 0.0)
+        if self.rate > 0:
+            self._tokens -= 1
+            if self._tokens < 0:
+                delay += -self._tokens / self.rate
+        if delay > (self.max_wait if max_wait is None else max_wait):
+            if self.rate > 0:
+                self._tokens += 1
+            RATE_LIMIT_REJECTIONS.inc(name=self.name)
+            raise RateLimitExceeded(self.name, delay)
+        return delay
+
+    def ready_in(self) -> float:
+        """Seconds until a token is free, without taking it"""
+        now = time.monotonic()
+        self._refill(now)
+        delay = max(self._paused_until - now, 0.0)
+        if self.rate > 0 and self._tokens < 1:
+            delay += (1 - self._tokens) / self.rate
+        return delay
+
+    async def acquire(self, max_wait: Optional[float] = None):
+        delay = self.reserve(max_wait)
+        RATE_LIMIT_WAIT_SECONDS.observe(delay, name=self.name)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @property
+    def paused_for(self) -> float:
+        return max(self._paused_until - time.monotonic(), 0.0)
+
+    def pause(self, seconds: float):
+        """Hold back every caller for ``seconds``; tokens then refill from empty"""
+        now = time.monotonic()
+        self._refill(now)
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = min(self._tokens, 0.0)
+        # Refilling starts once the pause is over
+        self._updated = max(self._updated, self._paused_until)
+
+
+class CircuitBreaker:
+    """Fails fast while an upstream keeps failing.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are refused for ``reset_timeout`` seconds. Then a single probe call
+    is let through (half-open): success closes the circuit, failure opens
+    it again. A probe that never reports back is replaced after another
+    ``reset_timeout``.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    _GAUGE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        CIRCUIT_STATE.set(0, name=name)
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._transition(self.HALF_OPEN)
+        return self._state
+
+    def _transition(self, state: str):
+        self._state = state
+        self._probe_started = None
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+        CIRCUIT_STATE.set(self._GAUGE_VALUES[state], name=self.name)
+        CIRCUIT_TRANSITIONS.inc(name=self.name, state=state)
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        state = self.state
+        now = time.monotonic()
+        if state == self.OPEN:
+            raise CircuitOpenError(self.name, self._opened_at + self.reset_timeout - now)
+        if state == self.HALF_OPEN:
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                raise CircuitOpenError(self.name, self._probe_started + self.reset_timeout - now)
+            self._probe_started = now
+
+    def record_success(self):
+        self.failures = 0
+        if self._state != self.CLOSED:
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self._state == self.CLOSED and self.failures >= self.failure_threshold):
+            self._transition(self.OPEN)
+
+    def snapshot(self) -> dict:
+        state = self.state
+        snapshot = {"state": state, "consecutive_failures": self.failures}
+        if state == self.OPEN:
+            snapshot["retry_after"] = round(self._opened_at + self.reset_timeout - time.monotonic(), 3)
+        return snapshot
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff for the given 0-based retry attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
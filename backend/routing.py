@@ -0,0 +1,175 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from metrics import Counter, Gauge, Histogram
+from resilience import CircuitBreaker
+
+MODEL_ATTEMPTS = Counter(
+    "model_router_attempts", "Calls made to each model, by role (primary, hedge, failover) and outcome (won, lost, failed)",
+    ["model", "role", "outcome"])
+ROUTED_CALLS = Counter("model_router_calls", "Requests routed across the candidate models")
+HEDGED_CALLS = Counter(
+    "model_router_hedged_calls", "Routed requests that sent a hedge, by which call answered (primary, hedge, failover, none)",
+    ["winner"])
+MODEL_LATENCY = Histogram(
+    "model_router_latency_seconds", "Time until each model's successful answer", ["model"],
+    buckets=(0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0))
+MODEL_LATENCY_EWMA = Gauge("model_router_latency_ewma_seconds", "Smoothed latency each model is ranked by", ["model"])
+MODEL_LATENCY_QUANTILE = Gauge(
+    "model_router_latency_quantile_seconds", "Recent latency quantile after which a hedge is sent", ["model"])
+
+
+class LatencyTracker:
+    """Recent latencies of one model: an EWMA for ranking and a sliding window for quantiles"""
+
+    def __init__(self, alpha: float = 0.2, window: int = 200):
+        self.alpha = alpha
+        self.ewma: Optional[float] = None
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.ewma = seconds if self.ewma is None else self.alpha * seconds + (1 - self.alpha) * self.ewma
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class ModelRouter:
+    """Sends each request to the fastest healthy model and hedges slow ones.
+
+    Models are ranked by their latency EWMA; a model whose circuit breaker
+    is open goes last. Models not measured yet rank ahead of the measured
+    ones, in their configured order, so each gets tried rather than being
+    stuck behind a model that merely answered once. When the chosen model hasn't answered
+    within its recent ``hedge_quantile`` latency (``hedge_delay`` until it
+    has ``min_samples``), the same request goes to the next model as well.
+    The first successful answer wins and the other calls are cancelled. A
+    call that fails hands over to the next model straight away.
+
+    A cancelled call is recorded with the time it had taken so far, which
+    is less than its real latency but keeps a model that keeps losing from
+    looking fast.
+    """
+
+    def __init__(self, models: list, breakers: dict, hedge_quantile: float = 0.95, hedge_delay: float = 5.0,
+                 max_hedges: int = 1, min_samples: int = 20, alpha: float = 0.2, window: int = 200):
+        self.models = list(models)
+        self.breakers = breakers
+        self.hedge_quantile = hedge_quantile
+        self.hedge_delay = hedge_delay
+        self.max_hedges = max_hedges
+        self.min_samples = min_samples
+        self.latency = {model: LatencyTracker(alpha, window) for model in self.models}
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        return self.breakers[model]
+
+    def ranked(self) -> list:
+        """Candidate models, best first"""
+        def rank(indexed):
+            index, model = indexed
+            ewma = self.latency[model].ewma
+            # Unmeasured models are ranked optimistically, as if they were the fastest
+            return (self.breakers[model].state == CircuitBreaker.OPEN, ewma is not None, ewma or 0.0, index)
+        return [model for _, model in sorted(enumerate(self.models), key=rank)]
+
+    def delay_before_hedge(self, model: str) -> float:
+        tracker = self.latency[model]
+        if len(tracker.samples) < self.min_samples:
+            return self.hedge_delay
+        return tracker.quantile(self.hedge_quantile)
+
+    def _observe(self, model: str, seconds: float, succeeded: bool):
+        tracker = self.latency[model]
+        tracker.observe(seconds)
+        if succeeded:
+            MODEL_LATENCY.observe(seconds, model=model)
+        MODEL_LATENCY_EWMA.set(tracker.ewma, model=model)
+        MODEL_LATENCY_QUANTILE.set(tracker.quantile(self.hedge_quantile), model=model)
+
+    async def call(self, attempt: Callable[[str], Awaitable]):
+        """Return the first successful ``await attempt(model)``.
+
+        Raises the first error when every model that was tried failed.
+        """
+        ranked = self.ranked()
+        primary, backups = ranked[0], ranked[1:]
+        hedges_left = self.max_hedges
+        running = {}  # task -> (model, role, started)
+        error = None
+        winner = None
+        self.calls += 1
+        ROUTED_CALLS.inc()
+
+        def launch(model: str, role: str):
+            running[asyncio.create_task(attempt(model))] = (model, role, time.monotonic())
+
+        launch(primary, "primary")
+        try:
+            while True:
+                pending = [task for task in running if not task.done()]
+                timeout = self.delay_before_hedge(primary) if backups and hedges_left > 0 else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedges_left -= 1
+                    launch(backups.pop(0), "hedge")
+                    continue
+                for task in done:
+                    model, role, started = running[task]
+                    elapsed = time.monotonic() - started
+                    if task.exception() is None:
+                        winner = task
+                        self._observe(model, elapsed, True)
+                        MODEL_ATTEMPTS.inc(model=model, role=role, outcome="won")
+                        return task.result()
+                    error = error or task.exception()
+                    MODEL_ATTEMPTS.inc(model=model, role=role, outcome="failed")
+                if all(task.done() for task in running):
+                    if not backups:
+                        raise error
+                    launch(backups.pop(0), "failover")
+        finally:
+            losers = [task for task in running if not task.done()]
+            for task in losers:
+                task.cancel()
+                model, role, started = running[task]
+                self._observe(model, time.monotonic() - started, False)
+                MODEL_ATTEMPTS.inc(model=model, role=role, outcome="lost")
+            if losers:
+                await asyncio.gather(*losers, return_exceptions=True)
+            if any(role == "hedge" for _, role, _ in running.values()):
+                won_by = running[winner][1] if winner is not None else "none"
+                self.hedged += 1
+                self.hedge_wins += won_by == "hedge"
+                HEDGED_CALLS.inc(winner=won_by)
+
+    def snapshot(self) -> dict:
+        def seconds(value: Optional[float]) -> Optional[float]:
+            return round(value, 3) if value is not None else None
+
+        return {
+            "models": [
+                {
+                    "model": model,
+                    "latency_ewma": seconds(self.latency[model].ewma),
+                    "latency_quantile": seconds(self.latency[model].quantile(self.hedge_quantile)),
+                    "samples": len(self.latency[model].samples),
+                    "hedge_after": seconds(self.delay_before_hedge(model)),
+                    "circuit": self.breakers[model].state,
+                }
+                for model in self.ranked()
+            ],
+            "requests": self.calls,
+            "hedge_rate": round(self.hedged / self.calls, 4) if self.calls else None,
+            "hedge_win_rate": round(self.hedge_wins / self.hedged, 4) if self.hedged else None,
+        }
@@ -0,0 +1,222 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TweetScheduler:
+    """Fires scheduled tweets when they come due.
+
+    Pending tweets live in a min-heap keyed by their due timestamp, and the
+    run loop sleeps until the earliest one instead of polling. Adding a tweet
+    that becomes the new earliest deadline wakes the loop so it can re-arm
+    its timer. Cancelled or rescheduled entries are skipped lazily when they
+    reach the top of the heap.
+
+    Due tweets are handed to ``dispatch`` in a background task so a slow
+    batch never delays the next deadline; ``dispatch`` is responsible for
+    bounding its own concurrency.
+    """
+
+    # Upper bound on a single sleep so wall-clock jumps are noticed eventually
+    MAX_SLEEP = 300.0
+
+    def __init__(self, dispatch: Callable[[List[str]], Awaitable[None]]):
+        self._dispatch = dispatch
+        self._heap = []
+        self._pending = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def next_due(self) -> Optional[float]:
+        """Timestamp of the earliest pending tweet, or None when idle"""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def add(self, scheduled_id: str, due: datetime):
+        """Track a pending tweet, replacing any earlier entry for the same id.
+
+        Ignored while the scheduler isn't running, e.g. in a worker that
+        isn't the elected leader.
+        """
+        if not self.running:
+            return
+        due_ts = due.timestamp()
+        previous_next = self.next_due()
+        self._pending[scheduled_id] = due_ts
+        heapq.heappush(self._heap, (due_ts, next(self._counter), scheduled_id))
+        if previous_next is None or due_ts < previous_next:
+            self._wakeup.set()
+
+    def remove(self, scheduled_id: str):
+        """Stop tracking a tweet. Its heap entry is discarded lazily."""
+        due_ts = self._pending.pop(scheduled_id, None)
+        if due_ts is None:
+            return
+        if self._heap and self._heap[0][2] == scheduled_id:
+            self._wakeup.set()
+        # Keep the heap from filling up with cancelled entries
+        if len(self._heap) > 2 * len(self._pending) + 64:
+            self._heap = [entry for entry in self._heap if self._pending.get(entry[2]) == entry[0]]
+            heapq.heapify(self._heap)
+
+    def _drop_stale(self):
+        while self._heap and self._pending.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def _pop_due(self, now: float) -> List[str]:
+        due = []
+        while True:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            _, _, scheduled_id = heapq.heappop(self._heap)
+            del self._pending[scheduled_id]
+            due.append(scheduled_id)
+
+    async def _run_dispatch(self, due: List[str]):
+        try:
+            await self._dispatch(due)
+        except Exception:
+            logger.exception("Error dispatching scheduled tweets")
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            due = self._pop_due(time.time())
+            if due:
+                task = asyncio.create_task(self._run_dispatch(due))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+                continue
+
+            next_due = self.next_due()
+            timeout = self.MAX_SLEEP if next_due is None else min(max(next_due - time.time(), 0), self.MAX_SLEEP)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: Optional[float] = None):
+        """Stop firing tweets and wait up to ``timeout`` seconds for in-flight dispatches.
+
+        Dispatches still running after that are cancelled.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._heap.clear()
+        self._pending.clear()
+        # Let in-flight posts finish so their outcome is recorded
+        if self._inflight:
+            _, unfinished = await asyncio.wait(list(self._inflight), timeout=timeout)
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                logger.warning("Cancelled scheduled posts still running at shutdown", extra={"count": len(unfinished)})
+                await asyncio.wait(unfinished)
+
+
+class LeaderElection:
+    """Keeps exactly one process in charge of a singleton job through a storage lease.
+
+    Every process runs the election; the one holding the lease ``name``
+    calls ``on_elected`` and renews the lease every ``ttl / 3`` seconds. The
+    others retry on the same interval and take over once the lease lapses,
+    e.g. because its holder died. A leader that can't renew steps down (via
+    ``on_demoted``) before its lease could expire, so two processes never
+    believe they lead at the same time.
+    """
+
+    def __init__(self, storage, name: str, holder: str, ttl: float,
+                 on_elected: Callable[[], Awaitable[None]], on_demoted: Callable[[], Awaitable[None]]):
+        self.storage = storage
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        self._renewed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.is_leader = False
+
+    async def _attempt(self):
+        try:
+            held = await self.storage.acquire_lease(self.name, self.holder, self.ttl)
+            if held:
+                self._renewed_at = time.monotonic()
+        except Exception:
+            logger.exception("Error renewing lease", extra={"lease": self.name})
+            # Keep leading only while the last renewal is certainly still valid
+            held = self.is_leader and time.monotonic() - self._renewed_at < self.ttl * 2 / 3
+
+        if held and not self.is_leader:
+            self.is_leader = True
+            logger.info("👑 Elected leader", extra={"lease": self.name, "holder": self.holder})
+            try:
+                await self._on_elected()
+            except Exception:
+                logger.exception("Error taking up leadership, stepping down", extra={"lease": self.name})
+                # Undo whatever was started and let another process (or a later attempt) lead
+                await self._step_down()
+        elif not held and self.is_leader:
+            logger.warning("Lost leadership", extra={"lease": self.name, "holder": self.holder})
+            await self._demote()
+
+    async def _demote(self):
+        self.is_leader = False
+        try:
+            await self._on_demoted()
+        except Exception:
+            logger.exception("Error stepping down as leader", extra={"lease": self.name})
+
+    async def _step_down(self):
+        """Stop leading and give up the lease"""
+        await self._demote()
+        try:
+            await self.storage.release_lease(self.name, self.holder)
+        except Exception:
+            logger.exception("Error releasing lease", extra={"lease": self.name})
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            await self._attempt()
+
+    async def start(self):
+        """Make a first attempt right away, then keep campaigning in the background"""
+        await self._attempt()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            # Let another process take over without waiting for the lease to lapse
+            await self._step_down()
@@ -0,0 +1,163 @@
+import heapq
+import math
+import re
+from typing import Optional
+
+from storage import DRAFTS, POSTED_TWEETS, Storage, record_sort_key
+from views import ChangeFeedView
+
+# Result "type" for each searchable collection
+SEARCH_TYPES = {"draft": DRAFTS, "posted": POSTED_TWEETS}
+_TYPE_NAMES = {collection: name for name, collection in SEARCH_TYPES.items()}
+
+_WORD = re.compile(r"\w+")
+_HASHTAG = re.compile(r"#(\w+)")
+
+
+def tokenize(text: str) -> list:
+    """Lowercased words of ``text``; a hashtag contributes its word"""
+    return _WORD.findall(text.lower()) if text else []
+
+
+def normalize_hashtag(tag: str) -> str:
+    return tag.strip().lstrip("#").lower()
+
+
+def record_hashtags(record: dict) -> set:
+    """Hashtags in a record's content, plus a draft's separate ``hashtags`` field"""
+    content = record.get("content") or ""
+    tags = {tag.lower() for tag in _HASHTAG.findall(content)} if "#" in content else set()
+    if record.get("hashtags"):
+        tags.update(tokenize(record["hashtags"]))
+    return tags
+
+
+class SearchIndex(ChangeFeedView):
+    """Inverted index over drafts and posted tweets, ranked with BM25.
+
+    Each term maps to the documents containing it and how often, so a query
+    only touches the postings of its own terms; every term must match.
+    Ties are broken by recency. Hashtags have their own postings for
+    filtering. Archived documents keep their postings but not their record,
+    which is read back from the archive when it makes a page of results.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, storage: Storage, archives: Optional[dict] = None):
+        super().__init__(storage, (DRAFTS, POSTED_TWEETS), archives)
+
+    def _clear(self):
+        self._postings = {}
+        self._hashtags = {}
+        # (collection, id) -> (record or None once archived, sort key, length, terms, hashtags)
+        self._documents = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _remove(self, key: tuple):
+        document = self._documents.pop(key, None)
+        if document is None:
+            return
+        _, _, length, terms, hashtags = document
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings[term]
+            del postings[key]
+            if not postings:
+                del self._postings[term]
+        for tag in hashtags:
+            tagged = self._hashtags[tag]
+            tagged.discard(key)
+            if not tagged:
+                del self._hashtags[tag]
+
+    def _apply(self, collection: str, op: str, record_id: Optional[str], record: Optional[dict]):
+        key = (collection, record_id)
+        self._remove(key)
+        if op != "put" or record is None:
+            return
+        tokens = tokenize(record.get("content") or "")
+        if collection == DRAFTS:
+            tokens += tokenize(record.get("hashtags") or "")
+        # Counting by hand is much faster than Counter for a tweet's handful of words,
+        # which matters when the whole history is indexed at startup
+        terms = {}
+        for token in tokens:
+            terms[token] = terms.get(token, 0) + 1
+        hashtags = record_hashtags(record)
+        self._documents[key] = (record, record_sort_key(collection, record), len(tokens), tuple(terms), hashtags)
+        self._total_length += len(tokens)
+        postings = self._postings
+        for term, frequency in terms.items():
+            term_postings = postings.get(term)
+            if term_postings is None:
+                term_postings = postings[term] = {}
+            term_postings[key] = frequency
+        for tag in hashtags:
+            self._hashtags.setdefault(tag, set()).add(key)
+
+    def _archived(self, collection: str, record_id: str):
+        key = (collection, record_id)
+        document = self._documents.get(key)
+        if document is not None:
+            self._documents[key] = (None, *document[1:])
+
+    async def _record(self, key: tuple) -> Optional[dict]:
+        record, sort_key = self._documents[key][:2]
+        if record is None:
+            archive = self.archives.get(key[0])
+            record = await archive.get(sort_key, key[1]) if archive is not None else None
+        return record
+
+    async def search(self, query: str = "", hashtags: tuple = (), collection: Optional[str] = None,
+                     limit: int = 20, offset: int = 0) -> tuple:
+        """Return ``(total, results)`` for one page of matches, best first.
+
+        ``query`` terms are ranked with BM25; with only ``hashtags`` the
+        matches come newest first. Each result is ``{"type", "score",
+        "record"}``.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        candidate_sets = [self._postings.get(term, {}) for term in terms]
+        candidate_sets += [self._hashtags.get(normalize_hashtag(tag), set()) for tag in hashtags]
+        if not candidate_sets:
+            return 0, []
+        candidate_sets.sort(key=len)
+        candidates = set(candidate_sets[0])
+        for other in candidate_sets[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(other)
+        if collection is not None:
+            candidates = {key for key in candidates if key[0] == collection}
+
+        count = len(self._documents)
+        average_length = self._total_length / count if count else 0.0
+        weights = []
+        for term in terms:
+            postings = self._postings.get(term, {})
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            weights.append((postings, idf))
+
+        def score(key):
+            _, _, length, _, _ = self._documents[key]
+            norm = self.K1 * (1 - self.B + self.B * length / average_length) if average_length else self.K1
+            total = 0.0
+            for postings, idf in weights:
+                frequency = postings[key]
+                total += idf * frequency * (self.K1 + 1) / (frequency + norm)
+            return total
+
+        # Highest score first, then newest; heapq only orders the page asked for
+        scored = ((score(key), self._documents[key][1], key) for key in candidates)
+        top = heapq.nlargest(offset + limit, scored)[offset:]
+        results = []
+        for value, _, key in top:
+            record = await self._record(key)
+            if record is not None:
+                results.append({"type": _TYPE_NAMES[key[0]], "score": round(value, 4), "record": record})
+        return len(candidates), results
@@ -0,0 +1,1176 @@
+import asyncio
+import base64
+import bisect
+import itertools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import jsoncodec
+from metrics import Gauge, Histogram, SIZE_BUCKETS
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STORAGE_FLUSH_SECONDS = Histogram(
+    "storage_flush_duration_seconds", "Time spent writing one collection to disk", ["collection"])
+STORAGE_FLUSH_BYTES = Histogram(
+    "storage_flush_bytes", "Size of each collection file written by a flush", ["collection"],
+    buckets=SIZE_BUCKETS)
+STORAGE_FLUSH_RECORDS = Histogram(
+    "storage_flush_records", "Number of record mutations coalesced into one flush", ["collection"],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000))
+STORAGE_DIRTY_RECORDS = Gauge(
+    "storage_dirty_records", "Record mutations waiting for the next flush")
+STORAGE_OP_SECONDS = Histogram(
+    "storage_operation_duration_seconds", "Time spent executing one storage operation", ["backend", "op"])
+STORAGE_OP_BYTES = Histogram(
+    "storage_operation_bytes", "Serialized record bytes read or written by one storage operation",
+    ["backend", "op"], buckets=SIZE_BUCKETS)
+
+# Collection names shared by every backend
+DRAFTS = "drafts"
+POSTED_TWEETS = "posted_tweets"
+SCHEDULED_TWEETS = "scheduled_tweets"
+POST_JOBS = "post_jobs"
+RECURRING_SCHEDULES = "recurring_schedules"
+ACCOUNTS = "accounts"
+COLLECTIONS = (DRAFTS, POSTED_TWEETS, SCHEDULED_TWEETS, POST_JOBS, RECURRING_SCHEDULES, ACCOUNTS)
+
+# Field each collection is ordered and range-filtered by
+SORT_FIELDS = {
+    DRAFTS: "updated_at",
+    POSTED_TWEETS: "posted_at",
+    SCHEDULED_TWEETS: "scheduled_time",
+    POST_JOBS: "next_attempt_at",
+    RECURRING_SCHEDULES: "next_run_at",
+    ACCOUNTS: "created_at",
+}
+
+# The account (configured by TWITTER_CLONE_*) a record belongs to when it names
+# none, including tweets posted before there were other accounts
+DEFAULT_ACCOUNT_ID = "default"
+# Collections whose records name the account they are posted as, indexed by it
+ACCOUNT_COLLECTIONS = (POSTED_TWEETS, SCHEDULED_TWEETS, POST_JOBS, RECURRING_SCHEDULES)
+
+
+def index_key(value) -> str:
+    """Normalize a timestamp to a UTC string that sorts chronologically"""
+    if not value:
+        return ""
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return str(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat(timespec='microseconds')
+
+
+def record_sort_key(collection: str, record: dict) -> str:
+    return index_key(record.get(SORT_FIELDS[collection]))
+
+
+def record_account(collection: str, record: dict) -> Optional[str]:
+    """The account a record is posted as, or None in collections that aren't per account"""
+    if collection not in ACCOUNT_COLLECTIONS:
+        return None
+    return record.get("account_id") or DEFAULT_ACCOUNT_ID
+
+
+def encode_cursor(sort_key: str, record_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_key, record_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        sort_key, record_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return str(sort_key), str(record_id)
+
+
+class SortedIndex:
+    """``(sort_key, id)`` pairs kept in order for keyset pagination"""
+
+    def __init__(self, items=()):
+        self._items = sorted(items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, sort_key: str, record_id: str):
+        bisect.insort(self._items, (sort_key, record_id))
+
+    def remove(self, sort_key: str, record_id: str):
+        position = bisect.bisect_left(self._items, (sort_key, record_id))
+        if position < len(self._items) and self._items[position] == (sort_key, record_id):
+            del self._items[position]
+
+    def scan(self, descending: bool = False, after: Optional[tuple] = None,
+             since: Optional[str] = None, until: Optional[str] = None):
+        """Yield ``(sort_key, id)`` in order, starting after the ``after`` position.
+
+        ``since`` is inclusive and ``until`` exclusive.
+        """
+        items = self._items
+        if descending:
+            end = len(items)
+            if until is not None:
+                end = bisect.bisect_left(items, (until,))
+            if after is not None:
+                end = min(end, bisect.bisect_left(items, after))
+            for position in range(end - 1, -1, -1):
+                if since is not None and items[position][0] < since:
+                    return
+                yield items[position]
+        else:
+            start = 0
+            if since is not None:
+                start = bisect.bisect_left(items, (since,))
+            if after is not None:
+                start = max(start, bisect.bisect_right(items, after))
+            for position in range(start, len(items)):
+                if until is not None and items[position][0] >= until:
+                    return
+                yield items[position]
+
+
+class StorageError(Exception):
+    """Raised when persisted data cannot be read safely"""
+
+
+def read_json_file(file_path: str) -> dict:
+    """Load data from a JSON file, refusing to treat a damaged file as empty"""
+    if not os.path.exists(file_path):
+        return {}
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    if not content.strip():
+        return {}
+    try:
+        data = jsoncodec.loads(content)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise StorageError(f"{file_path} is corrupt ({e}); restore it from a backup or move it aside") from e
+    if not isinstance(data, dict):
+        raise StorageError(f"{file_path} does not contain a JSON object")
+    return data
+
+
+def write_json_file_atomic(file_path: str, content: bytes):
+    """Write a file so that readers see either the old or the new content, never a mix"""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+    # Persist the rename itself
+    dir_fd = os.open(os.path.dirname(os.path.abspath(file_path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class Storage:
+    """Base class for storage backends.
+
+    Records are plain dicts keyed by id inside one of the named collections
+    (``drafts``, ``posted_tweets``, ``scheduled_tweets``). Every committed
+    write is assigned the next value of a monotonically increasing version
+    and appended to a bounded change log, which backs conditional GETs and
+    the ``/changes`` feed and is passed to registered listeners.
+    """
+
+    def __init__(self, change_log_size: int = 10000):
+        self.change_log_size = change_log_size
+        self._listeners = []
+        self._leases = {}
+
+    def add_listener(self, callback: Callable[[dict, Optional[dict]], None]):
+        """Call ``callback(change, record)`` after every committed change.
+
+        ``record`` is the record as written, or None for deletions and
+        whole-collection replacements. Callbacks run on the event loop and
+        must not block.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, changes):
+        for change, record in changes:
+            for listener in self._listeners:
+                try:
+                    listener(change, record)
+                except Exception:
+                    logger.exception("Error in storage listener")
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def all(self, collection: str) -> dict:
+        """Return every record of a collection as ``{id: record}``"""
+        raise NotImplementedError
+
+    async def get(self, collection: str, record_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def put(self, collection: str, record_id: str, record: dict):
+        """Insert or replace a single record"""
+        raise NotImplementedError
+
+    async def put_many(self, collection: str, records: dict):
+        """Insert or replace several records in one write"""
+        for record_id, record in records.items():
+            await self.put(collection, record_id, record)
+
+    async def insert(self, collection: str, record_id: str, record: dict) -> bool:
+        """Add a record unless one with this id exists. Returns False if it did."""
+        raise NotImplementedError
+
+    async def update(self, collection: str, record_id: str, changes: dict,
+                     where: Optional[dict] = None) -> Optional[dict]:
+        """Merge ``changes`` into an existing record. Returns the new record or None if missing.
+
+        With ``where``, the update only happens if every given field still
+        has the given value (compare-and-set); otherwise None is returned.
+        """
+        raise NotImplementedError
+
+    async def delete(self, collection: str, record_id: str) -> bool:
+        """Delete a record. Returns False if it did not exist."""
+        raise NotImplementedError
+
+    async def delete_many(self, collection: str, record_ids, op: str = "delete") -> int:
+        """Delete several records in one write. Returns how many existed.
+
+        ``op`` is what the change log records for each; "archive" tells
+        change-feed readers the record moved to the archive rather than
+        going away.
+        """
+        raise NotImplementedError
+
+    async def replace(self, collection: str, records: dict):
+        """Replace the whole collection with ``records``"""
+        raise NotImplementedError
+
+    async def current_version(self) -> int:
+        """Version of the most recent change (0 before the first write)"""
+        raise NotImplementedError
+
+    async def collection_version(self, collection: str) -> tuple:
+        """``(version, changed_at)`` of the most recent change to a collection"""
+        raise NotImplementedError
+
+    async def changes_since(self, version: int, limit: int = 500) -> dict:
+        """Changes with a version greater than ``version``, oldest first.
+
+        Each change carries the record's current state. ``reset`` is True
+        when the requested changes have already been pruned from the log, in
+        which case the caller must refetch the full collections.
+        """
+        raise NotImplementedError
+
+    async def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        """Take or renew the lease ``name`` for ``ttl`` seconds.
+
+        Returns False while another holder's lease is unexpired. This
+        in-process version suits single-process backends; shared backends
+        store leases where every worker can see them.
+        """
+        now = time.time()
+        current = self._leases.get(name)
+        if current is not None and current[0] != holder and current[1] > now:
+            return False
+        self._leases[name] = (holder, now + ttl)
+        return True
+
+    async def release_lease(self, name: str, holder: str):
+        """Give up a lease early so another holder can take it immediately"""
+        if self._leases.get(name, (None,))[0] == holder:
+            del self._leases[name]
+
+    async def page(self, collection: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                   descending: bool = False, status: Optional[str] = None,
+                   since: Optional[str] = None, until: Optional[str] = None,
+                   account_id: Optional[str] = None) -> tuple:
+        """Return ``(records, next_cursor)`` ordered by the collection's sort field.
+
+        ``since`` (inclusive) and ``until`` (exclusive) bound the sort field,
+        ``status`` filters on the record status, ``account_id`` on
+        ``record_account``, and ``next_cursor`` is None on the last page.
+        This fallback sorts in memory; backends override it with an index.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        since, until = index_key(since) or None, index_key(until) or None
+        records = await self.all(collection)
+        index = SortedIndex(
+            (record_sort_key(collection, record), record_id)
+            for record_id, record in records.items()
+            if (status is None or record.get("status") == status)
+            and (account_id is None or record_account(collection, record) == account_id)
+        )
+        return take_page(
+            ((key, record_id, records[record_id]) for key, record_id in index.scan(descending, after, since, until)),
+            limit
+        )
+
+    async def count(self, collection: str, status: Optional[str] = None, account_id: Optional[str] = None) -> int:
+        """How many records ``page`` would list with these filters. This
+        fallback reads them; backends count them from an index."""
+        records, _ = await self.page(collection, status=status, account_id=account_id)
+        return len(records)
+
+
+def make_change(version: int, collection: str, op: str, record_id: Optional[str],
+                record: Optional[dict], changed_at: str) -> dict:
+    return {
+        "version": version,
+        "collection": collection,
+        "op": op,  # "put", "delete", "archive" (deleted after moving to the archive) or "replace"
+        "id": record_id,
+        "status": record.get("status") if record else None,
+        "changed_at": changed_at,
+    }
+
+
+def _matches(record: dict, where: Optional[dict]) -> bool:
+    return not where or all(record.get(field) == value for field, value in where.items())
+
+
+def lease_holder_id() -> str:
+    """Identifies this process as a lease holder, e.g. ``web-1:4242:9f1c``"""
+    return f"{socket.gethostname()}:{os.getpid()}:{os.urandom(2).hex()}"
+
+
+def changes_reset(current: int) -> dict:
+    return {"version": current, "changes": [], "has_more": False, "reset": True}
+
+
+def take_page(rows, limit: Optional[int]) -> tuple:
+    """Collect up to ``limit`` records from ``(sort_key, id, record)`` rows"""
+    records = []
+    for sort_key, record_id, record in rows:
+        if limit is not None and len(records) == limit:
+            last_key, last_id = records[-1][0], records[-1][1]
+            return [record for _, _, record in records], encode_cursor(last_key, last_id)
+        records.append((sort_key, record_id, record))
+    return [record for _, _, record in records], None
+
+
+class JsonFileStorage(Storage):
+    """One JSON file per collection, held in memory with write-behind flushes.
+
+    Files are read once in ``open()``; every read is then served from memory.
+    Sorted ``(sort_key, id)`` indexes, overall, per status, per account and
+    per account and status, are kept up to date on every mutation so
+    paginated listings never sort the collection.
+    Mutations only mark their collection dirty, and a background task writes
+    dirty collections every ``flush_interval`` seconds, or sooner once
+    ``max_dirty`` records are waiting, so a burst of writes costs one file
+    write. Each flush goes to a temp file that is fsynced and renamed into
+    place, so a crash can never leave a truncated file behind.
+
+    Because the data lives in one process's memory, only one process may
+    use a data directory at a time; ``open()`` takes an exclusive lock on it
+    and fails if another process already holds it.
+    """
+
+    def __init__(self, data_dir: str, flush_interval: float = 1.0, max_dirty: int = 500,
+                 change_log_size: int = 10000):
+        super().__init__(change_log_size)
+        self.data_dir = data_dir
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self._data = {collection: {} for collection in COLLECTIONS}
+        self._dirty = {collection: 0 for collection in COLLECTIONS}
+        self._indexes = {collection: SortedIndex() for collection in COLLECTIONS}
+        self._status_indexes = {collection: {} for collection in COLLECTIONS}
+        # Keyed by account id, and by (account id, status)
+        self._account_indexes = {collection: {} for collection in COLLECTIONS}
+        # Change log; only the version counters survive a restart
+        self._version = 0
+        self._collection_versions = {collection: [0, None] for collection in COLLECTIONS}
+        self._changes = deque(maxlen=change_log_size)
+        self._meta_dirty = False
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher = None
+        self._process_lock = None
+
+    def path(self, collection: str) -> str:
+        return os.path.join(self.data_dir, f"{collection}.json")
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.data_dir, "meta.json")
+
+    def _mark_dirty(self, collection: str, count: int = 1):
+        self._dirty[collection] += count
+        STORAGE_DIRTY_RECORDS.set(sum(self._dirty.values()))
+        if sum(self._dirty.values()) >= self.max_dirty:
+            self._flush_requested.set()
+
+    def _lock_data_dir(self):
+        if fcntl is None:
+            return
+        lock_file = open(os.path.join(self.data_dir, ".lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise StorageError(
+                f"{self.data_dir} is in use by another process. The json backend supports a single "
+                "worker; use STORAGE_BACKEND=sqlite to run several."
+            )
+        self._process_lock = lock_file
+
+    async def open(self):
+        os.makedirs(self.data_dir, exist_ok=True)
+        self._lock_data_dir()
+        for collection in COLLECTIONS:
+            file_path = self.path(collection)
+            if os.path.exists(f"{file_path}.tmp"):
+                # Left over from a flush interrupted before its rename
+                os.remove(f"{file_path}.tmp")
+            started = time.perf_counter()
+            self._data[collection] = await asyncio.to_thread(read_json_file, file_path)
+            STORAGE_OP_SECONDS.observe(time.perf_counter() - started, backend="json", op="load")
+            if os.path.exists(file_path):
+                STORAGE_OP_BYTES.observe(os.path.getsize(file_path), backend="json", op="load")
+            self._rebuild_indexes(collection)
+            if not os.path.exists(file_path):
+                self._mark_dirty(collection)
+        meta = await asyncio.to_thread(read_json_file, self.meta_path)
+        self._version = meta.get("version", 0)
+        for collection, state in meta.get("collections", {}).items():
+            if collection in self._collection_versions:
+                self._collection_versions[collection] = list(state)
+        await self.flush()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+        if self._process_lock is not None:
+            self._process_lock.close()
+            self._process_lock = None
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Error flushing storage")
+
+    async def flush(self):
+        """Write every dirty collection to disk"""
+        async with self._flush_lock:
+            for collection in COLLECTIONS:
+                dirty = self._dirty[collection]
+                if not dirty:
+                    continue
+                # Records are never mutated in place, so a shallow copy is a consistent snapshot
+                snapshot = dict(self._data[collection])
+                self._dirty[collection] = 0
+                started = time.perf_counter()
+                try:
+                    content = await asyncio.to_thread(self._encode, snapshot)
+                    await asyncio.to_thread(write_json_file_atomic, self.path(collection), content)
+                except Exception:
+                    self._dirty[collection] += dirty
+                    raise
+                STORAGE_FLUSH_SECONDS.observe(time.perf_counter() - started, collection=collection)
+                STORAGE_FLUSH_BYTES.observe(len(content), collection=collection)
+                STORAGE_FLUSH_RECORDS.observe(dirty, collection=collection)
+            if self._meta_dirty:
+                self._meta_dirty = False
+                meta = {"version": self._version, "collections": self._collection_versions}
+                try:
+                    await asyncio.to_thread(write_json_file_atomic, self.meta_path, json.dumps(meta).encode())
+                except Exception:
+                    self._meta_dirty = True
+                    raise
+            STORAGE_DIRTY_RECORDS.set(sum(self._dirty.values()))
+
+    @staticmethod
+    def _encode(records: dict) -> bytes:
+        return jsoncodec.dumps(records)
+
+    # --- sort-order indexes ----------------------------------------------------
+
+    def _rebuild_indexes(self, collection: str):
+        by_status = {}
+        by_account = {}
+        entries = []
+        for record_id, record in self._data[collection].items():
+            entry = (record_sort_key(collection, record), record_id)
+            entries.append(entry)
+            by_status.setdefault(record.get("status"), []).append(entry)
+            account_id = record_account(collection, record)
+            if account_id is not None:
+                by_account.setdefault(account_id, []).append(entry)
+                by_account.setdefault((account_id, record.get("status")), []).append(entry)
+        self._indexes[collection] = SortedIndex(entries)
+        self._status_indexes[collection] = {status: SortedIndex(items) for status, items in by_status.items()}
+        self._account_indexes[collection] = {account: SortedIndex(items) for account, items in by_account.items()}
+
+    def _store(self, collection: str, record_id: str, record: dict):
+        self._discard(collection, record_id)
+        self._data[collection][record_id] = record
+        sort_key = record_sort_key(collection, record)
+        self._indexes[collection].add(sort_key, record_id)
+        self._status_indexes[collection].setdefault(record.get("status"), SortedIndex()).add(sort_key, record_id)
+        account_id = record_account(collection, record)
+        if account_id is not None:
+            account_indexes = self._account_indexes[collection]
+            account_indexes.setdefault(account_id, SortedIndex()).add(sort_key, record_id)
+            account_indexes.setdefault((account_id, record.get("status")), SortedIndex()).add(sort_key, record_id)
+
+    def _discard(self, collection: str, record_id: str) -> Optional[dict]:
+        record = self._data[collection].pop(record_id, None)
+        if record is not None:
+            sort_key = record_sort_key(collection, record)
+            self._indexes[collection].remove(sort_key, record_id)
+            status_index = self._status_indexes[collection].get(record.get("status"))
+            if status_index is not None:
+                status_index.remove(sort_key, record_id)
+            account_id = record_account(collection, record)
+            for key in (account_id, (account_id, record.get("status"))):
+                account_index = self._account_indexes[collection].get(key)
+                if account_index is not None:
+                    account_index.remove(sort_key, record_id)
+        return record
+
+    def _record_change(self, collection: str, op: str, record_id: Optional[str], record: Optional[dict]):
+        self._version += 1
+        changed_at = datetime.now(timezone.utc).isoformat()
+        change = make_change(self._version, collection, op, record_id, record, changed_at)
+        self._changes.append(change)
+        self._collection_versions[collection] = [self._version, changed_at]
+        self._meta_dirty = True
+        return change, record
+
+    # --- Storage API -----------------------------------------------------------
+
+    async def all(self, collection: str) -> dict:
+        return dict(self._data[collection])
+
+    async def get(self, collection: str, record_id: str) -> Optional[dict]:
+        return self._data[collection].get(record_id)
+
+    async def put(self, collection: str, record_id: str, record: dict):
+        await self.put_many(collection, {record_id: record})
+
+    async def put_many(self, collection: str, records: dict):
+        changes = []
+        for record_id, record in records.items():
+            record = dict(record)
+            self._store(collection, record_id, record)
+            changes.append(self._record_change(collection, "put", record_id, record))
+        self._mark_dirty(collection, len(records))
+        self._notify(changes)
+
+    async def insert(self, collection: str, record_id: str, record: dict) -> bool:
+        if record_id in self._data[collection]:
+            return False
+        await self.put(collection, record_id, record)
+        return True
+
+    async def update(self, collection: str, record_id: str, changes: dict,
+                     where: Optional[dict] = None) -> Optional[dict]:
+        record = self._data[collection].get(record_id)
+        if record is None or not _matches(record, where):
+            return None
+        record = {**record, **changes}
+        self._store(collection, record_id, record)
+        self._mark_dirty(collection)
+        self._notify([self._record_change(collection, "put", record_id, record)])
+        return record
+
+    async def delete(self, collection: str, record_id: str) -> bool:
+        if self._discard(collection, record_id) is None:
+            return False
+        self._mark_dirty(collection)
+        self._notify([self._record_change(collection, "delete", record_id, None)])
+        return True
+
+    async def delete_many(self, collection: str, record_ids, op: str = "delete") -> int:
+        changes = [
+            self._record_change(collection, op, record_id, None)
+            for record_id in record_ids
+            if self._discard(collection, record_id) is not None
+        ]
+        if changes:
+            self._mark_dirty(collection, len(changes))
+            self._notify(changes)
+        return len(changes)
+
+    async def replace(self, collection: str, records: dict):
+        self._data[collection] = {record_id: dict(record) for record_id, record in records.items()}
+        self._rebuild_indexes(collection)
+        self._mark_dirty(collection, max(len(records), 1))
+        self._notify([self._record_change(collection, "replace", None, None)])
+
+    async def current_version(self) -> int:
+        return self._version
+
+    async def collection_version(self, collection: str) -> tuple:
+        return tuple(self._collection_versions[collection])
+
+    async def changes_since(self, version: int, limit: int = 500) -> dict:
+        oldest = self._changes[0]["version"] if self._changes else self._version + 1
+        if version > self._version or version + 1 < oldest:
+            return changes_reset(self._version)
+        # Versions in the log are contiguous, so the start offset is direct
+        start = version + 1 - oldest
+        selected = list(itertools.islice(self._changes, start, start + limit))
+        result = []
+        for change in selected:
+            record = None
+            if change["op"] == "put":
+                record = self._data[change["collection"]].get(change["id"])
+            result.append({**change, "record": record})
+        return {
+            "version": selected[-1]["version"] if selected else self._version,
+            "changes": result,
+            "has_more": start + limit < len(self._changes),
+            "reset": False,
+        }
+
+    async def page(self, collection: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                   descending: bool = False, status: Optional[str] = None,
+                   since: Optional[str] = None, until: Optional[str] = None,
+                   account_id: Optional[str] = None) -> tuple:
+        after = decode_cursor(cursor) if cursor else None
+        if account_id is not None:
+            key = account_id if status is None else (account_id, status)
+            index = self._account_indexes[collection].get(key) or SortedIndex()
+        elif status is not None:
+            index = self._status_indexes[collection].get(status) or SortedIndex()
+        else:
+            index = self._indexes[collection]
+        records = self._data[collection]
+        rows = ((sort_key, record_id, records[record_id])
+                for sort_key, record_id in index.scan(descending, after, index_key(since) or None,
+                                                      index_key(until) or None))
+        return take_page(rows, limit)
+
+    async def count(self, collection: str, status: Optional[str] = None, account_id: Optional[str] = None) -> int:
+        if account_id is not None:
+            index = self._account_indexes[collection].get(account_id if status is None else (account_id, status))
+        elif status is not None:
+            index = self._status_indexes[collection].get(status)
+        else:
+            index = self._indexes[collection]
+        return len(index) if index is not None else 0
+
+
+class SQLiteStorage(Storage):
+    """SQLite database in WAL mode with one row per record.
+
+    Every statement runs on a single dedicated thread that owns the
+    connection, so the event loop never blocks on disk I/O and writes are
+    serialized without extra locking. Single-row writes touch one B-tree
+    entry regardless of how many records exist, and listings are read in
+    order from indexes on ``(collection, sort_key)``,
+    ``(collection, status, sort_key)``, ``(collection, account_id, sort_key)``
+    and ``(collection, account_id, status, sort_key)``.
+    """
+
+    SCHEMA_VERSION = 5
+    # Prune the change log once every this many versions
+    PRUNE_EVERY = 100
+
+    def __init__(self, db_path: str, data_dir: Optional[str] = None, change_log_size: int = 10000):
+        super().__init__(change_log_size)
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _run(self, fn, *args):
+        op = fn.__name__.lstrip("_")
+
+        def timed():
+            # Timed on the executor thread, so queueing behind other operations isn't counted
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                STORAGE_OP_SECONDS.observe(time.perf_counter() - started, backend="sqlite", op=op)
+
+        return asyncio.get_running_loop().run_in_executor(self._executor, timed)
+
+    # --- executor-thread helpers -------------------------------------------
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        self._conn = conn
+        self._migrate_schema()
+
+    def _migrate_schema(self):
+        conn = self._conn
+        # Several worker processes may start at once; holding the write lock
+        # makes reading user_version and migrating one atomic step
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < 1:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS records (
+                        collection TEXT NOT NULL,
+                        id TEXT NOT NULL,
+                        data TEXT NOT NULL,
+                        PRIMARY KEY (collection, id)
+                    ) WITHOUT ROWID
+                """)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS meta (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL
+                    )
+                """)
+            if version < 2:
+                # Indexed sort/status columns for paginated listings
+                conn.execute("ALTER TABLE records ADD COLUMN sort_key TEXT NOT NULL DEFAULT ''")
+                conn.execute("ALTER TABLE records ADD COLUMN status TEXT")
+                rows = conn.execute("SELECT collection, id, data FROM records").fetchall()
+                updates = []
+                for collection, record_id, data in rows:
+                    record = jsoncodec.loads(data)
+                    updates.append((record_sort_key(collection, record), record.get("status"), collection, record_id))
+                conn.executemany("UPDATE records SET sort_key = ?, status = ? WHERE collection = ? AND id = ?", updates)
+                conn.execute("CREATE INDEX records_by_sort_key ON records (collection, sort_key, id)")
+                conn.execute("CREATE INDEX records_by_status ON records (collection, status, sort_key, id)")
+            if version < 3:
+                conn.execute("""
+                    CREATE TABLE changes (
+                        version INTEGER PRIMARY KEY AUTOINCREMENT,
+                        collection TEXT NOT NULL,
+                        record_id TEXT,
+                        op TEXT NOT NULL,
+                        status TEXT,
+                        changed_at TEXT NOT NULL
+                    )
+                """)
+            if version < 4:
+                # Time-limited named leases, e.g. which worker runs the scheduler
+                conn.execute("""
+                    CREATE TABLE leases (
+                        name TEXT PRIMARY KEY,
+                        holder TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                """)
+            if version < 5:
+                # Indexed account column for per-account listings
+                conn.execute("ALTER TABLE records ADD COLUMN account_id TEXT")
+                placeholders = ", ".join("?" * len(ACCOUNT_COLLECTIONS))
+                rows = conn.execute(
+                    f"SELECT collection, id, data FROM records WHERE collection IN ({placeholders})", ACCOUNT_COLLECTIONS
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE records SET account_id = ? WHERE collection = ? AND id = ?",
+                    [(record_account(collection, jsoncodec.loads(data)), collection, record_id)
+                     for collection, record_id, data in rows]
+                )
+                conn.execute("CREATE INDEX records_by_account ON records (collection, account_id, sort_key, id)")
+                conn.execute(
+                    "CREATE INDEX records_by_account_status ON records (collection, account_id, status, sort_key, id)"
+                )
+            if version < self.SCHEMA_VERSION:
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _index_columns(collection, record) -> tuple:
+        return record_sort_key(collection, record), record.get("status"), record_account(collection, record)
+
+    def _row(self, collection, record_id, record) -> tuple:
+        return (collection, record_id, jsoncodec.dumps(record).decode(), *self._index_columns(collection, record))
+
+    def _import_json_files(self) -> dict:
+        """One-shot import of the legacy data/*.json files"""
+        conn = self._conn
+        imported = {}
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Checked under the write lock so concurrent workers import only once
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+                conn.execute("ROLLBACK")
+                return {}
+            for collection in COLLECTIONS:
+                file_path = os.path.join(self.data_dir, f"{collection}.json")
+                if not os.path.exists(file_path):
+                    continue
+                records = read_json_file(file_path)
+                conn.executemany(
+                    "INSERT OR IGNORE INTO records (collection, id, data, sort_key, status, account_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [self._row(collection, record_id, record) for record_id, record in records.items()]
+                )
+                imported[collection] = len(records)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', datetime('now'))")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return imported
+
+    def _log_change(self, collection, op, record_id, record):
+        """Append to the change log inside the caller's transaction"""
+        conn = self._conn
+        changed_at = datetime.now(timezone.utc).isoformat()
+        version = conn.execute(
+            "INSERT INTO changes (collection, record_id, op, status, changed_at) VALUES (?, ?, ?, ?, ?)",
+            (collection, record_id, op, record.get("status") if record else None, changed_at)
+        ).lastrowid
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (f"version:{collection}", json.dumps([version, changed_at]))
+        )
+        if version % self.PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM changes WHERE version <= ?", (version - self.change_log_size,))
+        return make_change(version, collection, op, record_id, record, changed_at), record
+
+    def _all(self, collection):
+        rows = self._conn.execute(
+            "SELECT id, data FROM records WHERE collection = ?", (collection,)
+        ).fetchall()
+        STORAGE_OP_BYTES.observe(sum(len(data) for _, data in rows), backend="sqlite", op="all")
+        return {record_id: jsoncodec.loads(data) for record_id, data in rows}
+
+    def _get(self, collection, record_id):
+        row = self._conn.execute(
+            "SELECT data FROM records WHERE collection = ? AND id = ?", (collection, record_id)
+        ).fetchone()
+        return jsoncodec.loads(row[0]) if row else None
+
+    def _put_many(self, collection, records):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = [self._row(collection, record_id, record) for record_id, record in records.items()]
+            conn.executemany(
+                "INSERT OR REPLACE INTO records (collection, id, data, sort_key, status, account_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            STORAGE_OP_BYTES.observe(sum(len(row[2]) for row in rows), backend="sqlite", op="put_many")
+            changes = [self._log_change(collection, "put", record_id, record)
+                       for record_id, record in records.items()]
+            conn.execute("COMMIT")
+            return changes
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _insert(self, collection, record_id, record):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO records (collection, id, data, sort_key, status, account_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                self._row(collection, record_id, record)
+            )
+            changes = [self._log_change(collection, "put", record_id, record)] if cursor.rowcount else []
+            conn.execute("COMMIT")
+            return changes
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _update(self, collection, record_id, changes, where):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            record = self._get(collection, record_id)
+            if record is None or not _matches(record, where):
+                conn.execute("ROLLBACK")
+                return None, []
+            record.update(changes)
+            conn.execute(
+                "UPDATE records SET data = ?, sort_key = ?, status = ?, account_id = ? WHERE collection = ? AND id = ?",
+                (jsoncodec.dumps(record).decode(), *self._index_columns(collection, record), collection, record_id)
+            )
+            change = self._log_change(collection, "put", record_id, record)
+            conn.execute("COMMIT")
+            return record, [change]
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _delete(self, collection, record_id):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "DELETE FROM records WHERE collection = ? AND id = ?", (collection, record_id)
+            )
+            changes = [self._log_change(collection, "delete", record_id, None)] if cursor.rowcount else []
+            conn.execute("COMMIT")
+            return changes
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _delete_many(self, collection, record_ids, op):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            changes = []
+            for record_id in record_ids:
+                cursor = conn.execute(
+                    "DELETE FROM records WHERE collection = ? AND id = ?", (collection, record_id)
+                )
+                if cursor.rowcount:
+                    changes.append(self._log_change(collection, op, record_id, None))
+            conn.execute("COMMIT")
+            return changes
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _replace(self, collection, records):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM records WHERE collection = ?", (collection,))
+            rows = [self._row(collection, record_id, record) for record_id, record in records.items()]
+            conn.executemany(
+                "INSERT INTO records (collection, id, data, sort_key, status, account_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            STORAGE_OP_BYTES.observe(sum(len(row[2]) for row in rows), backend="sqlite", op="replace")
+            changes = [self._log_change(collection, "replace", None, None)]
+            conn.execute("COMMIT")
+            return changes
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _page(self, collection, limit, after, descending, status, since, until, account_id):
+        clauses = ["collection = ?"]
+        params = [collection]
+        if account_id is not None:
+            clauses.append("account_id = ?")
+            params.append(account_id)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if since is not None:
+            clauses.append("sort_key >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("sort_key < ?")
+            params.append(until)
+        if after is not None:
+            clauses.append(f"(sort_key, id) {'<' if descending else '>'} (?, ?)")
+            params.extend(after)
+        order = "DESC" if descending else "ASC"
+        sql = f"SELECT sort_key, id, data FROM records WHERE {' AND '.join(clauses)} ORDER BY sort_key {order}, id {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+        rows = self._conn.execute(sql, params).fetchall()
+        STORAGE_OP_BYTES.observe(sum(len(row[2]) for row in rows), backend="sqlite", op="page")
+        return take_page(((sort_key, record_id, jsoncodec.loads(data)) for sort_key, record_id, data in rows), limit)
+
+    def _count(self, collection, status, account_id):
+        clauses = ["collection = ?"]
+        params = [collection]
+        for column, value in (("account_id", account_id), ("status", status)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return self._conn.execute(f"SELECT COUNT(*) FROM records WHERE {' AND '.join(clauses)}", params).fetchone()[0]
+
+    def _acquire_lease(self, name, holder, ttl):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            acquired = row is None or row[0] == holder or row[1] <= now
+            if acquired:
+                conn.execute(
+                    "INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                    (name, holder, now + ttl)
+                )
+            conn.execute("COMMIT")
+            return acquired
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _release_lease(self, name, holder):
+        self._conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def _current_version(self):
+        return self._conn.execute("SELECT COALESCE(MAX(version), 0) FROM changes").fetchone()[0]
+
+    def _collection_version(self, collection):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (f"version:{collection}",)).fetchone()
+        return tuple(json.loads(row[0])) if row else (0, None)
+
+    def _changes_since(self, version, limit):
+        conn = self._conn
+        oldest, current = conn.execute("SELECT MIN(version), COALESCE(MAX(version), 0) FROM changes").fetchone()
+        if oldest is None:
+            oldest = current + 1
+        if version > current or version + 1 < oldest:
+            return changes_reset(current)
+        rows = conn.execute("""
+            SELECT c.version, c.collection, c.op, c.record_id, c.status, c.changed_at, r.data
+            FROM changes c
+            LEFT JOIN records r ON r.collection = c.collection AND r.id = c.record_id
+            WHERE c.version > ?
+            ORDER BY c.version
+            LIMIT ?
+        """, (version, limit + 1)).fetchall()
+        has_more = len(rows) > limit
+        changes = []
+        for change_version, collection, op, record_id, status, changed_at, data in rows[:limit]:
+            changes.append({
+                "version": change_version,
+                "collection": collection,
+                "op": op,
+                "id": record_id,
+                "status": status,
+                "changed_at": changed_at,
+                "record": jsoncodec.loads(data) if data and op == "put" else None,
+            })
+        return {
+            "version": changes[-1]["version"] if changes else current,
+            "changes": changes,
+            "has_more": has_more,
+            "reset": False,
+        }
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # --- async API -----------------------------------------------------------
+
+    async def open(self):
+        await self._run(self._connect)
+        if self.data_dir:
+            imported = await self._run(self._import_json_files)
+            if imported:
+                summary = ", ".join(f"{count} {name}" for name, count in imported.items())
+                logger.info("📦 Migrated JSON files into SQLite", extra={"db_path": self.db_path, "records": summary})
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+    async def all(self, collection: str) -> dict:
+        return await self._run(self._all, collection)
+
+    async def get(self, collection: str, record_id: str) -> Optional[dict]:
+        return await self._run(self._get, collection, record_id)
+
+    async def put(self, collection: str, record_id: str, record: dict):
+        await self.put_many(collection, {record_id: record})
+
+    async def put_many(self, collection: str, records: dict):
+        if records:
+            self._notify(await self._run(self._put_many, collection, records))
+
+    async def insert(self, collection: str, record_id: str, record: dict) -> bool:
+        logged = await self._run(self._insert, collection, record_id, record)
+        self._notify(logged)
+        return bool(logged)
+
+    async def update(self, collection: str, record_id: str, changes: dict,
+                     where: Optional[dict] = None) -> Optional[dict]:
+        record, logged = await self._run(self._update, collection, record_id, changes, where)
+        self._notify(logged)
+        return record
+
+    async def delete(self, collection: str, record_id: str) -> bool:
+        logged = await self._run(self._delete, collection, record_id)
+        self._notify(logged)
+        return bool(logged)
+
+    async def delete_many(self, collection: str, record_ids, op: str = "delete") -> int:
+        logged = await self._run(self._delete_many, collection, list(record_ids), op)
+        self._notify(logged)
+        return len(logged)
+
+    async def replace(self, collection: str, records: dict):
+        self._notify(await self._run(self._replace, collection, records))
+
+    async def current_version(self) -> int:
+        return await self._run(self._current_version)
+
+    async def collection_version(self, collection: str) -> tuple:
+        return await self._run(self._collection_version, collection)
+
+    async def changes_since(self, version: int, limit: int = 500) -> dict:
+        return await self._run(self._changes_since, version, limit)
+
+    async def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        return await self._run(self._acquire_lease, name, holder, ttl)
+
+    async def release_lease(self, name: str, holder: str):
+        await self._run(self._release_lease, name, holder)
+
+    async def page(self, collection: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                   descending: bool = False, status: Optional[str] = None,
+                   since: Optional[str] = None, until: Optional[str] = None,
+                   account_id: Optional[str] = None) -> tuple:
+        after = decode_cursor(cursor) if cursor else None
+        return await self._run(self._page, collection, limit, after, descending, status,
+                               index_key(since) or None, index_key(until) or None, account_id)
+
+    async def count(self, collection: str, status: Optional[str] = None, account_id: Optional[str] = None) -> int:
+        return await self._run(self._count, collection, status, account_id)
+
+
+def create_storage(backend: str, data_dir: str, flush_interval: float = 1.0,
+                   max_dirty: int = 500, change_log_size: int = 10000) -> Storage:
+    """Build the storage backend selected by the STORAGE_BACKEND setting"""
+    if backend == "sqlite":
+        return SQLiteStorage(os.path.join(data_dir, "tweets.db"), data_dir=data_dir,
+                             change_log_size=change_log_size)
+    if backend == "json":
+        return JsonFileStorage(data_dir, flush_interval=flush_interval, max_dirty=max_dirty,
+                               change_log_size=change_log_size)
+    raise ValueError(f"Unknown storage backend: {backend}. Use 'sqlite' or 'json'.")
@@ -0,0 +1,226 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+from accounts import AccountRegistry, UnknownAccount, validate_account_url
+from storage import ACCOUNTS, POST_JOBS, create_storage
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.mark.parametrize("url", ["http://clone.test/api/tweets", "https://clone.test:8443/tweets"])
+def test_absolute_http_urls_are_accepted(url):
+    assert validate_account_url(url) == url
+
+
+@pytest.mark.parametrize("url", ["clone.test/api/tweets", "/api/tweets", "ftp://clone.test/tweets", "http://"])
+def test_other_urls_are_rejected(url):
+    with pytest.raises(ValueError):
+        validate_account_url(url)
+
+
+def registry_scenario(tmp_path, scenario):
+    async def wrapper():
+        storage = create_storage("sqlite", str(tmp_path))
+        await storage.open()
+        registry = AccountRegistry(
+            storage, {"username": "default-user", "api_key": "default-key", "url": "http://clone.test/tweets"},
+            lambda max_connections: httpx.AsyncClient(), rate_limit=5, max_connections=3)
+        try:
+            return await scenario(storage, registry)
+        finally:
+            await registry.close()
+            await storage.close()
+    return run(wrapper())
+
+
+def stored_account(account_id, **settings):
+    return {"id": account_id, "username": account_id, "api_key": f"{account_id}-key", "url": None,
+            "rate_limit": None, "rate_burst": None, "max_connections": None, **settings}
+
+
+def test_unset_settings_follow_the_defaults(tmp_path):
+    async def scenario(storage, registry):
+        await storage.put(ACCOUNTS, "alice", stored_account("alice", max_connections=1))
+        return await registry.get("alice"), await registry.get(None), await registry.get("nobody")
+
+    alice, default, nobody = registry_scenario(tmp_path, scenario)
+    assert (alice["url"], alice["rate_limit"], alice["max_connections"]) == ("http://clone.test/tweets", 5, 1)
+    assert (default["id"], default["username"]) == ("default", "default-user")
+    assert nobody is None
+
+
+def test_edited_account_gets_a_new_lane(tmp_path):
+    async def scenario(storage, registry):
+        await storage.put(ACCOUNTS, "alice", stored_account("alice"))
+        first = await registry.lane("alice")
+        same = await registry.lane("alice")
+        await storage.update(ACCOUNTS, "alice", {"api_key": "rotated"})
+        edited = await registry.lane("alice")
+        return first, same, edited
+
+    first, same, edited = registry_scenario(tmp_path, scenario)
+    assert first is same
+    assert edited is not first
+    assert edited.account["api_key"] == "rotated"
+    assert first.client.is_closed
+
+
+def test_lanes_lists_every_account_and_retires_deleted_ones(tmp_path):
+    async def scenario(storage, registry):
+        for account_id in ("alice", "bob"):
+            await storage.put(ACCOUNTS, account_id, stored_account(account_id))
+        before = [lane.id for lane in await registry.lanes()]
+        bob = await registry.lane("bob")
+        await storage.delete(ACCOUNTS, "bob")
+        after = [lane.id for lane in await registry.lanes()]
+        await asyncio.sleep(0)
+        with pytest.raises(UnknownAccount):
+            await registry.lane("bob")
+        return before, after, bob
+
+    before, after, bob = registry_scenario(tmp_path, scenario)
+    assert before == ["default", "alice", "bob"]
+    assert after == ["default", "alice"]
+    assert bob.client.is_closed
+
+
+@pytest.fixture
+def clone(route_twitter_clone):
+    """Stand-in Twitter clone recording who each tweet was posted as"""
+    received = []
+
+    def handler(request):
+        received.append({"url": str(request.url), "api_key": request.headers["api-key"],
+                         **json.loads(request.content)})
+        return httpx.Response(201, json={"id": len(received)})
+
+    route_twitter_clone(handler)
+    return received
+
+
+def register(client, account_id, **settings):
+    account = {"id": account_id, "username": f"{account_id}-user", "api_key": f"{account_id}-key", **settings}
+    return client.post("/accounts", json=account)
+
+
+@pytest.fixture
+def account(client):
+    """Register an account for one test and remove it afterwards"""
+    registered = []
+
+    def make(account_id, **settings):
+        response = register(client, account_id, **settings)
+        assert response.status_code == 200
+        registered.append(account_id)
+        return response.json()["account"]
+
+    yield make
+    for account_id in registered:
+        client.delete(f"/accounts/{account_id}")
+
+
+def test_accounts_are_registered_without_showing_their_keys(client, account):
+    created = account("crud", url="http://other-clone.test/tweets", max_connections=2)
+    assert "api_key" not in created
+    assert created["api_key_set"] is True
+
+    assert register(client, "crud").status_code == 409
+    assert register(client, "default").status_code == 409
+    assert register(client, "bad-url", url="not a url").status_code == 422
+    assert register(client, "Bad Id").status_code == 422
+
+    listed = client.get("/accounts").json()["accounts"]
+    assert [shown["id"] for shown in listed][0] == "default"
+    crud = next(shown for shown in listed if shown["id"] == "crud")
+    assert (crud["url"], crud["max_connections"], crud["rate_burst"]) == (
+        "http://other-clone.test/tweets", 2, main.TWITTER_CLONE_RATE_BURST)
+    assert all("api_key" not in shown for shown in listed)
+
+
+def test_updates_leave_out_fields_but_never_null_them(client, account):
+    account("edited", max_connections=2)
+    for field in ("username", "api_key", "url"):
+        assert client.put("/accounts/edited", json={field: None}).status_code == 422
+    assert client.put("/accounts/edited", json={"url": "clone.test"}).status_code == 422
+
+    updated = client.put("/accounts/edited", json={"username": "renamed", "max_connections": None})
+    assert updated.status_code == 200
+    shown = client.get("/accounts/edited").json()
+    assert (shown["username"], shown["max_connections"]) == ("renamed", main.TWITTER_CLONE_MAX_CONNECTIONS)
+    assert shown["api_key_set"] is True
+
+    assert client.put("/accounts/default", json={"username": "x"}).status_code == 409
+    assert client.put("/accounts/nobody", json={"username": "x"}).status_code == 404
+
+
+def test_deleting_an_account_fails_its_queued_jobs(client, account):
+    account("leaving")
+    # Not due for a long while, so only the deletion can settle it
+    job = {"id": "leaving-job", "content": "hello", "account_id": "leaving", "status": "queued", "attempts": 0,
+           "created_at": "2099-01-01T00:00:00+00:00", "updated_at": "2099-01-01T00:00:00+00:00",
+           "next_attempt_at": "2099-01-01T00:00:00+00:00", "last_error": None, "last_status_code": None,
+           "posted_id": None}
+    client.portal.call(main.storage.put, POST_JOBS, job["id"], job)
+    assert client.get("/accounts/leaving").json()["jobs"] == {"queued": 1, "sending": 0}
+
+    deleted = client.delete("/accounts/leaving")
+    assert deleted.status_code == 200
+    assert deleted.json()["failed_jobs"] == 1
+    failed = client.portal.call(main.storage.get, POST_JOBS, job["id"])
+    assert (failed["status"], failed["last_error"]) == ("failed", "Unknown account 'leaving'")
+
+    assert client.get("/accounts/leaving").status_code == 404
+    assert client.delete("/accounts/leaving").status_code == 404
+    assert client.delete("/accounts/default").status_code == 409
+
+
+def test_tweets_are_posted_as_the_chosen_account(client, account, clone):
+    account("poster", url="http://poster-clone.test/tweets")
+    response = client.post("/post-tweet", json={"content": "Hello as poster", "account_id": "poster"})
+    assert response.status_code == 200
+    assert clone == [{"url": "http://poster-clone.test/tweets", "api_key": "poster-key",
+                      "username": "poster-user", "text": "Hello as poster"}]
+
+    client.post("/post-tweet", json={"content": "Hello as default"})
+    assert clone[-1]["username"] == main.TWITTER_CLONE_USERNAME
+
+    posted = client.get("/accounts/poster/posted-tweets").json()
+    assert [tweet["content"] for tweet in posted["posted_tweets"]] == ["Hello as poster"]
+    assert client.get("/accounts/poster").json()["status"]["sent"]["posted"] == 1
+
+    assert client.post("/post-tweet", json={"content": "Hello", "account_id": "nobody"}).status_code == 400
+
+
+def test_fan_out_queues_one_job_per_account(client, account, clone):
+    account("fan-a")
+    account("fan-b")
+    assert client.post("/post-tweets/fan-out",
+                       json={"content": "Hi", "account_ids": ["fan-a", "nobody"]}).status_code == 400
+
+    headers = {"Idempotency-Key": "fan-out-once"}
+    response = client.post("/post-tweets/fan-out", json={"content": "Hi all", "account_ids": ["fan-a", "fan-b"]},
+                           headers=headers)
+    assert response.status_code == 202
+    jobs = response.json()["jobs"]
+    assert [job["account_id"] for job in jobs] == ["fan-a", "fan-b"]
+
+    async def delivered():
+        while True:
+            found = [await main.storage.get(POST_JOBS, job["job_id"]) for job in jobs]
+            if all(job["status"] == "delivered" for job in found):
+                return found
+            await asyncio.sleep(0.01)
+
+    client.portal.call(asyncio.wait_for, delivered(), 5)
+    assert sorted(tweet["username"] for tweet in clone) == ["fan-a-user", "fan-b-user"]
+
+    replay = client.post("/post-tweets/fan-out", json={"content": "Hi all", "account_ids": ["fan-a", "fan-b"]},
+                         headers=headers)
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert len(clone) == 2
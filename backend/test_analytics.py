@@ -0,0 +1,150 @@
+import asyncio
+import random
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import main
+from analytics import Analytics
+from storage import POSTED_TWEETS, SCHEDULED_TWEETS, create_storage
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def posted(tweet_id, at, status="posted", content="hello"):
+    return {"id": tweet_id, "content": content, "posted_at": at.isoformat(), "status": status}
+
+
+def scheduled(tweet_id, at, status):
+    return {"id": tweet_id, "content": "later", "scheduled_time": at.isoformat(), "status": status}
+
+
+def with_analytics(tmp_path, scenario):
+    async def wrapper():
+        storage = create_storage("sqlite", str(tmp_path))
+        await storage.open()
+        try:
+            return await scenario(storage, Analytics(storage))
+        finally:
+            await storage.close()
+    return run(wrapper())
+
+
+def expected_summary(tweets, since, until, interval):
+    """Count the tweets in ``[since, until)`` by brute force, widened to whole hours like Analytics"""
+    since = since.replace(minute=0, second=0, microsecond=0)
+    last = until - timedelta(microseconds=1)
+    last = last.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    series = Counter()
+    statuses = Counter()
+    hashtags = Counter()
+    for at, status, tags in tweets:
+        if since <= at < last:
+            statuses[status] += 1
+            series[at.strftime("%Y-%m-%dT%H") if interval == "hour" else at.strftime("%Y-%m-%d")] += 1
+            hashtags.update(tags)
+    return statuses, series, hashtags
+
+
+def test_rollups_match_brute_force_counts(tmp_path):
+    rng = random.Random(7)
+    tweets = []
+    for index in range(400):
+        at = START + timedelta(minutes=rng.randrange(10 * 24 * 60))
+        status = rng.choice(["posted", "posted_scheduled"])
+        tags = rng.sample(["ai", "python", "launch"], rng.randrange(3))
+        tweets.append((at, status, tags))
+    windows = [
+        (START, START + timedelta(days=10), "day"),
+        (START + timedelta(hours=5, minutes=30), START + timedelta(days=6, hours=17, minutes=1), "day"),
+        (START + timedelta(days=2, hours=3), START + timedelta(days=2, hours=9), "day"),
+        (START + timedelta(days=3, hours=22), START + timedelta(days=5, hours=2), "hour"),
+    ]
+
+    async def scenario(storage, analytics):
+        await storage.put_many(POSTED_TWEETS, {
+            f"t{index}": posted(f"t{index}", at, status, "tweet " + " ".join(f"#{tag}" for tag in tags))
+            for index, (at, status, tags) in enumerate(tweets)
+        })
+        await analytics.refresh()
+        return [analytics.summary(since, until, interval, top=3) for since, until, interval in windows]
+
+    for (since, until, interval), summary in zip(windows, with_analytics(tmp_path, scenario)):
+        statuses, series, hashtags = expected_summary(tweets, since, until, interval)
+        posts = summary["posts"]
+        assert posts["total"] == sum(statuses.values())
+        assert (posts["immediate"], posts["scheduled"]) == (statuses["posted"], statuses["posted_scheduled"])
+        buckets = {entry["bucket"][:13] if interval == "hour" else entry["bucket"]: entry["total"]
+                   for entry in posts["series"]}
+        assert {bucket: total for bucket, total in buckets.items() if total} == dict(series)
+        assert {entry["hashtag"]: entry["count"] for entry in summary["top_hashtags"]} == {
+            f"#{tag}": count for tag, count in hashtags.items()}
+
+
+def test_series_has_a_bucket_for_every_interval(tmp_path):
+    async def scenario(storage, analytics):
+        await analytics.refresh()
+        return (analytics.summary(START, START + timedelta(days=3), "day"),
+                analytics.summary(START, START + timedelta(hours=3), "hour"))
+
+    daily, hourly = with_analytics(tmp_path, scenario)
+    assert [entry["bucket"] for entry in daily["posts"]["series"]] == ["2024-03-01", "2024-03-02", "2024-03-03"]
+    assert [entry["bucket"] for entry in hourly["posts"]["series"]] == [
+        (START + timedelta(hours=n)).isoformat() for n in range(3)]
+    assert all(entry["total"] == 0 for entry in hourly["posts"]["series"])
+    assert daily["scheduled_tweets"]["failure_rate"] is None
+
+
+def test_edits_and_deletes_are_taken_back_out(tmp_path):
+    at = START + timedelta(hours=10)
+
+    async def scenario(storage, analytics):
+        await storage.put(POSTED_TWEETS, "a", posted("a", at, content="first #ai"))
+        await storage.put(POSTED_TWEETS, "b", posted("b", at))
+        await storage.put(SCHEDULED_TWEETS, "s1", scheduled("s1", at, "pending"))
+        await storage.put(SCHEDULED_TWEETS, "s2", scheduled("s2", at, "pending"))
+        await analytics.refresh()
+
+        await storage.update(POSTED_TWEETS, "a", {"content": "retagged #python",
+                                                   "posted_at": (at + timedelta(days=1)).isoformat()})
+        await storage.delete(POSTED_TWEETS, "b")
+        await storage.update(SCHEDULED_TWEETS, "s1", {"status": "posted"})
+        await storage.update(SCHEDULED_TWEETS, "s2", {"status": "failed"})
+        await analytics.refresh()
+        return (analytics.summary(START, START + timedelta(days=1)),
+                analytics.summary(START, START + timedelta(days=2)))
+
+    first_day, both_days = with_analytics(tmp_path, scenario)
+    assert first_day["posts"]["total"] == 0
+    assert first_day["top_hashtags"] == []
+    assert both_days["posts"]["total"] == 1
+    assert both_days["top_hashtags"] == [{"hashtag": "#python", "count": 1}]
+    assert first_day["scheduled_tweets"] == {"pending": 0, "posting": 0, "posted": 1, "failed": 1, "failure_rate": 0.5}
+
+
+def test_analytics_endpoint(client):
+    at = datetime(2001, 5, 4, 12, 30, tzinfo=timezone.utc)
+    client.portal.call(main.storage.put, POSTED_TWEETS, "analytics-old",
+                       posted("analytics-old", at, "posted_scheduled", "from long ago #retro"))
+
+    body = client.get("/analytics", params={"since": "2001-05-04T00:00:00Z", "until": "2001-05-05T00:00:00Z",
+                                             "interval": "hour"}).json()
+    assert body["posts"]["scheduled"] == body["posts"]["total"] == 1
+    assert len(body["posts"]["series"]) == 24
+    assert body["posts"]["series"][12]["scheduled"] == 1
+    assert body["top_hashtags"] == [{"hashtag": "#retro", "count": 1}]
+
+
+@pytest.mark.parametrize("params, status_code", [
+    ({"since": "2024-01-02T00:00:00Z", "until": "2024-01-01T00:00:00Z"}, 400),
+    ({"since": "2020-01-01T00:00:00Z", "until": "2024-01-01T00:00:00Z"}, 400),
+    ({"since": "yesterday"}, 400),
+    ({"interval": "week"}, 422),
+])
+def test_analytics_rejects_bad_windows(client, params, status_code):
+    assert client.get("/analytics", params=params).status_code == status_code
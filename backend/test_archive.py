@@ -0,0 +1,185 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from analytics import Analytics
+from archive import Archive, next_partition, page_with_archive
+from search import SearchIndex
+from storage import POSTED_TWEETS, create_storage
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+CUTOFF = datetime(2024, 4, 1, tzinfo=timezone.utc)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def posted(tweet_id, at, status="posted", content="hello"):
+    return {"id": tweet_id, "content": content, "posted_at": at.isoformat(), "status": status}
+
+
+def history(count=120, seed=3):
+    """Posted tweets spread over January to June 2024, some sharing a timestamp"""
+    rng = random.Random(seed)
+    tweets = {}
+    for index in range(count):
+        at = START + timedelta(hours=rng.randrange(180 * 24))
+        tweets[f"t{index:03d}"] = posted(f"t{index:03d}", at, rng.choice(["posted", "posted_scheduled"]),
+                                         f"tweet number {index} #n{index % 5}")
+    return tweets
+
+
+async def open_storage(path):
+    storage = create_storage("sqlite", str(path))
+    await storage.open()
+    return storage
+
+
+async def page_all(read, limit, **params):
+    records, cursor = [], None
+    while True:
+        page, cursor = await read(limit=limit, cursor=cursor, **params)
+        assert len(page) <= limit
+        records.extend(page)
+        if cursor is None:
+            return [record["id"] for record in records]
+
+
+def test_partitions():
+    assert next_partition("2024-12") == "2025-01"
+    assert next_partition("2024-02-29") == "2024-03-01"
+    archive = Archive("unused", POSTED_TWEETS, partition="day")
+    assert archive.partition_of("2024-02-29T10:00:00.000000+00:00") == "2024-02-29"
+    with pytest.raises(ValueError):
+        Archive("unused", POSTED_TWEETS, partition="week")
+
+
+@pytest.mark.parametrize("params", [
+    {"descending": True},
+    {"descending": False},
+    {"descending": True, "status": "posted_scheduled"},
+    {"descending": False, "since": "2024-02-10T00:00:00Z", "until": "2024-05-03T00:00:00Z"},
+    {"descending": True, "since": "2024-03-15T00:00:00Z"},
+])
+def test_paging_across_storage_and_archive_matches_unarchived_paging(tmp_path, params):
+    tweets = history()
+
+    async def scenario():
+        reference = await open_storage(tmp_path / "reference")
+        storage = await open_storage(tmp_path / "hot")
+        archive = Archive(str(tmp_path / "archive"), POSTED_TWEETS, cache_segments=1)
+        try:
+            await reference.put_many(POSTED_TWEETS, tweets)
+            await storage.put_many(POSTED_TWEETS, tweets)
+            moved = await archive.compact(storage, CUTOFF)
+
+            def read(**kwargs):
+                return page_with_archive(storage, archive, POSTED_TWEETS, **kwargs)
+
+            def read_reference(**kwargs):
+                return reference.page(POSTED_TWEETS, **kwargs)
+
+            return (moved, sorted(archive.segments()), len(await storage.all(POSTED_TWEETS)),
+                    await page_all(read, 7, **params), await page_all(read_reference, 7, **params))
+        finally:
+            await reference.close()
+            await storage.close()
+
+    moved, segments, kept, archived_ids, expected_ids = run(scenario())
+    # January to March are sealed; April onwards stays in storage
+    assert segments == ["2024-01", "2024-02", "2024-03"]
+    assert moved + kept == len(tweets)
+    assert 0 < moved < len(tweets)
+    assert archived_ids == expected_ids
+
+
+def test_records_in_both_places_are_listed_once_and_late_records_are_merged(tmp_path):
+    async def scenario():
+        storage = await open_storage(tmp_path)
+        archive = Archive(str(tmp_path / "archive"), POSTED_TWEETS)
+        try:
+            await storage.put(POSTED_TWEETS, "a", posted("a", START + timedelta(days=1)))
+            await storage.put(POSTED_TWEETS, "b", posted("b", START + timedelta(days=2)))
+            await archive.compact(storage, CUTOFF)
+            # As if a compaction was interrupted before deleting "a" from storage
+            await storage.put(POSTED_TWEETS, "a", posted("a", START + timedelta(days=1)))
+            listed, _ = await page_with_archive(storage, archive, POSTED_TWEETS)
+
+            await storage.put(POSTED_TWEETS, "late", posted("late", START + timedelta(days=3)))
+            assert await archive.compact(storage, CUTOFF) == 2
+            merged, _ = await page_with_archive(storage, archive, POSTED_TWEETS)
+            return ([r["id"] for r in listed], [r["id"] for r in merged], archive.segments()["2024-01"],
+                    await storage.all(POSTED_TWEETS))
+        finally:
+            await storage.close()
+
+    listed, merged, segment, stored = run(scenario())
+    assert listed == ["a", "b"]
+    assert merged == ["a", "b", "late"]
+    assert segment["count"] == 3
+    assert stored == {}
+
+
+def test_archive_get_and_other_workers_see_new_segments(tmp_path):
+    at = START + timedelta(days=5)
+
+    async def scenario():
+        storage = await open_storage(tmp_path)
+        writer = Archive(str(tmp_path / "archive"), POSTED_TWEETS)
+        reader = Archive(str(tmp_path / "archive"), POSTED_TWEETS)
+        try:
+            assert reader.segments() == {}
+            await storage.put(POSTED_TWEETS, "a", posted("a", at, content="kept"))
+            await writer.compact(storage, CUTOFF)
+            key = next(iter((await reader.rows())))[0]
+            return (await reader.get(key, "a"), await reader.get(key, "missing"),
+                    await reader.get("2023-01-01T00:00:00", "a"))
+        finally:
+            await storage.close()
+
+    found, missing, other_partition = run(scenario())
+    assert found["content"] == "kept"
+    assert missing is None and other_partition is None
+
+
+def test_views_keep_archived_tweets_without_holding_their_records(tmp_path):
+    tweets = history(40)
+
+    async def scenario():
+        storage = await open_storage(tmp_path)
+        archive = Archive(str(tmp_path / "archive"), POSTED_TWEETS)
+        archives = {POSTED_TWEETS: archive}
+        index, analytics = SearchIndex(storage, archives), Analytics(storage, archives)
+        try:
+            await storage.put_many(POSTED_TWEETS, tweets)
+            await index.refresh()
+            await analytics.refresh()
+            before = await index.search("tweet", limit=100), analytics.summary(START, START + timedelta(days=200))
+
+            moved = await archive.compact(storage, CUTOFF)
+            await index.refresh()
+            await analytics.refresh()
+            after = await index.search("tweet", limit=100), analytics.summary(START, START + timedelta(days=200))
+            held = [document[0] for document in index._documents.values()]
+
+            rebuilt = SearchIndex(storage, archives)
+            await rebuilt.refresh()
+            rebuilt_results = await rebuilt.search("tweet", limit=100)
+            rebuilt_held = [document[0] for document in rebuilt._documents.values()]
+            return (moved, before, after, held, len(analytics._contributions), rebuilt_results, rebuilt_held)
+        finally:
+            await storage.close()
+
+    moved, before, after, held, contributions, rebuilt_results, rebuilt_held = run(scenario())
+    assert moved > 0
+    # Archiving changes nothing a query sees...
+    assert after == before
+    assert rebuilt_results == before[0]
+    # ...but only records still in storage are kept in memory
+    kept = len(tweets) - moved
+    assert sum(record is not None for record in held) == kept
+    assert sum(record is not None for record in rebuilt_held) == kept
+    assert contributions == kept
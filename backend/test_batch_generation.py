@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+
+
+class FakeOpenRouter:
+    """Answers chat completions with numbered tweets and records every call"""
+
+    def __init__(self, honours_n=True, delay=0.0):
+        self.honours_n = honours_n
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request):
+        payload = json.loads(request.content)
+        self.calls.append(payload)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        n = payload.get("n", 1) if self.honours_n else 1
+        choices = [{"message": {"content": f'"Tweet {len(self.calls)}.{i} #test"'}} for i in range(n)]
+        return httpx.Response(200, json={"choices": choices})
+
+
+@pytest.fixture
+def openrouter(monkeypatch):
+    def install(**kwargs):
+        fake = FakeOpenRouter(**kwargs)
+        monkeypatch.setattr(main, "openrouter_client", httpx.AsyncClient(
+            base_url="http://openrouter.test", transport=httpx.MockTransport(fake)))
+        return fake
+    return install
+
+
+def test_variants_come_from_one_call_when_the_model_supports_n(client, openrouter, monkeypatch):
+    monkeypatch.setattr(main, "OPENROUTER_SUPPORTS_N", True)
+    fake = openrouter()
+
+    response = client.post("/generate-tweets/batch", json={"items": [{"topic": "a"}, {"topic": "b"}], "n": 3})
+    body = response.json()
+
+    assert response.status_code == 200
+    assert body["succeeded"] == 2 and body["success"] is True
+    assert len(fake.calls) == 2
+    assert all(call["n"] == 3 for call in fake.calls)
+    for result in body["results"]:
+        assert len(result["variants"]) == 3
+        assert all(variant["hashtags"] == ["#test"] for variant in result["variants"])
+
+
+def test_models_that_ignore_n_are_topped_up_with_single_calls(client, openrouter, monkeypatch):
+    monkeypatch.setattr(main, "OPENROUTER_SUPPORTS_N", True)
+    fake = openrouter(honours_n=False)
+
+    body = client.post("/generate-tweets/batch", json={"items": [{"topic": "a"}], "n": 3}).json()
+
+    assert len(body["results"][0]["variants"]) == 3
+    assert [call.get("n") for call in fake.calls] == [3, None, None]
+
+
+def test_failing_item_is_reported_in_place(client, openrouter):
+    openrouter()
+
+    body = client.post("/generate-tweets/batch", json={"items": [{"topic": "a"}, {"topic": "  "}]}).json()
+
+    assert body["success"] is False
+    assert (body["succeeded"], body["failed"]) == (1, 1)
+    bad = body["results"][1]
+    assert bad["index"] == 1 and bad["success"] is False
+    assert bad["status_code"] == 400 and bad["error"] == "Topic cannot be empty"
+
+
+def test_upstream_calls_are_bounded(client, openrouter, monkeypatch):
+    monkeypatch.setattr(main, "GENERATION_BATCH_CONCURRENCY", 2)
+    fake = openrouter(delay=0.02)
+
+    body = client.post("/generate-tweets/batch", json={"items": [{"topic": str(i)} for i in range(6)]}).json()
+
+    assert body["succeeded"] == 6
+    assert fake.max_in_flight == 2
@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+from storage import POSTED_TWEETS
+
+
+@pytest.fixture
+def twitter(route_twitter_clone):
+    """Twitter clone whose behaviour is chosen by the tweet text"""
+    state = {"in_flight": 0, "max_in_flight": 0, "sent_at": []}
+
+    async def handler(request):
+        text = json.loads(request.content)["text"]
+        state["sent_at"].append(asyncio.get_running_loop().time())
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            state["in_flight"] -= 1
+        if text == "rejected":
+            return httpx.Response(403, text="suspended")
+        if text == "slow":
+            raise httpx.ReadTimeout("slow", request=request)
+        if text == "broken":
+            raise ValueError("malformed upstream response")
+        return httpx.Response(201, json={"success": True})
+
+    route_twitter_clone(handler)
+    return state
+
+
+def post_batch(client, texts, **options):
+    return client.post("/post-tweets/batch", json={"items": [{"content": text} for text in texts], **options})
+
+
+def test_one_bad_item_does_not_fail_the_others(client, twitter):
+    response = post_batch(client, ["first", "broken", "rejected", "slow", "last"])
+    assert response.status_code == 200
+    body = response.json()
+
+    assert (body["success"], body["succeeded"], body["failed"]) == (False, 2, 3)
+    results = body["results"]
+    assert [result["success"] for result in results] == [True, False, False, False, True]
+    assert results[1] == {"index": 1, "account_id": "default", "success": False, "status_code": 500,
+                          "error": "Unexpected error: malformed upstream response"}
+    assert results[2]["status_code"] == 403
+    assert results[3]["status_code"] == 408
+
+    for result in (results[0], results[4]):
+        posted = client.portal.call(main.storage.get, POSTED_TWEETS, result["posted_id"])
+        assert posted["status"] == "posted"
+
+
+def test_sends_are_bounded_and_paced(client, twitter):
+    body = post_batch(client, [f"tweet {i}" for i in range(6)], concurrency=2).json()
+    assert body["succeeded"] == 6
+    assert twitter["max_in_flight"] == 2
+
+    twitter["sent_at"].clear()
+    post_batch(client, ["a", "b", "c"], interval=0.05)
+    gaps = [later - earlier for earlier, later in zip(twitter["sent_at"], twitter["sent_at"][1:])]
+    assert all(gap >= 0.045 for gap in gaps)
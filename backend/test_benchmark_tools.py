@@ -0,0 +1,53 @@
+import httpx
+import pytest
+
+import main
+from benchmarks.fake_upstreams import FaultInjector, make_openrouter_app
+from benchmarks.stats import percentile, summarize
+
+
+def test_percentiles_and_summary():
+    samples = [i / 1000 for i in range(1, 101)]
+    assert (percentile(samples, 50), percentile(samples, 99), percentile(samples, 100)) == (0.051, 0.099, 0.1)
+
+    summary = summarize(samples, elapsed=2.0, requests=100, errors=3)
+    assert summary["throughput_rps"] == 50.0 and summary["goodput_rps"] == 48.5
+    assert (summary["p50_ms"], summary["p95_ms"]) == (51.0, 95.0)
+    assert summarize([], elapsed=0, requests=0) == {"requests": 0, "errors": 0, "elapsed_s": 0,
+                                                     "throughput_rps": None, "goodput_rps": None}
+
+
+def test_fault_injection_is_reproducible():
+    def statuses(seed):
+        faults = FaultInjector(error_rate=0.2, rate_limit_rate=0.1, retry_after=2, seed=seed)
+        return [getattr(faults.response(), "status_code", 200) for _ in range(200)]
+
+    first = statuses(7)
+    assert first == statuses(7)
+    assert 30 < first.count(500) < 55 and 10 < first.count(429) < 35
+
+    limited = FaultInjector(rate_limit_rate=1.0, retry_after=2).response()
+    assert limited.headers["retry-after"] == "2"
+
+
+@pytest.fixture
+def fake_openrouter(monkeypatch):
+    app = make_openrouter_app(chunk_delay=0)
+    monkeypatch.setattr(main, "openrouter_client", httpx.AsyncClient(
+        base_url="http://openrouter.test/api/v1", transport=httpx.ASGITransport(app=app)))
+    return app
+
+
+def test_fake_openrouter_serves_the_app(client, fake_openrouter, monkeypatch):
+    monkeypatch.setattr(main, "OPENROUTER_SUPPORTS_N", True)
+
+    single = client.post("/generate-tweet", json={"topic": "load tests", "no_cache": True}).json()
+    assert single["content"].startswith("Benchmarking load tests")
+    assert single["hashtags"] == ["#bench", "#perf"]
+
+    batch = client.post("/generate-tweets/batch", json={"items": [{"topic": "a"}], "n": 3}).json()
+    assert len(batch["results"][0]["variants"]) == 3
+
+    streamed = client.post("/generate-tweet/stream", json={"topic": "load tests"})
+    assert "event: done" in streamed.text
+    assert fake_openrouter.state.calls == 3
@@ -0,0 +1,139 @@
+import asyncio
+
+import httpx
+import pytest
+
+import cache
+import main
+from cache import SingleFlightCache, TTLCache
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+def test_ttl_cache_expires_entries(clock):
+    entries = TTLCache(max_size=10, ttl=5)
+    entries.set("a", 1)
+    clock.now += 4.9
+    assert entries.get("a") == 1
+    clock.now += 0.1
+    assert entries.get("a") is None
+    assert len(entries) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    entries = TTLCache(max_size=2, ttl=60)
+    entries.set("a", 1)
+    entries.set("b", 2)
+    entries.get("a")
+    entries.set("c", 3)
+    assert entries.get("b") is None
+    assert (entries.get("a"), entries.get("c")) == (1, 3)
+
+
+def test_concurrent_callers_share_one_computation():
+    async def scenario():
+        flights = SingleFlightCache(max_size=10, ttl=60)
+        calls = []
+        release = asyncio.Event()
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return "value"
+
+        waiters = [asyncio.create_task(flights.get_or_compute("key", compute)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        later = await flights.get_or_compute("key", compute)
+        return calls, results, later
+
+    calls, results, later = run(scenario())
+    assert len(calls) == 1
+    assert sorted(outcome for _, outcome in results) == ["coalesced"] * 4 + ["miss"]
+    assert all(value == "value" for value, _ in results)
+    assert later == ("value", "hit")
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    async def scenario():
+        flights = SingleFlightCache(max_size=10, ttl=60)
+        attempts = []
+
+        async def failing():
+            attempts.append(1)
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(
+            *(flights.get_or_compute("key", failing) for _ in range(3)), return_exceptions=True)
+
+        async def succeeding():
+            return "recovered"
+
+        return attempts, results, await flights.get_or_compute("key", succeeding)
+
+    attempts, results, retry = run(scenario())
+    assert len(attempts) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retry == ("recovered", "miss")
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_computation():
+    async def scenario():
+        flights = SingleFlightCache(max_size=10, ttl=60)
+
+        async def compute():
+            await asyncio.sleep(0.02)
+            return "value"
+
+        first = asyncio.create_task(flights.get_or_compute("key", compute))
+        second = asyncio.create_task(flights.get_or_compute("key", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert run(scenario()) == ("value", "coalesced")
+
+
+def test_identical_generations_hit_the_upstream_once(client, monkeypatch):
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "Cached tweet #cache"}}]})
+
+    monkeypatch.setattr(main, "GENERATION_CACHE_ENABLED", True)
+    monkeypatch.setattr(main, "generation_cache", SingleFlightCache(10, 60))
+    monkeypatch.setattr(main, "openrouter_client", httpx.AsyncClient(
+        base_url="http://openrouter.test", transport=httpx.MockTransport(handler)))
+
+    async def generate_concurrently():
+        requests = [main.GenerateTweetRequest(topic=topic) for topic in ("Caching", " caching ", "CACHING")]
+        return await asyncio.gather(*(main.generate_tweet(request) for request in requests))
+
+    responses = client.portal.call(generate_concurrently)
+    assert [response.content for response in responses] == ["Cached tweet #cache"] * 3
+    assert len(calls) == 1
+
+    bypass = client.post("/generate-tweet", json={"topic": "caching", "no_cache": True})
+    assert bypass.status_code == 200
+    assert len(calls) == 2
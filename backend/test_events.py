@@ -0,0 +1,154 @@
+import asyncio
+import json
+
+import main
+from events import EventHub, event_type
+from storage import DRAFTS, POSTED_TWEETS, SCHEDULED_TWEETS, create_storage
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def draft(draft_id, content="hello", created_at="2024-01-01T00:00:00+00:00", updated_at=None):
+    return {"id": draft_id, "content": content, "created_at": created_at, "updated_at": updated_at or created_at}
+
+
+def test_event_types():
+    assert event_type(DRAFTS, "put", draft("a")) == "draft.created"
+    assert event_type(DRAFTS, "put", draft("a", updated_at="2024-01-02T00:00:00+00:00")) == "draft.updated"
+    assert event_type(DRAFTS, "delete", None) == "draft.deleted"
+    assert event_type(SCHEDULED_TWEETS, "put", {"status": "posting"}) == "scheduled_tweet.posting"
+    assert event_type(POSTED_TWEETS, "put", {"status": "posted"}) == "tweet.posted"
+    assert event_type(POSTED_TWEETS, "replace", None) == "tweet.reset"
+    # Archiving isn't news to clients, and neither is a put whose record is gone
+    assert event_type(POSTED_TWEETS, "archive", None) is None
+    assert event_type(DRAFTS, "put", None) is None
+    assert event_type("leases", "put", {}) is None
+
+
+def with_hub(tmp_path, scenario, **options):
+    async def wrapper():
+        storage = create_storage("sqlite", str(tmp_path))
+        await storage.open()
+        hub = EventHub(storage, **options)
+        await hub.start()
+        try:
+            return await scenario(storage, hub)
+        finally:
+            await hub.stop()
+            await storage.close()
+    return run(wrapper())
+
+
+async def take(stream, count, timeout=2.0):
+    async def collect():
+        return [await stream.__anext__() for _ in range(count)]
+    return await asyncio.wait_for(collect(), timeout)
+
+
+def test_subscribers_get_new_events_as_they_happen(tmp_path):
+    async def scenario(storage, hub):
+        await storage.put(DRAFTS, "before", draft("before"))
+        stream = hub.subscribe()
+        first = asyncio.ensure_future(take(stream, 3))
+        await asyncio.sleep(0.01)
+        await storage.put(DRAFTS, "a", draft("a"))
+        await storage.update(DRAFTS, "a", {"updated_at": "2024-01-02T00:00:00+00:00"})
+        await storage.delete(DRAFTS, "a")
+        events = await first
+        await stream.aclose()
+        return events, len(hub)
+
+    events, connections = with_hub(tmp_path, scenario)
+    assert [(event["type"], event["record_id"]) for event in events] == [
+        ("draft.created", "a"), ("draft.updated", "a"), ("draft.deleted", "a")]
+    assert [event["id"] for event in events] == [2, 3, 4]
+    assert events[0]["record"]["content"] == "hello"
+    assert connections == 0
+
+
+def test_resuming_replays_from_the_buffer_and_then_the_change_log(tmp_path):
+    async def scenario(storage, hub):
+        for index in range(6):
+            await storage.put(DRAFTS, f"d{index}", draft(f"d{index}"))
+        # The buffer holds the last three events; older ones come from the change log
+        from_buffer = await take(hub.subscribe(3), 3)
+        from_log = await take(hub.subscribe(0), 6)
+        return from_buffer, from_log
+
+    from_buffer, from_log = with_hub(tmp_path, scenario, buffer_size=3)
+    assert [event["id"] for event in from_buffer] == [4, 5, 6]
+    assert [event["id"] for event in from_log] == [1, 2, 3, 4, 5, 6]
+
+
+def test_clients_behind_the_change_log_are_reset(tmp_path):
+    async def scenario(storage, hub):
+        storage.change_log_size = 2
+        storage.PRUNE_EVERY = 1
+        for index in range(6):
+            await storage.put(DRAFTS, f"d{index}", draft(f"d{index}"))
+        return await take(hub.subscribe(1), 1)
+
+    [event] = with_hub(tmp_path, scenario, buffer_size=2)
+    assert event == {"id": 6, "type": "reset"}
+
+
+def test_writes_by_other_workers_are_polled_while_clients_are_connected(tmp_path):
+    async def scenario(storage, hub):
+        stream = hub.subscribe(heartbeat=5)
+        waiting = asyncio.ensure_future(take(stream, 1))
+        other_worker = create_storage("sqlite", str(tmp_path))
+        await other_worker.open()
+        try:
+            await other_worker.put(SCHEDULED_TWEETS, "s", {"id": "s", "scheduled_time": "2030-01-01T00:00:00Z",
+                                                          "status": "pending"})
+        finally:
+            await other_worker.close()
+        [event] = await waiting
+        await stream.aclose()
+        return event
+
+    event = with_hub(tmp_path, scenario, poll_interval=0.05)
+    assert (event["type"], event["record_id"]) == ("scheduled_tweet.pending", "s")
+
+
+def test_idle_subscribers_get_heartbeats(tmp_path):
+    async def scenario(storage, hub):
+        stream = hub.subscribe(heartbeat=0.05)
+        events = await take(stream, 2)
+        await stream.aclose()
+        return events
+
+    assert with_hub(tmp_path, scenario) == [None, None]
+
+
+def test_websocket_pushes_events_and_resumes(client):
+    with client.websocket_connect("/ws/events") as websocket:
+        draft_id = client.post("/save-draft", json={"content": "pushed over ws"}).json()["draft_id"]
+        event = json.loads(websocket.receive_text())
+    assert (event["type"], event["record_id"]) == ("draft.created", draft_id)
+    assert event["record"]["content"] == "pushed over ws"
+
+    client.delete(f"/drafts/{draft_id}")
+    with client.websocket_connect(f"/ws/events?last_event_id={event['id']}") as websocket:
+        missed = json.loads(websocket.receive_text())
+    assert (missed["type"], missed["record_id"]) == ("draft.deleted", draft_id)
+
+
+def test_sse_stream_resumes_from_last_event_id(client):
+    draft_id = client.post("/save-draft", json={"content": "pushed over sse"}).json()["draft_id"]
+    version = client.portal.call(main.storage.current_version)
+
+    async def first_chunk():
+        response = await main.events_sse(last_event_id=version - 1, last_event_id_header=None)
+        try:
+            return response.media_type, await asyncio.wait_for(response.body_iterator.__anext__(), 2)
+        finally:
+            await response.body_iterator.aclose()
+
+    media_type, chunk = client.portal.call(first_chunk)
+    assert media_type == "text/event-stream"
+    lines = chunk.strip().split("\n")
+    assert lines[:2] == [f"id: {version}", "event: draft.created"]
+    assert json.loads(lines[2][len("data: "):])["record_id"] == draft_id
@@ -0,0 +1,33 @@
+import pytest
+
+import main
+from benchmarks.fake_upstreams import free_port, make_twitter_clone_app, run_in_thread, stop_server
+
+
+@pytest.fixture
+def twitter_clone(monkeypatch):
+    app = make_twitter_clone_app()
+    port = free_port()
+    server = run_in_thread(app, port)
+    monkeypatch.setitem(main.accounts.default, "url", f"http://127.0.0.1:{port}/post_tweet")
+    yield app
+    stop_server(server)
+
+
+def test_posts_reuse_one_pooled_connection(client, twitter_clone):
+    shared = client.portal.call(main.accounts.lane, None).client
+    for text in ("first", "second", "third"):
+        response = client.post("/post-tweet", json={"content": text})
+        assert response.status_code == 200
+
+    assert client.portal.call(main.accounts.lane, None).client is shared
+    assert [body["text"] for _, body in twitter_clone.state.received] == ["first", "second", "third"]
+    # Every post arrived from the same client port, i.e. over one kept-alive connection
+    assert len(set(twitter_clone.state.peers)) == 1
+
+
+def test_clients_are_configured_from_settings():
+    client = main.create_http_client(12.5, base_url="http://upstream.test")
+    assert client.timeout.read == 12.5
+    assert client.timeout.connect == main.HTTP_CONNECT_TIMEOUT
+    assert str(client.base_url) == "http://upstream.test"
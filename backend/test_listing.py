@@ -0,0 +1,96 @@
+def page_through(client, path, key, limit, **params):
+    items, cursor = [], None
+    while True:
+        query = dict(params, limit=limit, **({"cursor": cursor} if cursor else {}))
+        body = client.get(path, params=query).json()
+        assert len(body[key]) <= limit
+        items.extend(body[key])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return items
+
+
+def test_pages_add_up_to_the_unpaged_listing(client):
+    for i in range(5):
+        assert client.post("/save-draft", json={"content": f"draft {i}"}).status_code == 200
+
+    everything = client.get("/drafts").json()
+    assert everything["next_cursor"] is None
+    updated = [draft["updated_at"] for draft in everything["drafts"]]
+    assert updated == sorted(updated, reverse=True)
+
+    paged = page_through(client, "/drafts", "drafts", 2)
+    assert [draft["id"] for draft in paged] == [draft["id"] for draft in everything["drafts"]]
+
+
+def test_status_filter(client):
+    scheduled = client.get("/scheduled-tweets", params={"status": "no-such-status"}).json()
+    assert scheduled == {"scheduled_tweets": [], "next_cursor": None}
+
+
+def test_bad_paging_parameters_are_rejected(client):
+    assert client.get("/drafts", params={"cursor": "garbage", "limit": 2}).status_code == 400
+    assert client.get("/drafts", params={"since": "yesterday"}).status_code == 400
+    assert client.get("/posted-tweets", params={"limit": 0}).status_code == 422
+
+
+def test_conditional_get(client):
+    first = client.get("/drafts")
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+
+    assert client.get("/drafts", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/drafts", headers={"If-Modified-Since": last_modified}).status_code == 304
+    # Writes to other collections don't invalidate the drafts listing
+    client.post("/schedule-tweet", json={"content": "later", "scheduled_time": "2099-01-01T00:00:00Z"})
+    assert client.get("/drafts", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/save-draft", json={"content": "changes the etag"})
+    refreshed = client.get("/drafts", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["etag"] != etag
+
+
+def test_changes_feed(client):
+    version = client.get("/changes").json()["version"]
+    draft_id = client.post("/save-draft", json={"content": "watched"}).json()["draft_id"]
+    client.delete(f"/drafts/{draft_id}")
+
+    feed = client.get("/changes", params={"since": version}).json()
+    assert [(c["op"], c["id"]) for c in feed["changes"]] == [("put", draft_id), ("delete", draft_id)]
+    assert feed["version"] == version + 2
+
+
+def test_list_payloads_are_cached_until_the_collection_changes(client, monkeypatch):
+    import main
+    reads = []
+    page = main.storage.page
+
+    async def counting_page(collection, **kwargs):
+        reads.append(collection)
+        return await page(collection, **kwargs)
+
+    monkeypatch.setattr(main.storage, "page", counting_page)
+    client.post("/save-draft", json={"content": "cached listing"})
+
+    first = client.get("/drafts", params={"limit": 3})
+    again = client.get("/drafts", params={"limit": 3})
+    assert reads == ["drafts"]
+    assert again.content == first.content
+    assert again.headers["etag"] == first.headers["etag"]
+    assert again.headers["content-type"] == "application/json"
+
+    # A different query is a different page
+    client.get("/drafts", params={"limit": 4})
+    assert reads == ["drafts", "drafts"]
+
+    client.post("/save-draft", json={"content": "invalidates the listing"})
+    fresh = client.get("/drafts", params={"limit": 3})
+    assert len(reads) == 3
+    assert fresh.json()["drafts"][0]["content"] == "invalidates the listing"
+
+
+def test_list_cache_can_be_disabled(client, monkeypatch):
+    import main
+    monkeypatch.setattr(main, "LIST_CACHE_SIZE", 0)
+    client.post("/save-draft", json={"content": "uncached listing"})
+    assert client.get("/drafts", params={"limit": 1}).json()["drafts"][0]["content"] == "uncached listing"
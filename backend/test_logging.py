@@ -0,0 +1,62 @@
+import json
+import logging
+
+import pytest
+
+import main
+from logging_setup import RedactingFilter, StructuredFormatter
+
+
+def make_record(msg, *args, **extra):
+    record = logging.LogRecord("api", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_redaction_masks_known_secrets_and_credential_patterns():
+    redactor = RedactingFilter(secrets=["twitter-secret-key", None, "short"])
+    record = make_record("calling %s with %s", "sk-or-v1-abc123", "Bearer tok.en",
+                         headers="{'api-key': 'twitter-secret-key'}", body='{"Authorization": "xyz"}')
+
+    assert redactor.filter(record) is True
+    assert record.getMessage() == "calling sk-or-v1-[REDACTED] with Bearer [REDACTED]"
+    assert "twitter-secret-key" not in record.headers
+    assert record.body == '{"Authorization": "[REDACTED]"}'
+
+
+def test_json_lines_carry_extra_fields():
+    line = StructuredFormatter(json_output=True).format(make_record("posted", scheduled_id="s1", attempt=2))
+    fields = json.loads(line)
+    assert (fields["level"], fields["logger"], fields["msg"]) == ("INFO", "api", "posted")
+    assert (fields["scheduled_id"], fields["attempt"]) == ("s1", 2)
+
+
+def test_text_lines_append_extra_fields():
+    line = StructuredFormatter().format(make_record("posted", scheduled_id="s1"))
+    assert line.endswith("INFO    api: posted | scheduled_id='s1'")
+
+
+@pytest.fixture
+def api_logger_level():
+    level = logging.getLogger("api").level
+    yield
+    logging.getLogger("api").setLevel(level)
+
+
+def test_admin_endpoints_are_disabled_without_a_key(client, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_API_KEY", None)
+    assert client.get("/admin/log-level").status_code == 403
+    response = client.put("/admin/log-level", json={"level": "DEBUG"}, headers={"admin-api-key": ""})
+    assert response.status_code == 403
+
+
+def test_admin_endpoints_require_the_key(client, monkeypatch, api_logger_level):
+    monkeypatch.setattr(main, "ADMIN_API_KEY", "admin-secret")
+    assert client.get("/admin/log-level").status_code == 401
+    assert client.get("/admin/log-level", headers={"admin-api-key": "wrong"}).status_code == 401
+
+    headers = {"admin-api-key": "admin-secret"}
+    response = client.put("/admin/log-level", json={"level": "debug", "logger": "api"}, headers=headers)
+    assert response.json() == {"logger": "api", "level": "DEBUG"}
+    assert client.get("/admin/log-level", headers=headers).json()["levels"]["api"] == "DEBUG"
+    assert client.put("/admin/log-level", json={"level": "LOUD"}, headers=headers).status_code == 400
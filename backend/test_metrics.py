@@ -0,0 +1,82 @@
+import math
+import re
+
+import metrics
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse(text):
+    """Group an exposition into ``{family: (type, [(name, labels, value), ...])}``, checking its syntax"""
+    assert text.endswith("\n")
+    families, family, helped = {}, None, set()
+    for line in text.rstrip("\n").split("\n"):
+        if line.startswith("# HELP "):
+            helped.add(line.split(" ")[2])
+        elif line.startswith("# TYPE "):
+            _, _, family, kind = line.split(" ")
+            assert family in helped, f"TYPE before HELP for {family}"
+            assert family not in families, f"{family} declared twice"
+            families[family] = (kind, [])
+        else:
+            match = SAMPLE.match(line)
+            assert match, f"malformed sample line: {line!r}"
+            name, labels, value = match.groups()
+            kind, samples = families[family]
+            if kind == "counter":
+                assert name == family
+            elif kind == "histogram":
+                assert name in (f"{family}_bucket", f"{family}_count", f"{family}_sum")
+            else:
+                assert name == family
+            samples.append((name, dict(LABEL.findall(labels or "")), float(value)))
+    return families
+
+
+def test_metrics_endpoint_serves_valid_exposition(client):
+    client.get("/drafts")
+    client.get("/drafts/not-a-draft")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    families = parse(response.text)
+
+    kind, samples = families["http_responses_total"]
+    assert kind == "counter"
+    assert any(labels == {"method": "GET", "route": "/drafts", "status": "200"} for _, labels, _ in samples)
+
+    kind, samples = families["http_request_duration_seconds"]
+    assert kind == "histogram"
+    routes = {labels["route"] for _, labels, _ in samples}
+    # Routes are labelled by template, never by raw path
+    assert "/drafts" in routes and "/drafts/not-a-draft" not in routes
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_exposition_seconds", "Test histogram", ["op"], buckets=(0.1, 1.0))
+    try:
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, op="read")
+        kind, samples = parse(histogram.render() + "\n")["test_exposition_seconds"]
+    finally:
+        metrics.REGISTRY.remove(histogram)
+
+    buckets = [(labels["le"], value) for name, labels, value in samples if name.endswith("_bucket")]
+    assert buckets == [("0.1", 1), ("1", 3), ("+Inf", 4)]
+    count = next(value for name, _, value in samples if name.endswith("_count"))
+    total = next(value for name, _, value in samples if name.endswith("_sum"))
+    assert count == 4 and math.isclose(total, 6.05)
+
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("test_escaping", 'Counter with "quoted" labels', ["path"])
+    try:
+        counter.inc(path='C:\\dir\n"x"')
+        kind, samples = parse(counter.render() + "\n")["test_escaping_total"]
+    finally:
+        metrics.REGISTRY.remove(counter)
+
+    assert kind == "counter"
+    assert samples == [("test_escaping_total", {"path": 'C:\\\\dir\\n\\"x\\"'}, 1.0)]
@@ -0,0 +1,14 @@
+import pytest
+
+from benchmarks.check_multi_worker import run_check
+
+
+@pytest.mark.slow
+def test_scheduled_tweets_survive_killed_scheduler_workers():
+    result = run_check(workers=3, tweets=20, lease_ttl=2.0, post_latency=0.5)
+
+    assert result["error"] is None
+    assert result["duplicates"] == {}
+    assert result["missing"] == []
+    assert result["stuck"] == []
+    assert result["posted"] + len(result["interrupted"]) >= result["expected"]
@@ -0,0 +1,318 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from accounts import AccountLane
+from outbox import Outbox, PermanentError, RetryableError, job_id_for_key
+from storage import POST_JOBS, POSTED_TWEETS, create_storage
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class Deliveries:
+    """A deliver callback that plays back a script of outcomes per job"""
+
+    def __init__(self, script=None, delay=0.0):
+        self.script = script or {}
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.most_active = 0
+
+    async def __call__(self, job):
+        self.calls.append(job["id"])
+        self.active += 1
+        self.most_active = max(self.most_active, self.active)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            outcomes = self.script.get(job["id"], [])
+            outcome = outcomes.pop(0) if outcomes else None
+            if isinstance(outcome, Exception):
+                raise outcome
+            return {"posted_id": job["id"], "last_status_code": 201}
+        finally:
+            self.active -= 1
+
+
+async def settle(storage, job_ids, timeout=5.0):
+    """Wait until every job has reached delivered or failed"""
+    async def finished():
+        while True:
+            jobs = [await storage.get(POST_JOBS, job_id) for job_id in job_ids]
+            if all(job["status"] in ("delivered", "failed") for job in jobs):
+                return {job["id"]: job for job in jobs}
+            await asyncio.sleep(0.01)
+    return await asyncio.wait_for(finished(), timeout)
+
+
+def outbox_scenario(tmp_path, deliver, scenario, **options):
+    async def wrapper():
+        storage = create_storage("sqlite", str(tmp_path))
+        await storage.open()
+        options.setdefault("base_delay", 0.01)
+        options.setdefault("max_delay", 0.02)
+        outbox = Outbox(storage, deliver, **options)
+        try:
+            return await scenario(storage, outbox)
+        finally:
+            await outbox.stop(timeout=1)
+            await storage.close()
+    return run(wrapper())
+
+
+def test_enqueue_is_idempotent(tmp_path):
+    async def scenario(storage, outbox):
+        job_id = job_id_for_key("key-1")
+        job, created = await outbox.enqueue(job_id, "hello", "key-1")
+        again, created_again = await outbox.enqueue(job_id, "hello", "key-1")
+        return created, created_again, job, again
+
+    created, created_again, job, again = outbox_scenario(tmp_path, Deliveries(), scenario)
+    assert (created, created_again) == (True, False)
+    assert again == job
+    assert job_id_for_key("key-1") == job["id"] != job_id_for_key("key-2")
+
+
+def test_retryable_failures_are_retried_until_delivered(tmp_path):
+    deliver = Deliveries({"flaky": [RetryableError("busy", 503), RetryableError("slow down", 429)]})
+
+    async def scenario(storage, outbox):
+        await outbox.enqueue("flaky", "hello")
+        outbox.start()
+        return await settle(storage, ["flaky"])
+
+    job = outbox_scenario(tmp_path, deliver, scenario)["flaky"]
+    assert job["status"] == "delivered"
+    assert job["attempts"] == 3
+    assert job["posted_id"] == "flaky"
+    assert deliver.calls == ["flaky"] * 3
+
+
+def test_attempts_run_out_and_permanent_failures_are_not_retried(tmp_path):
+    deliver = Deliveries({
+        "exhausted": [RetryableError("busy", 503)] * 5,
+        "rejected": [PermanentError("bad tweet", 400)],
+        "broken": [ValueError("boom")],
+    })
+
+    async def scenario(storage, outbox):
+        for job_id in ("exhausted", "rejected", "broken"):
+            await outbox.enqueue(job_id, "hello")
+        outbox.start()
+        return await settle(storage, ["exhausted", "rejected", "broken"])
+
+    jobs = outbox_scenario(tmp_path, deliver, scenario, max_attempts=3)
+    assert {job_id: (job["status"], job["attempts"]) for job_id, job in jobs.items()} == {
+        "exhausted": ("failed", 3), "rejected": ("failed", 1), "broken": ("failed", 1)}
+    assert jobs["rejected"]["last_status_code"] == 400
+    assert jobs["broken"]["last_error"] == "Unexpected error: boom"
+
+
+def test_backlog_is_delivered_within_the_concurrency_limit(tmp_path):
+    deliver = Deliveries(delay=0.02)
+    job_ids = [f"job-{index:02d}" for index in range(30)]
+
+    async def scenario(storage, outbox):
+        for job_id in job_ids:
+            await outbox.enqueue(job_id, "hello")
+        outbox.start()
+        return await settle(storage, job_ids)
+
+    jobs = outbox_scenario(tmp_path, deliver, scenario, concurrency=4)
+    assert all(job["status"] == "delivered" for job in jobs.values())
+    assert sorted(deliver.calls) == job_ids
+    assert deliver.most_active == 4
+
+
+def test_jobs_interrupted_mid_delivery_are_failed_not_resent(tmp_path):
+    deliver = Deliveries()
+
+    async def scenario(storage, outbox):
+        await outbox.enqueue("interrupted", "hello")
+        await storage.update(POST_JOBS, "interrupted", {"status": "sending"})
+        outbox.start()
+        return await settle(storage, ["interrupted"])
+
+    job = outbox_scenario(tmp_path, deliver, scenario)["interrupted"]
+    assert job["status"] == "failed"
+    assert deliver.calls == []
+
+
+def test_stop_cancels_deliveries_that_outlast_the_timeout(tmp_path):
+    deliver = Deliveries(delay=60)
+
+    async def scenario(storage, outbox):
+        await outbox.enqueue("stuck", "hello")
+        outbox.start()
+        while not deliver.calls:
+            await asyncio.sleep(0.01)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await outbox.stop(timeout=0.1)
+        return loop.time() - started, await storage.get(POST_JOBS, "stuck")
+
+    took, job = outbox_scenario(tmp_path, deliver, scenario)
+    assert took < 1
+    # Left for the next leader to fail, since it may have been posted
+    assert job["status"] == "sending"
+
+
+def lane(account_id, max_connections=10, rate_limit=0.0):
+    account = {"id": account_id, "max_connections": max_connections, "rate_limit": rate_limit, "rate_burst": 1}
+    return AccountLane(account, httpx.AsyncClient())
+
+
+class LaneDeliveries:
+    """A deliver callback taking a per-account time, recording when each job started"""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.started = []
+        self.active = {}
+        self.most_active = {}
+
+    async def __call__(self, job):
+        account_id = job["account_id"]
+        self.started.append((account_id, job["id"], asyncio.get_running_loop().time()))
+        self.active[account_id] = self.active.get(account_id, 0) + 1
+        self.most_active[account_id] = max(self.most_active.get(account_id, 0), self.active[account_id])
+        try:
+            await asyncio.sleep(self.delays.get(account_id, 0))
+            return {"posted_id": job["id"], "last_status_code": 201}
+        finally:
+            self.active[account_id] -= 1
+
+
+def test_busy_lane_does_not_hold_up_other_lanes(tmp_path):
+    deliver = LaneDeliveries({"slow": 0.2, "fast": 0.01})
+    slow, fast = lane("slow", max_connections=1), lane("fast")
+    page_sizes = []
+
+    async def lanes():
+        return [slow, fast]
+
+    async def scenario(storage, outbox):
+        page = storage.page
+
+        async def counted_page(collection, **kwargs):
+            records, cursor = await page(collection, **kwargs)
+            page_sizes.append(len(records))
+            return records, cursor
+
+        storage.page = counted_page
+        # The slow account's backlog is ahead of the fast one's in the queue
+        slow_ids = [f"slow-{index:02d}" for index in range(20)]
+        fast_ids = [f"fast-{index}" for index in range(4)]
+        for job_id in slow_ids:
+            await outbox.enqueue(job_id, "hello", account_id="slow")
+        for job_id in fast_ids:
+            await outbox.enqueue(job_id, "hello", account_id="fast")
+        outbox.start()
+        fast_jobs = await settle(storage, fast_ids)
+        slow_done = [(await storage.get(POST_JOBS, job_id))["status"] for job_id in slow_ids].count("delivered")
+        return fast_jobs, slow_done
+
+    fast_jobs, slow_done = outbox_scenario(tmp_path, deliver, scenario, concurrency=3, lanes=lanes)
+    assert all(job["status"] == "delivered" for job in fast_jobs.values())
+    # The fast account finished while the slow one was still on its first tweets
+    assert slow_done <= 1
+    assert deliver.most_active["slow"] == 1
+    # Nothing read more jobs than there were free slots, however long the slow backlog
+    assert max(page_sizes) <= 3
+
+
+def test_throttled_lane_is_paced_without_holding_up_others(tmp_path):
+    deliver = LaneDeliveries({})
+    paced, free = lane("paced", rate_limit=10), lane("free")
+
+    async def lanes():
+        return [paced, free]
+
+    async def scenario(storage, outbox):
+        job_ids = []
+        for index in range(3):
+            for account_id in ("paced", "free"):
+                job_ids.append(f"{account_id}-{index}")
+                await outbox.enqueue(job_ids[-1], "hello", account_id=account_id)
+        outbox.start()
+        return await settle(storage, job_ids)
+
+    jobs = outbox_scenario(tmp_path, deliver, scenario, lanes=lanes)
+    assert all(job["status"] == "delivered" for job in jobs.values())
+    started = {account_id: [at for account, _, at in deliver.started if account == account_id]
+               for account_id in ("paced", "free")}
+    # One paced job every 0.1s, while the other account's went straight away
+    gaps = [later - earlier for earlier, later in zip(started["paced"], started["paced"][1:])]
+    assert min(gaps) >= 0.09
+    assert max(started["free"]) < started["paced"][1]
+
+
+def test_fail_lane_fails_only_that_lanes_queued_jobs(tmp_path):
+    async def scenario(storage, outbox):
+        for job_id, account_id in (("gone-1", "gone"), ("gone-2", "gone"), ("kept", "kept"), ("default", None)):
+            await outbox.enqueue(job_id, "hello", account_id=account_id)
+        failed = await outbox.fail_lane("gone", "Unknown account 'gone'")
+        jobs, _ = await storage.page(POST_JOBS)
+        return failed, {job["id"]: (job["status"], job["last_error"]) for job in jobs}
+
+    failed, jobs = outbox_scenario(tmp_path, Deliveries(), scenario)
+    assert failed == 2
+    assert jobs == {"gone-1": ("failed", "Unknown account 'gone'"), "gone-2": ("failed", "Unknown account 'gone'"),
+                    "kept": ("queued", None), "default": ("queued", None)}
+
+
+@pytest.fixture
+def clone(client, route_twitter_clone):
+    """Point the app at a stand-in Twitter clone and return the bodies it received"""
+    received = []
+
+    def handler(request):
+        received.append(request.content)
+        return httpx.Response(201, json={"id": len(received)})
+
+    route_twitter_clone(handler)
+    return received
+
+
+def wait_for_job(client, job_id, timeout=5.0):
+    async def finished():
+        while True:
+            job = await main.storage.get(POST_JOBS, job_id)
+            if job["status"] in ("delivered", "failed"):
+                return job
+            await asyncio.sleep(0.01)
+    return client.portal.call(asyncio.wait_for, finished(), timeout)
+
+
+def test_post_with_idempotency_key_is_queued_once(client, clone):
+    headers = {"Idempotency-Key": "api-once"}
+    first = client.post("/post-tweet", json={"content": "Queued hello"}, headers=headers)
+    assert first.status_code == 202
+    job_id = first.json()["job_id"]
+    assert first.json()["status_url"] == f"/jobs/{job_id}"
+
+    job = wait_for_job(client, job_id)
+    assert job["status"] == "delivered"
+
+    replay = client.post("/post-tweet", json={"content": "Queued hello"}, headers=headers)
+    assert replay.status_code == 202
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json()["job_id"] == job_id
+    assert len(clone) == 1
+
+    assert client.get(f"/jobs/{job_id}").json()["status"] == "delivered"
+    assert client.portal.call(main.storage.get, POSTED_TWEETS, job_id)["content"] == "Queued hello"
+
+
+def test_reused_or_bad_idempotency_keys_are_rejected(client, clone):
+    headers = {"Idempotency-Key": "api-reused"}
+    assert client.post("/post-tweet", json={"content": "First"}, headers=headers).status_code == 202
+    assert client.post("/post-tweet", json={"content": "Second"}, headers=headers).status_code == 422
+    assert client.post("/post-tweet", json={"content": "First"},
+                       headers={"Idempotency-Key": " "}).status_code == 400
+    assert client.get("/jobs/no-such-job").status_code == 404
@@ -0,0 +1,56 @@
+import importlib
+import json
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+import jsoncodec
+from records import DraftTweet, PostedTweet
+
+
+def test_record_round_trips_to_a_dict():
+    tweet = PostedTweet(id="1", content="hi", posted_at="2024-01-01T00:00:00+00:00", status="posted", account_id=None)
+    assert tweet.dict() == {"id": "1", "content": "hi", "posted_at": "2024-01-01T00:00:00+00:00", "status": "posted",
+                            "account_id": None}
+    assert PostedTweet(**tweet.dict()).dict() == tweet.dict()
+    assert repr(tweet).startswith("PostedTweet(id='1', content='hi'")
+
+
+def test_record_rejects_missing_and_unexpected_fields():
+    with pytest.raises(TypeError, match=r"missing \['tone'"):
+        DraftTweet(id="1", content="hi", hashtags="", created_at="x", updated_at="x")
+    with pytest.raises(TypeError, match=r"unexpected \['colour'\]"):
+        PostedTweet(id="1", content="hi", posted_at="x", status="posted", account_id=None, colour="blue")
+    with pytest.raises(AttributeError):
+        PostedTweet(id="1", content="hi", posted_at="x", status="posted", account_id=None).extra = 1
+
+
+@pytest.fixture(params=["default", "stdlib"])
+def codec(request, monkeypatch):
+    """jsoncodec as imported, and as it behaves without orjson installed"""
+    if request.param == "default":
+        yield jsoncodec
+        return
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    fallback = importlib.reload(jsoncodec)
+    assert fallback.BACKEND == "json"
+    yield fallback
+    monkeypatch.undo()
+    importlib.reload(jsoncodec)
+
+
+def test_codec_is_compact_and_round_trips(codec):
+    assert codec.dumps({"a": [1, 2], "b": None}) == b'{"a":[1,2],"b":null}'
+    value = {"text": "café ☕ \"quoted\"", "n": [1, 2.5, None, True], "nested": {"a": {}}}
+    encoded = codec.dumps(value)
+    assert codec.loads(encoded) == value
+    assert codec.loads(encoded.decode()) == value
+    # Agrees with the standard library
+    assert json.loads(encoded) == value
+
+
+def test_codec_stringifies_values_json_cannot_represent(codec):
+    moment = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert json.loads(codec.dumps({"at": moment}))["at"].startswith("2024-01-01")
+    assert set(json.loads(codec.dumps({"at": moment, "id": object()}))) == {"at", "id"}
@@ -0,0 +1,212 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import main
+from recurrence import CronSchedule
+from storage import RECURRING_SCHEDULES, SCHEDULED_TWEETS
+
+NEW_YORK = "America/New_York"
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def occurrences(cron, after, count):
+    result = []
+    for _ in range(count):
+        after = cron.next_after(after)
+        result.append(after)
+    return result
+
+
+def test_fields_names_and_aliases():
+    cron = CronSchedule("*/20 9-10 * jan-mar mon-fri")
+    assert (cron.minutes, cron.hours, cron.months) == ([0, 20, 40], [9, 10], {1, 2, 3})
+    # Stored in Python's weekday numbering, where Monday is 0
+    assert cron.weekdays == {0, 1, 2, 3, 4}
+    assert CronSchedule("@weekly").weekdays == CronSchedule("0 0 * * 7").weekdays == {6}
+    assert CronSchedule("5/15 * * * *").minutes == [5, 20, 35, 50]
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "* * 0 * *", "* * * foo *", "*/0 * * * *",
+                                        "5-1 * * * *"])
+def test_invalid_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_unknown_timezone_is_rejected():
+    with pytest.raises(ValueError, match="Unknown timezone"):
+        CronSchedule("@daily", "Mars/Olympus_Mons")
+
+
+def test_next_after_is_strictly_later():
+    cron = CronSchedule("*/15 * * * *")
+    assert cron.next_after(utc(2024, 1, 1, 10, 7, 30)) == utc(2024, 1, 1, 10, 15)
+    assert cron.next_after(utc(2024, 1, 1, 10, 15)) == utc(2024, 1, 1, 10, 30)
+    assert cron.next_after(utc(2024, 12, 31, 23, 59)) == utc(2025, 1, 1)
+
+
+def test_either_day_field_matches_when_both_are_restricted():
+    # The 13th of every month, and every Friday
+    cron = CronSchedule("0 0 13 * fri")
+    assert occurrences(cron, utc(2024, 1, 1), 3) == [utc(2024, 1, 5), utc(2024, 1, 12), utc(2024, 1, 13)]
+
+
+def test_rare_and_impossible_dates():
+    assert CronSchedule("0 0 29 2 *").next_after(utc(2024, 3, 1)) == utc(2028, 2, 29)
+    assert CronSchedule("0 0 30 2 *").next_after(utc(2024, 3, 1)) is None
+
+
+def test_times_are_read_in_the_schedule_timezone():
+    cron = CronSchedule("0 9 * * *", NEW_YORK)
+    # 09:00 EST is 14:00 UTC in winter and 09:00 EDT is 13:00 UTC in summer
+    assert cron.next_after(utc(2024, 1, 15)) == utc(2024, 1, 15, 14)
+    assert cron.next_after(utc(2024, 7, 15)) == utc(2024, 7, 15, 13)
+
+
+def test_daylight_saving_gap_runs_as_if_the_clock_had_not_moved():
+    # 02:30 doesn't exist on 10 March 2024 in New York; it runs at 03:30 EDT
+    cron = CronSchedule("30 2 * * *", NEW_YORK)
+    assert occurrences(cron, utc(2024, 3, 9, 12), 3) == [
+        utc(2024, 3, 10, 7, 30), utc(2024, 3, 11, 6, 30), utc(2024, 3, 12, 6, 30)]
+
+
+def test_repeated_hour_runs_only_the_first_time():
+    # 01:00-02:00 happens twice on 3 November 2024 in New York
+    cron = CronSchedule("30 1 * * *", NEW_YORK)
+    assert occurrences(cron, utc(2024, 11, 3), 2) == [utc(2024, 11, 3, 5, 30), utc(2024, 11, 4, 6, 30)]
+
+    every_half_hour = CronSchedule("*/30 * * * *", NEW_YORK)
+    local = [when.astimezone(every_half_hour.tz).strftime("%H:%M%z")
+             for when in occurrences(every_half_hour, utc(2024, 11, 3, 4, 50), 4)]
+    assert local == ["01:00-0400", "01:30-0400", "02:00-0500", "02:30-0500"]
+
+
+def test_start_end_and_occurrence_limit():
+    cron = CronSchedule("@daily")
+    bounded = {"start_at": "2024-01-03T00:00:00+00:00", "end_at": "2024-01-04T12:00:00+00:00", "max_occurrences": None}
+    # The start itself can be an occurrence
+    assert main.next_occurrence(cron, bounded, utc(2024, 1, 1), 0) == utc(2024, 1, 3)
+    assert main.next_occurrence(cron, bounded, utc(2024, 1, 3), 1) == utc(2024, 1, 4)
+    assert main.next_occurrence(cron, bounded, utc(2024, 1, 4), 2) is None
+
+    limited = {"start_at": None, "end_at": None, "max_occurrences": 2}
+    assert main.next_occurrence(cron, limited, utc(2024, 1, 1), 1) == utc(2024, 1, 2)
+    assert main.next_occurrence(cron, limited, utc(2024, 1, 1), 2) is None
+
+
+def test_preview(client):
+    response = client.post("/recurring-schedules/preview", json={
+        "cron": "0 9 * * mon", "timezone": NEW_YORK, "start_at": "2030-01-01T00:00:00Z", "limit": 3})
+    assert response.status_code == 200
+    assert [occurrence["local"] for occurrence in response.json()["occurrences"]] == [
+        "2030-01-07T09:00:00-05:00", "2030-01-14T09:00:00-05:00", "2030-01-21T09:00:00-05:00"]
+
+    bounded = client.post("/recurring-schedules/preview", json={
+        "cron": "@daily", "start_at": "2030-01-01T00:00:00Z", "max_occurrences": 2, "limit": 10}).json()
+    assert [occurrence["at"] for occurrence in bounded["occurrences"]] == [
+        "2030-01-01T00:00:00+00:00", "2030-01-02T00:00:00+00:00"]
+
+
+@pytest.mark.parametrize("body", [
+    {"cron": "not a cron"},
+    {"cron": "@daily", "timezone": "Nowhere/Special"},
+    {"cron": "@daily", "start_at": "someday"},
+])
+def test_invalid_rules_are_a_400(client, body):
+    assert client.post("/recurring-schedules/preview", json=body).status_code == 400
+    assert client.post("/recurring-schedules", json={"content": "never", **body}).status_code == 400
+
+
+def test_rules_without_future_occurrences_are_refused(client):
+    response = client.post("/recurring-schedules", json={
+        "content": "too late", "cron": "@daily", "end_at": "2000-01-01T00:00:00Z"})
+    assert response.status_code == 400
+
+
+def test_create_list_occurrences_and_delete(client):
+    created = client.post("/recurring-schedules", json={
+        "content": "Weekly update", "cron": "0 12 * * fri", "start_at": "2031-01-01T00:00:00Z"}).json()
+    schedule_id = created["schedule_id"]
+    assert created["next_run_at"] == "2031-01-03T12:00:00+00:00"
+
+    listed = client.get("/recurring-schedules", params={"status": "active"}).json()["recurring_schedules"]
+    assert schedule_id in [schedule["id"] for schedule in listed]
+
+    upcoming = client.get(f"/recurring-schedules/{schedule_id}/occurrences",
+                          params={"until": "2031-01-20T00:00:00Z"}).json()["occurrences"]
+    assert [occurrence["at"][:10] for occurrence in upcoming] == ["2031-01-03", "2031-01-10", "2031-01-17"]
+
+    assert client.delete(f"/recurring-schedules/{schedule_id}").status_code == 200
+    assert client.delete(f"/recurring-schedules/{schedule_id}").status_code == 404
+    assert client.get(f"/recurring-schedules/{schedule_id}/occurrences").status_code == 404
+
+
+@pytest.fixture
+def due_rule(client, monkeypatch):
+    """Store a rule whose occurrence came due three days ago, without letting the schedulers act on it"""
+    scheduled, rescheduled = [], []
+    monkeypatch.setattr(main.scheduler, "add", lambda scheduled_id, due: scheduled.append(scheduled_id))
+    monkeypatch.setattr(main.recurring_scheduler, "add", lambda schedule_id, due: rescheduled.append(due))
+
+    def store(schedule_id, **fields):
+        due = (datetime.now(timezone.utc) - timedelta(days=3)).replace(hour=9, minute=0, second=0, microsecond=0)
+        schedule = {
+            "id": schedule_id, "content": "Daily at nine", "cron": "0 9 * * *", "timezone": "UTC",
+            "start_at": None, "end_at": None, "max_occurrences": None, "occurrences": 0,
+            "next_run_at": due.isoformat(), "last_run_at": None, "created_at": due.isoformat(), "status": "active",
+            **fields,
+        }
+        client.portal.call(main.storage.put, RECURRING_SCHEDULES, schedule_id, schedule)
+        return schedule
+
+    return store, scheduled, rescheduled
+
+
+def test_missed_occurrences_are_coalesced_into_one(client, due_rule):
+    store, scheduled, rescheduled = due_rule
+    rule = store("r-missed")
+    client.portal.call(main.run_recurring_schedule, "r-missed")
+
+    [occurrence_id] = scheduled
+    tweet = client.portal.call(main.storage.get, SCHEDULED_TWEETS, occurrence_id)
+    assert (tweet["content"], tweet["scheduled_time"], tweet["status"]) == (
+        "Daily at nine", rule["next_run_at"], "pending")
+
+    advanced = client.portal.call(main.storage.get, RECURRING_SCHEDULES, "r-missed")
+    assert advanced["occurrences"] == 1
+    assert advanced["last_run_at"] == rule["next_run_at"]
+    # The two days in between are skipped rather than posted late
+    next_run = main.parse_datetime_string(advanced["next_run_at"])
+    assert datetime.now(timezone.utc) < next_run <= datetime.now(timezone.utc) + timedelta(days=1)
+    assert rescheduled == [next_run]
+
+
+def test_running_an_occurrence_twice_schedules_one_tweet(client, due_rule):
+    store, scheduled, _ = due_rule
+    rule = store("r-twice")
+    client.portal.call(main.run_recurring_schedule, "r-twice")
+    # As if the worker died before the rule was advanced
+    client.portal.call(main.storage.put, RECURRING_SCHEDULES, "r-twice", rule)
+    client.portal.call(main.run_recurring_schedule, "r-twice")
+
+    assert len(scheduled) == 2 and scheduled[0] == scheduled[1]
+    tweets, _ = client.portal.call(main.storage.page, SCHEDULED_TWEETS)
+    assert [tweet["id"] for tweet in tweets].count(scheduled[0]) == 1
+
+
+def test_rule_finishes_after_its_last_occurrence(client, due_rule):
+    store, scheduled, rescheduled = due_rule
+    store("r-once", max_occurrences=1)
+    client.portal.call(main.run_recurring_schedule, "r-once")
+
+    finished = client.portal.call(main.storage.get, RECURRING_SCHEDULES, "r-once")
+    assert (finished["status"], finished["next_run_at"], finished["occurrences"]) == ("finished", None, 1)
+    assert len(scheduled) == 1 and rescheduled == []
+
+    # A finished rule is left alone
+    client.portal.call(main.run_recurring_schedule, "r-once")
+    assert len(scheduled) == 1
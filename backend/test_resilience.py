@@ -0,0 +1,184 @@
+import asyncio
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+import main
+import resilience
+from resilience import (CircuitBreaker, CircuitOpenError, RateLimitExceeded, TokenBucket, backoff_delay,
+                        parse_retry_after)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket_spaces_out_callers_after_a_burst(clock):
+    bucket = TokenBucket("test", rate=10, burst=2, max_wait=0.25)
+    assert [bucket.reserve() for _ in range(2)] == [0, 0]
+    assert bucket.reserve() == pytest.approx(0.1)
+    assert bucket.reserve() == pytest.approx(0.2)
+    with pytest.raises(RateLimitExceeded):
+        bucket.reserve()
+    clock.now += 1
+    assert bucket.reserve() == 0
+
+
+def test_token_bucket_pause_holds_everyone_back(clock):
+    bucket = TokenBucket("test", rate=0, max_wait=10)
+    assert bucket.reserve() == 0
+    bucket.pause(3)
+    assert bucket.reserve() == pytest.approx(3)
+    clock.now += 3
+    assert bucket.reserve() == 0
+
+
+def test_token_bucket_ready_in_does_not_take_a_token(clock):
+    bucket = TokenBucket("test", rate=10, burst=1)
+    assert bucket.ready_in() == 0
+    assert bucket.ready_in() == 0
+    bucket.reserve()
+    assert bucket.ready_in() == pytest.approx(0.1)
+    clock.now += 0.1
+    assert bucket.ready_in() == pytest.approx(0)
+    bucket.pause(3)
+    assert bucket.ready_in() == pytest.approx(3.1)
+
+
+def test_circuit_breaker_transitions(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=5)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError) as refused:
+        breaker.before_call()
+    assert refused.value.retry_after == pytest.approx(5)
+
+    clock.now += 5
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 5
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.snapshot() == {"state": CircuitBreaker.CLOSED, "consecutive_failures": 0}
+
+
+def test_stalled_probe_is_replaced(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=5)
+    breaker.record_failure()
+    clock.now += 5
+    breaker.before_call()
+    clock.now += 5
+    breaker.before_call()
+
+
+def test_backoff_and_retry_after():
+    assert all(0 <= backoff_delay(attempt, 0.5, 4) <= min(4, 0.5 * 2 ** attempt) for attempt in range(6)
+               for _ in range(20))
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-1") == 0
+    assert parse_retry_after(None) is None and parse_retry_after("soon") is None
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 28 < parse_retry_after(later) <= 30
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """OpenRouter answering with the queued responses, plus fresh protections and near-instant backoff"""
+    responses = []
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(main, "openrouter_client", httpx.AsyncClient(
+        base_url="http://openrouter.test", transport=httpx.MockTransport(handler)))
+    breaker = CircuitBreaker("test-openrouter", 3, 30)
+    monkeypatch.setattr(main, "openrouter_breaker", breaker)
+    # With a single candidate model the router calls through the same breaker
+    monkeypatch.setitem(main.model_router.breakers, main.OPENROUTER_MODELS[0], breaker)
+    monkeypatch.setattr(main, "openrouter_limiter", TokenBucket("test-openrouter", 0, max_wait=60))
+    monkeypatch.setattr(main, "OPENROUTER_MAX_RETRIES", 2)
+    monkeypatch.setattr(main, "OPENROUTER_RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(main, "OPENROUTER_RETRY_MAX_DELAY", 0.05)
+    return responses, calls
+
+
+def completion(text="Resilient #tweet"):
+    return httpx.Response(200, json={"choices": [{"message": {"content": text}}]})
+
+
+def generate(client):
+    return client.post("/generate-tweet", json={"topic": "retries", "no_cache": True})
+
+
+def test_transient_failures_are_retried(client, upstream):
+    responses, calls = upstream
+    responses.extend([httpx.Response(503), httpx.ConnectError("refused"), completion()])
+
+    response = generate(client)
+    assert response.status_code == 200
+    assert response.json()["content"] == "Resilient #tweet"
+    assert len(calls) == 3
+    assert main.openrouter_breaker.failures == 0
+
+
+def test_final_rate_limit_is_passed_through(client, upstream):
+    responses, calls = upstream
+    responses.extend([httpx.Response(429, headers={"Retry-After": "0.01"})] * 3)
+
+    response = generate(client)
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "0.01"
+    assert len(calls) == 3
+    # Throttling doesn't trip the breaker
+    assert main.openrouter_breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_circuit_fails_fast(client, upstream):
+    responses, calls = upstream
+    responses.extend([httpx.Response(500)] * 3)
+
+    assert generate(client).status_code == 500
+    refused = generate(client)
+    assert refused.status_code == 503
+    assert int(refused.headers["retry-after"]) >= 1
+    assert len(calls) == 3
+
+
+def test_timeouts_map_to_504(client, upstream):
+    responses, _ = upstream
+    responses.extend([httpx.ReadTimeout("slow")] * 3)
+    assert generate(client).status_code == 504
+
+
+def test_client_errors_are_not_retried(client, upstream):
+    responses, calls = upstream
+    responses.append(httpx.Response(400, json={"error": {"message": "bad model"}}))
+    assert generate(client).status_code == 500
+    assert len(calls) == 1
@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+from resilience import CircuitBreaker
+from routing import LatencyTracker, ModelRouter
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def make_router(models=("a", "b", "c"), **options):
+    breakers = {model: CircuitBreaker(f"test:{model}", 1, 60) for model in models}
+    options.setdefault("hedge_delay", 0.05)
+    return ModelRouter(list(models), breakers, **options)
+
+
+class Models:
+    """An attempt callback with a per-model latency and optional failure"""
+
+    def __init__(self, latency, failing=()):
+        self.latency = latency
+        self.failing = set(failing)
+        self.started = []
+        self.cancelled = []
+
+    async def __call__(self, model):
+        self.started.append(model)
+        try:
+            await asyncio.sleep(self.latency.get(model, 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        if model in self.failing:
+            raise RuntimeError(f"{model} failed")
+        return f"answer from {model}"
+
+
+def test_latency_tracker():
+    tracker = LatencyTracker(alpha=0.5, window=4)
+    assert tracker.ewma is None and tracker.quantile(0.95) is None
+    for seconds in (1.0, 3.0, 2.0, 4.0, 5.0):
+        tracker.observe(seconds)
+    assert tracker.ewma == pytest.approx(4.0)
+    # Only the last four samples count
+    assert tracker.quantile(0.5) == 3.0
+    assert tracker.quantile(0.95) == 5.0
+
+
+def test_unmeasured_models_are_tried_before_measured_ones():
+    router = make_router()
+    assert router.ranked() == ["a", "b", "c"]
+    router.latency["a"].observe(0.2)
+    # "b" and "c" haven't been measured, so they get a turn before "a"
+    assert router.ranked() == ["b", "c", "a"]
+    router.latency["b"].observe(0.5)
+    router.latency["c"].observe(0.1)
+    assert router.ranked() == ["c", "a", "b"]
+    router.breakers["c"].record_failure()
+    assert router.ranked() == ["a", "b", "c"]
+
+
+def test_every_model_gets_explored_then_the_fastest_wins():
+    router = make_router(max_hedges=0)
+    models = Models({"a": 0.03, "b": 0.01, "c": 0.02})
+
+    async def scenario():
+        return [await router.call(models) for _ in range(5)]
+
+    answers = run(scenario())
+    assert models.started[:3] == ["a", "b", "c"]
+    assert answers[3:] == ["answer from b", "answer from b"]
+
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled():
+    router = make_router(models=("slow", "fast"))
+    models = Models({"slow": 5, "fast": 0.01})
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        answer = await router.call(models)
+        return answer, loop.time() - started
+
+    answer, took = run(scenario())
+    assert answer == "answer from fast"
+    assert took < 1
+    assert models.started == ["slow", "fast"]
+    assert models.cancelled == ["slow"]
+    assert (router.hedged, router.hedge_wins) == (1, 1)
+    # The cancelled call still counts against the slow model
+    assert router.latency["slow"].ewma >= 0.05
+    assert router.ranked() == ["fast", "slow"]
+
+
+def test_hedge_waits_for_the_recent_quantile_once_measured():
+    router = make_router(min_samples=3, hedge_quantile=0.5)
+    for seconds in (0.1, 0.2, 0.3):
+        router.latency["a"].observe(seconds)
+    assert router.delay_before_hedge("a") == 0.2
+    assert router.delay_before_hedge("b") == 0.05
+
+
+def test_failures_fail_over_and_the_first_error_is_raised():
+    router = make_router(max_hedges=0)
+    models = Models({}, failing={"a"})
+    assert run(router.call(models)) == "answer from b"
+    assert models.started == ["a", "b"]
+
+    everything_fails = Models({}, failing={"a", "b", "c"})
+    with pytest.raises(RuntimeError, match="failed"):
+        run(make_router(max_hedges=0).call(everything_fails))
+    assert everything_fails.started == ["a", "b", "c"]
+
+
+def test_generation_is_routed_across_models(client, monkeypatch):
+    router = make_router(models=("test/slow", "test/fast"))
+    monkeypatch.setattr(main, "model_router", router)
+    requested = []
+
+    async def handler(request):
+        model = json.loads(request.content)["model"]
+        requested.append(model)
+        if model == "test/slow":
+            await asyncio.sleep(5)
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"From {model} #routing"}}]})
+
+    monkeypatch.setattr(main, "openrouter_client", httpx.AsyncClient(
+        base_url="http://openrouter.test", transport=httpx.MockTransport(handler)))
+
+    response = client.post("/generate-tweet", json={"topic": "routing", "no_cache": True})
+    assert response.status_code == 200
+    assert response.json()["content"] == "From test/fast #routing"
+    assert requested == ["test/slow", "test/fast"]
+
+    models = client.get("/health").json()["openrouter_models"]
+    assert [entry["model"] for entry in models["models"]] == ["test/fast", "test/slow"]
+    assert models["hedge_rate"] == 1.0
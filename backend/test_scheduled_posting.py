@@ -0,0 +1,96 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+import main
+from storage import POSTED_TWEETS, SCHEDULED_TWEETS
+
+
+def schedule(client, scheduled_id):
+    tweet = {
+        "id": scheduled_id,
+        "content": "Scheduled hello",
+        "scheduled_time": datetime.now(timezone.utc).isoformat(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "status": "pending",
+    }
+    client.portal.call(main.storage.put, SCHEDULED_TWEETS, scheduled_id, tweet)
+
+
+def post(client, scheduled_id, handler, route_twitter_clone):
+    route_twitter_clone(handler)
+    client.portal.call(main.post_scheduled_tweet, scheduled_id)
+    return client.portal.call(main.storage.get, SCHEDULED_TWEETS, scheduled_id)
+
+
+def test_posted_tweet_is_recorded_under_the_scheduled_id(client, route_twitter_clone):
+    sent = []
+
+    def handler(request):
+        sent.append(json.loads(request.content))
+        return httpx.Response(201, json={"id": 1})
+
+    schedule(client, "s-ok")
+    assert post(client, "s-ok", handler, route_twitter_clone)["status"] == "posted"
+    assert sent == [{"username": main.TWITTER_CLONE_USERNAME, "text": "Scheduled hello"}]
+
+    posted = client.portal.call(main.storage.get, POSTED_TWEETS, "s-ok")
+    assert posted["status"] == "posted_scheduled"
+    assert posted["content"] == "Scheduled hello"
+
+
+def test_rejected_post_is_marked_failed(client, route_twitter_clone):
+    schedule(client, "s-rejected")
+    rejected = post(client, "s-rejected", lambda request: httpx.Response(500, text="boom"), route_twitter_clone)
+    assert rejected["status"] == "failed"
+    assert client.portal.call(main.storage.get, POSTED_TWEETS, "s-rejected") is None
+
+
+def test_deadline_covers_waiting_for_a_slot(client, monkeypatch, route_twitter_clone):
+    monkeypatch.setattr(main, "SCHEDULED_POST_TIMEOUT", 0.1)
+    monkeypatch.setattr(main, "scheduled_post_slots", asyncio.Semaphore(0))
+    sent = []
+
+    def handler(request):
+        sent.append(request)
+        return httpx.Response(201)
+
+    schedule(client, "s-starved")
+    assert post(client, "s-starved", handler, route_twitter_clone)["status"] == "failed"
+    assert sent == []
+
+
+def test_recording_failure_after_a_successful_post_is_not_a_failure(client, monkeypatch, route_twitter_clone):
+    async def broken_put(collection, record_id, record):
+        raise OSError("disk full")
+
+    schedule(client, "s-unrecorded")
+    monkeypatch.setattr(main.storage, "put", broken_put)
+    tweet = post(client, "s-unrecorded", lambda request: httpx.Response(200), route_twitter_clone)
+    assert tweet["status"] != "failed"
+
+
+def test_only_pending_tweets_are_posted(client, route_twitter_clone):
+    sent = []
+
+    def handler(request):
+        sent.append(request)
+        return httpx.Response(201)
+
+    schedule(client, "s-twice")
+    post(client, "s-twice", handler, route_twitter_clone)
+    post(client, "s-twice", handler, route_twitter_clone)
+    assert len(sent) == 1
+
+
+def test_tweets_left_posting_by_a_dead_leader_are_failed(client):
+    schedule(client, "s-interrupted")
+    client.portal.call(main.storage.update, SCHEDULED_TWEETS, "s-interrupted", {"status": "posting"})
+    schedule(client, "s-untouched")
+
+    assert client.portal.call(main.recover_interrupted_scheduled_tweets) >= 1
+    assert client.portal.call(main.storage.get, SCHEDULED_TWEETS, "s-interrupted")["status"] == "failed"
+    assert client.portal.call(main.storage.get, SCHEDULED_TWEETS, "s-untouched")["status"] == "pending"
@@ -0,0 +1,246 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from scheduler import LeaderElection, TweetScheduler
+from storage import Storage
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def in_seconds(seconds: float) -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=seconds)
+
+
+class Recorder:
+    """A dispatch callback that remembers what fired and when"""
+
+    def __init__(self):
+        self.fired = []
+        self.event = asyncio.Event()
+
+    async def __call__(self, scheduled_ids):
+        loop = asyncio.get_running_loop()
+        self.fired.extend((scheduled_id, loop.time()) for scheduled_id in scheduled_ids)
+        self.event.set()
+
+    async def wait_for(self, count: int, timeout: float = 5.0):
+        async def enough():
+            while len(self.fired) < count:
+                self.event.clear()
+                await self.event.wait()
+        await asyncio.wait_for(enough(), timeout)
+
+    @property
+    def ids(self):
+        return [scheduled_id for scheduled_id, _ in self.fired]
+
+
+def test_fires_in_due_order_at_due_time():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = TweetScheduler(recorder)
+        scheduler.start()
+        try:
+            started = asyncio.get_running_loop().time()
+            scheduler.add("late", in_seconds(0.3))
+            scheduler.add("early", in_seconds(0.1))
+            await recorder.wait_for(2)
+        finally:
+            await scheduler.stop()
+        assert recorder.ids == ["early", "late"]
+        early_at, late_at = (at - started for _, at in recorder.fired)
+        assert 0.05 <= early_at < 0.25
+        assert 0.25 <= late_at < 0.6
+
+    run(scenario())
+
+
+def test_new_earliest_tweet_wakes_a_long_sleep():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = TweetScheduler(recorder)
+        scheduler.start()
+        try:
+            scheduler.add("far", in_seconds(3600))
+            await asyncio.sleep(0.05)
+            scheduler.add("soon", in_seconds(0.05))
+            await recorder.wait_for(1, timeout=2)
+            assert len(scheduler) == 1
+        finally:
+            await scheduler.stop()
+        assert recorder.ids == ["soon"]
+        # Stopping forgets pending tweets; the next leader reloads them from storage
+        assert len(scheduler) == 0
+
+    run(scenario())
+
+
+def test_overdue_tweets_fire_together():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = TweetScheduler(recorder)
+        scheduler.start()
+        try:
+            for index in range(5):
+                scheduler.add(f"t{index}", in_seconds(-60 + index))
+            await recorder.wait_for(5)
+        finally:
+            await scheduler.stop()
+        assert recorder.ids == [f"t{index}" for index in range(5)]
+
+    run(scenario())
+
+
+def test_removed_and_rescheduled_tweets():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = TweetScheduler(recorder)
+        scheduler.start()
+        try:
+            scheduler.add("cancelled", in_seconds(0.05))
+            scheduler.add("moved", in_seconds(0.05))
+            scheduler.add("kept", in_seconds(0.1))
+            scheduler.remove("cancelled")
+            scheduler.add("moved", in_seconds(0.2))
+            assert len(scheduler) == 2
+            await recorder.wait_for(2)
+            await asyncio.sleep(0.1)
+        finally:
+            await scheduler.stop()
+        assert recorder.ids == ["kept", "moved"]
+
+    run(scenario())
+
+
+def test_dispatch_errors_do_not_stop_the_loop():
+    async def scenario():
+        recorder = Recorder()
+
+        async def dispatch(scheduled_ids):
+            if "broken" in scheduled_ids:
+                raise RuntimeError("boom")
+            await recorder(scheduled_ids)
+
+        scheduler = TweetScheduler(dispatch)
+        scheduler.start()
+        try:
+            scheduler.add("broken", in_seconds(0))
+            scheduler.add("fine", in_seconds(0.1))
+            await recorder.wait_for(1)
+        finally:
+            await scheduler.stop()
+        assert recorder.ids == ["fine"]
+
+    run(scenario())
+
+
+def test_stop_waits_for_dispatches_but_not_forever():
+    async def scenario():
+        finished, cancelled = [], []
+
+        async def dispatch(scheduled_ids):
+            try:
+                await asyncio.sleep(0.05 if scheduled_ids == ["quick"] else 60)
+                finished.extend(scheduled_ids)
+            except asyncio.CancelledError:
+                cancelled.extend(scheduled_ids)
+                raise
+
+        scheduler = TweetScheduler(dispatch)
+        scheduler.start()
+        scheduler.add("quick", in_seconds(0))
+        await asyncio.sleep(0.01)
+        scheduler.add("stuck", in_seconds(0))
+        await asyncio.sleep(0.01)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await scheduler.stop(timeout=0.2)
+        return finished, cancelled, loop.time() - started
+
+    finished, cancelled, took = run(scenario())
+    assert finished == ["quick"]
+    assert cancelled == ["stuck"]
+    assert took < 1
+
+
+def test_add_is_ignored_unless_running():
+    scheduler = TweetScheduler(Recorder())
+    scheduler.add("ignored", in_seconds(1))
+    assert len(scheduler) == 0
+
+
+class Campaign:
+    """Callbacks for a LeaderElection that record calls and can be told to fail"""
+
+    def __init__(self, fail_elected=False, fail_demoted=False):
+        self.calls = []
+        self.fail_elected = fail_elected
+        self.fail_demoted = fail_demoted
+
+    async def on_elected(self):
+        self.calls.append("elected")
+        if self.fail_elected:
+            raise RuntimeError("could not start")
+
+    async def on_demoted(self):
+        self.calls.append("demoted")
+        if self.fail_demoted:
+            raise RuntimeError("could not stop")
+
+
+def election(storage, holder, campaign, ttl=0.3):
+    return LeaderElection(storage, "scheduler", holder, ttl,
+                          on_elected=campaign.on_elected, on_demoted=campaign.on_demoted)
+
+
+def test_one_leader_and_handover_on_stop():
+    async def scenario():
+        storage = Storage()
+        first, second = Campaign(), Campaign()
+        a, b = election(storage, "a", first), election(storage, "b", second)
+        await a.start()
+        await b.start()
+        assert (a.is_leader, b.is_leader) == (True, False)
+
+        await a.stop()
+        assert first.calls == ["elected", "demoted"]
+        # The lease was released, so the next attempt takes over without waiting for it to lapse
+        await asyncio.sleep(0.15)
+        assert b.is_leader and second.calls == ["elected"]
+        await b.stop()
+
+    run(scenario())
+
+
+def test_failed_election_callback_steps_down_and_keeps_campaigning():
+    async def scenario():
+        storage = Storage()
+        campaign = Campaign(fail_elected=True)
+        leader = election(storage, "a", campaign)
+        await leader.start()
+        assert not leader.is_leader
+        assert campaign.calls == ["elected", "demoted"]
+        # The lease was given up, so another worker could lead
+        assert await storage.acquire_lease("scheduler", "b", ttl=0.05)
+
+        campaign.fail_elected = False
+        await asyncio.sleep(0.2)
+        assert leader.is_leader
+        await leader.stop()
+
+    run(scenario())
+
+
+def test_failed_demotion_callback_still_releases_the_lease():
+    async def scenario():
+        storage = Storage()
+        campaign = Campaign(fail_demoted=True)
+        leader = election(storage, "a", campaign)
+        await leader.start()
+        await leader.stop()
+        assert not leader.is_leader
+        return await storage.acquire_lease("scheduler", "b", ttl=10)
+
+    assert run(scenario())
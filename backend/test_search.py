@@ -0,0 +1,144 @@
+import asyncio
+
+from search import SearchIndex, record_hashtags, tokenize
+from storage import DRAFTS, POSTED_TWEETS, create_storage
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def draft(draft_id, content, hashtags="", updated_at="2024-01-01T00:00:00+00:00"):
+    return {"id": draft_id, "content": content, "hashtags": hashtags, "tone": "engaging",
+            "created_at": updated_at, "updated_at": updated_at}
+
+
+def posted(tweet_id, content, posted_at="2024-01-01T00:00:00+00:00"):
+    return {"id": tweet_id, "content": content, "posted_at": posted_at, "status": "posted"}
+
+
+def ids(results):
+    return [result["record"]["id"] for result in results]
+
+
+def with_index(tmp_path, scenario):
+    async def wrapper():
+        storage = create_storage("sqlite", str(tmp_path))
+        await storage.open()
+        try:
+            return await scenario(storage, SearchIndex(storage))
+        finally:
+            await storage.close()
+    return run(wrapper())
+
+
+def test_tokenize_and_hashtags():
+    assert tokenize("Hello, #World! It's 2024") == ["hello", "world", "it", "s", "2024"]
+    assert tokenize("") == []
+    assert record_hashtags({"content": "Ship it #Python #perf", "hashtags": "#Async"}) == {"python", "perf", "async"}
+
+
+def test_bm25_favours_repeated_terms_and_short_tweets(tmp_path):
+    async def scenario(storage, index):
+        await storage.put_many(POSTED_TWEETS, {
+            "once": posted("once", "python tips for the weekend and beyond"),
+            "twice": posted("twice", "python python tips"),
+            "other": posted("other", "weekend plans"),
+            "common": posted("common", "the the the"),
+        })
+        await index.refresh()
+        _, by_frequency = await index.search("python")
+        _, by_length = await index.search("weekend")
+        return by_frequency, by_length
+
+    by_frequency, by_length = with_index(tmp_path, scenario)
+    assert ids(by_frequency) == ["twice", "once"]
+    assert by_frequency[0]["score"] > by_frequency[1]["score"] > 0
+    # Same term count, so the shorter tweet wins
+    assert ids(by_length) == ["other", "once"]
+
+
+def test_every_term_must_match_and_ties_go_to_the_newest(tmp_path):
+    async def scenario(storage, index):
+        await storage.put_many(DRAFTS, {
+            "old": draft("old", "async python", updated_at="2024-01-01T00:00:00+00:00"),
+            "new": draft("new", "python async", updated_at="2024-06-01T00:00:00+00:00"),
+            "half": draft("half", "python only", updated_at="2024-07-01T00:00:00+00:00"),
+        })
+        await index.refresh()
+        return await index.search("Python ASYNC"), await index.search("python missing")
+
+    (total, results), (missing_total, missing) = with_index(tmp_path, scenario)
+    assert total == 2
+    assert ids(results) == ["new", "old"]
+    assert (missing_total, missing) == (0, [])
+
+
+def test_hashtag_type_filters_and_paging(tmp_path):
+    async def scenario(storage, index):
+        await storage.put_many(DRAFTS, {
+            f"d{n}": draft(f"d{n}", f"launch day {n}", hashtags="#Launch", updated_at=f"2024-01-0{n}T00:00:00+00:00")
+            for n in range(1, 6)
+        })
+        await storage.put(POSTED_TWEETS, "p1", posted("p1", "launch recap #launch #recap"))
+        await index.refresh()
+        return {
+            "tagged": await index.search(hashtags=("#LAUNCH",)),
+            "both_tags": await index.search(hashtags=("launch", "recap")),
+            "posted_only": await index.search("launch", collection=POSTED_TWEETS),
+            "page": await index.search(hashtags=("launch",), collection=DRAFTS, limit=2, offset=2),
+        }
+
+    found = with_index(tmp_path, scenario)
+    assert found["tagged"][0] == 6
+    assert ids(found["both_tags"][1]) == ["p1"]
+    assert [result["type"] for result in found["posted_only"][1]] == ["posted"]
+    total, page = found["page"]
+    # With only hashtags, newest first
+    assert (total, ids(page)) == (5, ["d3", "d2"])
+
+
+def test_index_follows_local_writes_and_other_workers(tmp_path):
+    async def scenario(storage, index):
+        await storage.put(DRAFTS, "a", draft("a", "original words"))
+        await index.refresh()
+
+        await storage.update(DRAFTS, "a", {"content": "edited words"})
+        await storage.put(DRAFTS, "b", draft("b", "edited too"))
+        await storage.delete(DRAFTS, "b")
+        local = await index.search("edited"), await index.search("original")
+
+        other_worker = create_storage("sqlite", str(tmp_path))
+        await other_worker.open()
+        try:
+            await other_worker.put(POSTED_TWEETS, "remote", posted("remote", "written elsewhere"))
+            await other_worker.replace(DRAFTS, {"fresh": draft("fresh", "replaced collection")})
+        finally:
+            await other_worker.close()
+        await index.refresh()
+        return local, await index.search("elsewhere"), await index.search("edited"), await index.search("replaced"), len(index)
+
+    (edited, original), remote, after_replace, replaced, size = with_index(tmp_path, scenario)
+    assert ids(edited[1]) == ["a"]
+    assert original == (0, [])
+    assert ids(remote[1]) == ["remote"]
+    assert after_replace == (0, [])
+    assert ids(replaced[1]) == ["fresh"]
+    assert size == 2
+
+
+def test_search_endpoint(client):
+    saved = client.post("/save-draft", json={"content": "Zephyrine gardens bloom", "hashtags": "#zephyrgarden"})
+    draft_id = saved.json()["draft_id"]
+
+    found = client.get("/search", params={"q": "zephyrine"}).json()
+    assert found["total"] == 1
+    assert found["next_offset"] is None
+    assert found["results"][0]["type"] == "draft"
+    assert found["results"][0]["record"]["id"] == draft_id
+    assert client.get("/search", params={"hashtag": "#ZephyrGarden", "type": "draft"}).json()["total"] == 1
+    assert client.get("/search", params={"q": "zephyrine", "type": "posted"}).json()["total"] == 0
+
+    assert client.get("/search").status_code == 400
+    assert client.get("/search", params={"q": "x", "type": "scheduled"}).status_code == 400
+    assert client.get("/search", params={"q": "x", "limit": 0}).status_code == 422
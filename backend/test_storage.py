@@ -0,0 +1,436 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from storage import (DRAFTS, POSTED_TWEETS, SCHEDULED_TWEETS, JsonFileStorage, SQLiteStorage, StorageError,
+                     create_storage)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture(params=["sqlite", "json"])
+def backend(request):
+    return request.param
+
+
+def test_crud(backend, tmp_path):
+    async def scenario():
+        storage = create_storage(backend, str(tmp_path))
+        await storage.open()
+        try:
+            assert await storage.all(DRAFTS) == {}
+            await storage.put(DRAFTS, "a", {"id": "a", "content": "first"})
+            await storage.put_many(DRAFTS, {"b": {"id": "b", "content": "second"},
+                                            "c": {"id": "c", "content": "third"}})
+            assert await storage.get(DRAFTS, "a") == {"id": "a", "content": "first"}
+            assert set(await storage.all(DRAFTS)) == {"a", "b", "c"}
+            assert await storage.all(POSTED_TWEETS) == {}
+
+            updated = await storage.update(DRAFTS, "a", {"content": "edited"})
+            assert updated == {"id": "a", "content": "edited"}
+            assert await storage.get(DRAFTS, "a") == updated
+            assert await storage.update(DRAFTS, "missing", {"content": "x"}) is None
+
+            assert await storage.delete(DRAFTS, "b") is True
+            assert await storage.delete(DRAFTS, "b") is False
+            assert await storage.get(DRAFTS, "b") is None
+
+            await storage.replace(DRAFTS, {"z": {"id": "z"}})
+            assert await storage.all(DRAFTS) == {"z": {"id": "z"}}
+        finally:
+            await storage.close()
+
+    run(scenario())
+
+
+def test_data_survives_reopen(backend, tmp_path):
+    async def scenario():
+        storage = create_storage(backend, str(tmp_path))
+        await storage.open()
+        await storage.put(DRAFTS, "a", {"id": "a", "content": "kept"})
+        await storage.close()
+
+        reopened = create_storage(backend, str(tmp_path))
+        await reopened.open()
+        try:
+            assert await reopened.get(DRAFTS, "a") == {"id": "a", "content": "kept"}
+        finally:
+            await reopened.close()
+
+    run(scenario())
+
+
+def test_sqlite_imports_json_files_once(tmp_path):
+    (tmp_path / "drafts.json").write_text(json.dumps({"a": {"id": "a", "content": "from json"}}))
+    (tmp_path / "posted_tweets.json").write_text("")
+
+    async def scenario():
+        storage = SQLiteStorage(os.path.join(tmp_path, "tweets.db"), data_dir=str(tmp_path))
+        await storage.open()
+        assert await storage.all(DRAFTS) == {"a": {"id": "a", "content": "from json"}}
+        await storage.delete(DRAFTS, "a")
+        await storage.close()
+
+        # Deleted records must not come back from the JSON files on the next start
+        reopened = SQLiteStorage(os.path.join(tmp_path, "tweets.db"), data_dir=str(tmp_path))
+        await reopened.open()
+        try:
+            assert await reopened.all(DRAFTS) == {}
+        finally:
+            await reopened.close()
+
+    run(scenario())
+
+
+def test_json_storage_writes_readable_files(tmp_path):
+    async def scenario():
+        storage = JsonFileStorage(str(tmp_path))
+        await storage.open()
+        await storage.put(DRAFTS, "a", {"id": "a", "content": "on disk"})
+        await storage.close()
+
+    run(scenario())
+    with open(tmp_path / "drafts.json") as f:
+        assert json.load(f) == {"a": {"id": "a", "content": "on disk"}}
+
+
+def test_unknown_backend(tmp_path):
+    with pytest.raises(ValueError):
+        create_storage("redis", str(tmp_path))
+
+
+def read_file(path) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_json_storage_writes_behind(tmp_path):
+    async def scenario():
+        storage = JsonFileStorage(str(tmp_path), flush_interval=60)
+        await storage.open()
+        try:
+            for index in range(10):
+                await storage.put(DRAFTS, str(index), {"id": str(index)})
+            # Reads are served from memory before anything reaches the disk
+            assert len(await storage.all(DRAFTS)) == 10
+            assert read_file(tmp_path / "drafts.json") == {}
+            await storage.flush()
+            assert set(read_file(tmp_path / "drafts.json")) == {str(index) for index in range(10)}
+        finally:
+            await storage.close()
+
+    run(scenario())
+
+
+def test_json_storage_flushes_early_once_max_dirty_is_reached(tmp_path):
+    async def scenario():
+        storage = JsonFileStorage(str(tmp_path), flush_interval=60, max_dirty=5)
+        await storage.open()
+        try:
+            await storage.put_many(DRAFTS, {str(index): {"id": str(index)} for index in range(5)})
+            for _ in range(100):
+                if read_file(tmp_path / "drafts.json"):
+                    break
+                await asyncio.sleep(0.01)
+            assert len(read_file(tmp_path / "drafts.json")) == 5
+        finally:
+            await storage.close()
+
+    run(scenario())
+
+
+def test_json_storage_refuses_corrupt_files(tmp_path):
+    (tmp_path / "drafts.json").write_text('{"a": ')
+
+    async def scenario():
+        storage = JsonFileStorage(str(tmp_path))
+        with pytest.raises(StorageError):
+            await storage.open()
+
+    run(scenario())
+
+
+def test_json_storage_discards_interrupted_flush(tmp_path):
+    (tmp_path / "drafts.json").write_text(json.dumps({"a": {"id": "a"}}))
+    (tmp_path / "drafts.json.tmp").write_text('{"a": {"id": "a"}, "b"')
+
+    async def scenario():
+        storage = JsonFileStorage(str(tmp_path))
+        await storage.open()
+        try:
+            assert await storage.all(DRAFTS) == {"a": {"id": "a"}}
+        finally:
+            await storage.close()
+
+    run(scenario())
+    assert not os.path.exists(tmp_path / "drafts.json.tmp")
+
+
+def scheduled(record_id, when, status="pending"):
+    return {"id": record_id, "content": record_id, "scheduled_time": when, "status": status}
+
+
+async def page_all(storage, collection, limit, **filters):
+    """Follow next_cursor to the end and return the ids in the order served"""
+    ids, cursor = [], None
+    while True:
+        records, cursor = await storage.page(collection, limit=limit, cursor=cursor, **filters)
+        assert len(records) <= limit
+        ids.extend(record["id"] for record in records)
+        if cursor is None:
+            return ids
+
+
+def test_cursor_paging(backend, tmp_path):
+    async def scenario():
+        storage = create_storage(backend, str(tmp_path))
+        await storage.open()
+        try:
+            await storage.put_many(SCHEDULED_TWEETS, {
+                "noon": scheduled("noon", "2026-03-01T12:00:00+00:00"),
+                # 11:00 UTC despite the later wall-clock time
+                "offset": scheduled("offset", "2026-03-01T13:00:00+02:00", status="failed"),
+                "tie-b": scheduled("tie-b", "2026-03-01T14:00:00Z"),
+                "tie-a": scheduled("tie-a", "2026-03-01T14:00:00Z"),
+                "late": scheduled("late", "2026-03-02T09:00:00+00:00", status="posted"),
+            })
+            assert await page_all(storage, SCHEDULED_TWEETS, 2) == ["offset", "noon", "tie-a", "tie-b", "late"]
+            assert await page_all(storage, SCHEDULED_TWEETS, 3, descending=True) == \
+                ["late", "tie-b", "tie-a", "noon", "offset"]
+            assert await page_all(storage, SCHEDULED_TWEETS, 1, status="pending") == ["noon", "tie-a", "tie-b"]
+            assert await page_all(storage, SCHEDULED_TWEETS, 10, since="2026-03-01T12:00:00Z",
+                                  until="2026-03-01T14:00:00Z") == ["noon"]
+
+            everything, cursor = await storage.page(SCHEDULED_TWEETS)
+            assert len(everything) == 5 and cursor is None
+
+            # Updates move records within the indexes
+            await storage.update(SCHEDULED_TWEETS, "late", {"scheduled_time": "2026-02-01T00:00:00Z",
+                                                            "status": "pending"})
+            await storage.delete(SCHEDULED_TWEETS, "noon")
+            assert await page_all(storage, SCHEDULED_TWEETS, 2, status="pending") == ["late", "tie-a", "tie-b"]
+
+            with pytest.raises(ValueError):
+                await storage.page(SCHEDULED_TWEETS, limit=2, cursor="not-a-cursor")
+        finally:
+            await storage.close()
+
+    run(scenario())
+
+
+def test_paging_and_counting_by_account(backend, tmp_path):
+    def tweet(record_id, when, account_id=None, status="pending"):
+        return {**scheduled(record_id, when, status), "account_id": account_id}
+
+    async def scenario():
+        storage = create_storage(backend, str(tmp_path))
+        await storage.open()
+        try:
+            await storage.put_many(SCHEDULED_TWEETS, {
+                # Records from before accounts existed belong to the default account
+                "old": scheduled("old", "2026-03-01T08:00:00Z"),
+                "d1": tweet("d1", "2026-03-01T09:00:00Z", "default", "posted"),
+                "a1": tweet("a1", "2026-03-01T10:00:00Z", "alice"),
+                "a2": tweet("a2", "2026-03-01T11:00:00Z", "alice", "failed"),
+                "a3": tweet("a3", "2026-03-01T12:00:00Z", "alice"),
+                "b1": tweet("b1", "2026-03-01T13:00:00Z", "bob"),
+            })
+            assert await page_all(storage, SCHEDULED_TWEETS, 2, account_id="alice") == ["a1", "a2", "a3"]
+            assert await page_all(storage, SCHEDULED_TWEETS, 1, account_id="alice", status="pending") == ["a1", "a3"]
+            assert await page_all(storage, SCHEDULED_TWEETS, 5, account_id="default", descending=True) == ["d1", "old"]
+            assert await page_all(storage, SCHEDULED_TWEETS, 5, account_id="alice", status="pending",
+                                  until="2026-03-01T12:00:00Z") == ["a1"]
+            assert await storage.count(SCHEDULED_TWEETS, account_id="alice") == 3
+            assert await storage.count(SCHEDULED_TWEETS, account_id="alice", status="pending") == 2
+            assert await storage.count(SCHEDULED_TWEETS, status="pending") == 4
+            assert await storage.count(SCHEDULED_TWEETS, account_id="nobody") == 0
+
+            # Updates move records between accounts and statuses
+            await storage.update(SCHEDULED_TWEETS, "a1", {"status": "posted"})
+            await storage.update(SCHEDULED_TWEETS, "b1", {"account_id": "alice"})
+            await storage.delete(SCHEDULED_TWEETS, "a3")
+            assert await page_all(storage, SCHEDULED_TWEETS, 5, account_id="alice", status="pending") == ["b1"]
+            assert await page_all(storage, SCHEDULED_TWEETS, 5, account_id="alice") == ["a1", "a2", "b1"]
+            assert await storage.count(SCHEDULED_TWEETS, account_id="bob") == 0
+            # Collections that aren't per account have nothing to list
+            await storage.put(DRAFTS, "draft", {"id": "draft", "content": "x", "created_at": "2026-03-01T00:00:00Z"})
+            assert await storage.count(DRAFTS, account_id="default") == 0
+        finally:
+            await storage.close()
+
+    run(scenario())
+
+
+def test_cursor_survives_concurrent_inserts(backend, tmp_path):
+    async def scenario():
+        storage = create_storage(backend, str(tmp_path))
+        await storage.open()
+        try:
+            for hour in range(4):
+                await storage.put(DRAFTS, f"d{hour}", {"id": f"d{hour}", "updated_at": f"2026-03-01T0{hour}:00:00Z"})
+            first, cursor = await storage.page(DRAFTS, limit=2, descending=True)
+            # A newer draft lands before the next page is read
+            await storage.put(DRAFTS, "new", {"id": "new", "updated_at": "2026-03-01T09:00:00Z"})
+            rest, cursor = await storage.page(DRAFTS, limit=10, cursor=cursor, descending=True)
+            return [record["id"] for record in first + rest], cursor
+        finally:
+            await storage.close()
+
+    assert run(scenario()) == (["d3", "d2", "d1", "d0"], None)
+
+
+def test_changes_since(backend, tmp_path):
+    async def scenario():
+        storage = create_storage(backend, str(tmp_path))
+        await storage.open()
+        heard = []
+        storage.add_listener(lambda change, record: heard.append((change["op"], change["id"], record)))
+        try:
+            await storage.put(DRAFTS, "a", {"id": "a", "content": "v1"})
+            await storage.put(SCHEDULED_TWEETS, "s", scheduled("s", "2026-03-01T12:00:00Z"))
+            await storage.update(DRAFTS, "a", {"content": "v2"})
+            await storage.delete(SCHEDULED_TWEETS, "s")
+
+            feed = await storage.changes_since(0)
+            assert feed["version"] == 4 and feed["reset"] is False and feed["has_more"] is False
+            assert [(c["version"], c["collection"], c["op"], c["id"]) for c in feed["changes"]] == [
+                (1, DRAFTS, "put", "a"),
+                (2, SCHEDULED_TWEETS, "put", "s"),
+                (3, DRAFTS, "put", "a"),
+                (4, SCHEDULED_TWEETS, "delete", "s"),
+            ]
+            # Each change carries the current state, so superseded ones have none
+            assert [c["record"] for c in feed["changes"]][1:] == [None, {"id": "a", "content": "v2"}, None]
+
+            page = await storage.changes_since(1, limit=2)
+            assert [c["version"] for c in page["changes"]] == [2, 3]
+            assert page["version"] == 3 and page["has_more"] is True
+            assert (await storage.changes_since(4))["changes"] == []
+
+            assert (await storage.collection_version(DRAFTS))[0] == 3
+            assert (await storage.collection_version(SCHEDULED_TWEETS))[0] == 4
+            assert heard[-1] == ("delete", "s", None)
+            assert heard[2] == ("put", "a", {"id": "a", "content": "v2"})
+        finally:
+            await storage.close()
+
+    run(scenario())
+
+
+def test_delete_many(backend, tmp_path):
+    async def scenario():
+        storage = create_storage(backend, str(tmp_path))
+        await storage.open()
+        try:
+            await storage.put_many(DRAFTS, {f"d{i}": {"id": f"d{i}"} for i in range(3)})
+            assert await storage.delete_many(DRAFTS, ["d0", "d2", "missing"], op="archive") == 2
+            assert set(await storage.all(DRAFTS)) == {"d1"}
+            feed = await storage.changes_since(1)
+            return [(c["op"], c["id"]) for c in feed["changes"]]
+        finally:
+            await storage.close()
+
+    # Deletes that moved a record to the archive are logged as such
+    assert run(scenario())[-2:] == [("archive", "d0"), ("archive", "d2")]
+
+
+def test_changes_since_resets_once_pruned(backend, tmp_path):
+    async def scenario():
+        storage = create_storage(backend, str(tmp_path), change_log_size=3)
+        storage.PRUNE_EVERY = 1
+        await storage.open()
+        try:
+            for i in range(6):
+                await storage.put(DRAFTS, f"d{i}", {"id": f"d{i}"})
+            return await storage.changes_since(1), await storage.changes_since(3)
+        finally:
+            await storage.close()
+
+    pruned, retained = run(scenario())
+    assert pruned["reset"] is True and pruned["version"] == 6
+    assert [c["version"] for c in retained["changes"]] == [4, 5, 6]
+
+
+def test_versions_survive_reopen(backend, tmp_path):
+    async def scenario():
+        storage = create_storage(backend, str(tmp_path))
+        await storage.open()
+        await storage.put(DRAFTS, "a", {"id": "a"})
+        await storage.put(DRAFTS, "b", {"id": "b"})
+        await storage.close()
+
+        reopened = create_storage(backend, str(tmp_path))
+        await reopened.open()
+        try:
+            await reopened.put(DRAFTS, "c", {"id": "c"})
+            return await reopened.collection_version(DRAFTS)
+        finally:
+            await reopened.close()
+
+    assert run(scenario())[0] == 3
+
+
+def test_conditional_update(backend, tmp_path):
+    async def scenario():
+        storage = create_storage(backend, str(tmp_path))
+        await storage.open()
+        try:
+            await storage.put(SCHEDULED_TWEETS, "s", scheduled("s", "2026-03-01T12:00:00Z"))
+            claims = await asyncio.gather(*(
+                storage.update(SCHEDULED_TWEETS, "s", {"status": "posting"}, where={"status": "pending"})
+                for _ in range(5)
+            ))
+            assert sum(claim is not None for claim in claims) == 1
+            assert await storage.update(SCHEDULED_TWEETS, "s", {"status": "posted"},
+                                        where={"status": "pending"}) is None
+            assert await storage.update(SCHEDULED_TWEETS, "missing", {"status": "posting"},
+                                        where={"status": "pending"}) is None
+            posted = await storage.update(SCHEDULED_TWEETS, "s", {"status": "posted"}, where={"status": "posting"})
+            assert posted["status"] == "posted"
+            # The status index follows conditional updates too
+            assert [r["id"] for r in (await storage.page(SCHEDULED_TWEETS, status="posted"))[0]] == ["s"]
+        finally:
+            await storage.close()
+
+    run(scenario())
+
+
+def test_leases(backend, tmp_path):
+    async def scenario():
+        storage = create_storage(backend, str(tmp_path))
+        await storage.open()
+        try:
+            assert await storage.acquire_lease("scheduler", "a", ttl=0.2)
+            assert not await storage.acquire_lease("scheduler", "b", ttl=0.2)
+            # Renewal by the holder
+            assert await storage.acquire_lease("scheduler", "a", ttl=0.2)
+            await asyncio.sleep(0.25)
+            assert await storage.acquire_lease("scheduler", "b", ttl=10)
+            await storage.release_lease("scheduler", "a")
+            assert not await storage.acquire_lease("scheduler", "a", ttl=10)
+            await storage.release_lease("scheduler", "b")
+            assert await storage.acquire_lease("scheduler", "a", ttl=10)
+        finally:
+            await storage.close()
+
+    run(scenario())
+
+
+def test_json_storage_refuses_a_second_process(tmp_path):
+    async def scenario():
+        first = JsonFileStorage(str(tmp_path))
+        await first.open()
+        try:
+            with pytest.raises(StorageError):
+                await JsonFileStorage(str(tmp_path)).open()
+        finally:
+            await first.close()
+        second = JsonFileStorage(str(tmp_path))
+        await second.open()
+        await second.close()
+
+    run(scenario())
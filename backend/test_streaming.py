@@ -0,0 +1,80 @@
+import json
+
+import httpx
+import pytest
+
+import main
+from main import StreamingTweetCleaner
+
+
+def stream(tokens):
+    cleaner = StreamingTweetCleaner()
+    emitted = "".join(cleaner.feed(token) for token in tokens)
+    return emitted, cleaner.finish()
+
+
+@pytest.mark.parametrize("tokens, content", [
+    (["Hello", " world", " #ai"], "Hello world #ai"),
+    (['"Hello', ' world"'], "Hello world"),
+    (["Tw", "eet: ", "Hello"], "Hello"),
+    (['"Tweet:', ' Hello"'], "Hello"),
+    (['"Quoted"', ' is how', ' it starts'], '"Quoted" is how it starts'),
+    (['"Unclosed', ' quote'], '"Unclosed quote'),
+    (["Ends with a ", 'quote"'], 'Ends with a quote"'),
+])
+def test_streamed_text_is_always_a_prefix_of_the_final_content(tokens, content):
+    emitted, final = stream(tokens)
+    assert final == content == main.clean_generated_content("".join(tokens))
+    assert final.startswith(emitted)
+
+
+def test_plain_text_streams_as_it_arrives():
+    cleaner = StreamingTweetCleaner()
+    assert cleaner.feed("Hello") == "Hello"
+    assert cleaner.feed(" world ") == " world"
+    assert cleaner.feed('"') == " "
+    assert cleaner.feed(" again") == '" again'
+
+
+def test_leading_quote_holds_text_until_the_end():
+    cleaner = StreamingTweetCleaner()
+    assert cleaner.feed('"Hello') == ""
+    assert cleaner.feed(" world") == ""
+    assert cleaner.finish() == '"Hello world'
+
+
+def sse_body(tokens):
+    lines = [": OPENROUTER PROCESSING"]
+    for token in tokens:
+        lines.append("data: " + json.dumps({"choices": [{"delta": {"content": token}}]}))
+    lines.append("data: [DONE]")
+    return "\n\n".join(lines) + "\n\n"
+
+
+def events(response):
+    parsed = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        parsed.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return parsed
+
+
+@pytest.mark.parametrize("tokens", [
+    ['"Unclosed', ' quote #ai'],
+    ['"Wrapped', ' tweet #ai"'],
+    ["Plain", " tweet", " #ai"],
+])
+def test_stream_endpoint_tokens_add_up_to_the_done_content(client, monkeypatch, tokens):
+    handler = lambda request: httpx.Response(200, text=sse_body(tokens))
+    monkeypatch.setattr(main, "openrouter_client", httpx.AsyncClient(
+        base_url="http://openrouter.test", transport=httpx.MockTransport(handler)))
+
+    response = client.post("/generate-tweet/stream", json={"topic": "testing"})
+    assert response.status_code == 200
+    parsed = events(response)
+
+    event, done = parsed[-1]
+    assert event == "done"
+    assert done["content"] == main.clean_generated_content("".join(tokens))
+    assert done["hashtags"] == ["#ai"]
+    assert "".join(data["text"] for event, data in parsed[:-1]) == done["content"]
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeFeedView:
+    """In-memory state derived from some storage collections and kept current
+    through the change feed.
+
+    Writes made by this process are applied as they commit through a storage
+    listener. ``refresh`` catches up on everything else (writes by other
+    workers, whole-collection replacements, a change log that was pruned
+    past this view) and is cheap when there is nothing to apply, so readers
+    call it before every query. The first refresh builds the view from
+    scratch, including any records moved to an archive. Archived records
+    stay in the view, but since they can no longer change, ``_archived`` lets
+    a subclass drop whatever it only kept to update or return them; the
+    archive can be read again on demand. Subclasses implement ``_clear`` and
+    ``_apply``; applying a change must be idempotent, since a change can
+    reach the view both from the listener and from the feed.
+    """
+
+    # Records read per storage call while building
+    BUILD_PAGE_SIZE = 1000
+
+    def __init__(self, storage: Storage, collections: tuple, archives: Optional[dict] = None):
+        self.storage = storage
+        self.collections = collections
+        # collection -> Archive holding its older records
+        self.archives = archives or {}
+        self.version: Optional[int] = None
+        self._stale = True
+        self._lock = asyncio.Lock()
+        storage.add_listener(self._on_change)
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def _apply(self, collection: str, op: str, record_id: Optional[str], record: Optional[dict]):
+        """Reflect one change; ``record`` is the record's state after a put and None otherwise"""
+        raise NotImplementedError
+
+    def _archived(self, collection: str, record_id: str):
+        """The record was moved to the archive; what it contributed to the view stays"""
+
+    def _reflect(self, change: dict, record: Optional[dict]):
+        if change["op"] == "archive":
+            self._archived(change["collection"], change["id"])
+        else:
+            self._apply(change["collection"], change["op"], change["id"], record)
+
+    def _on_change(self, change: dict, record: Optional[dict]):
+        # Only apply changes that directly follow what the view has seen;
+        # anything after a gap is picked up by the next refresh, in order
+        if self._stale or change["version"] != self.version + 1:
+            return
+        self.version = change["version"]
+        if change["collection"] not in self.collections:
+            return
+        if change["op"] == "replace":
+            self._stale = True
+        else:
+            self._reflect(change, record)
+
+    async def _build(self):
+        started = time.perf_counter()
+        # Anything written while the collections are read is applied again
+        # from the feed afterwards
+        version = await self.storage.current_version()
+        self._clear()
+        count = 0
+        for collection in self.collections:
+            cursor = None
+            while True:
+                records, cursor = await self.storage.page(collection, limit=self.BUILD_PAGE_SIZE, cursor=cursor)
+                for record in records:
+                    self._apply(collection, "put", record["id"], record)
+                count += len(records)
+                if cursor is None:
+                    break
+            # Read after storage, so records archived meanwhile are still seen
+            archive = self.archives.get(collection)
+            if archive is not None:
+                async for record in archive.all_records():
+                    self._apply(collection, "put", record["id"], record)
+                    self._archived(collection, record["id"])
+                    count += 1
+        self.version = version
+        self._stale = False
+        logger.info("Built view", extra={"view": type(self).__name__, "records": count,
+                                         "seconds": round(time.perf_counter() - started, 3)})
+
+    async def refresh(self):
+        """Bring the view up to date with storage"""
+        async with self._lock:
+            while True:
+                if self._stale:
+                    await self._build()
+                result = await self.storage.changes_since(self.version, self.BUILD_PAGE_SIZE)
+                if result["reset"]:
+                    self._stale = True
+                    continue
+                for change in result["changes"]:
+                    if change["version"] <= self.version:
+                        continue
+                    self.version = change["version"]
+                    if change["collection"] not in self.collections:
+                        continue
+                    if change["op"] == "replace":
+                        self._stale = True
+                        break
+                    self._reflect(change, change["record"])
+                if not self._stale and not result["has_more"]:
+                    return